@@ -4,8 +4,10 @@ from __future__ import annotations
 
 import logging
 import os
+from typing import Any
 
-from flask import Flask, jsonify, request
+import orjson
+from flask import Flask, Response, request
 
 from engine.translator import Translator
 
@@ -14,6 +16,25 @@ logger = logging.getLogger(__name__)
 translator = Translator()
 
 
+def _json_response(obj: Any, status: int = 200) -> Response:
+    """直接用 orjson 生成的字节构造 JSON 响应，跳过 jsonify 的序列化封装。"""
+    return Response(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), status=status, mimetype="application/json")
+
+
+def _get_json_body() -> dict | None:
+    """使用 orjson 解析 JSON 请求体。
+
+    Content-Type 不是 JSON、解析失败或顶层不是对象时返回 None，由调用方返回 400。
+    """
+    if not request.is_json:
+        return None
+    try:
+        data = orjson.loads(request.get_data())
+    except orjson.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
 def create_app() -> Flask:
     """创建并配置 Flask 应用。"""
     log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
@@ -23,15 +44,15 @@ def create_app() -> Flask:
     @app.post("/engine/translate")
     def submit_translate():
         """提交翻译任务。"""
-        data = request.get_json(silent=True)
+        data = _get_json_body()
         if data is None:
-            return jsonify({"error": "INVALID_REQUEST", "message": "请求体必须为 JSON"}), 400
+            return _json_response({"error": "INVALID_REQUEST", "message": "请求体必须为 JSON"}, 400)
 
         task_id = data.get("taskId")
         file_path = data.get("filePath")
 
         if not task_id or not file_path:
-            return jsonify({"error": "MISSING_PARAMS", "message": "taskId 和 filePath 为必填参数"}), 400
+            return _json_response({"error": "MISSING_PARAMS", "message": "taskId 和 filePath 为必填参数"}, 400)
 
         target_lang = data.get("targetLang", "zh-CN")
         custom_prompt = data.get("customPrompt")
@@ -50,29 +71,29 @@ def create_app() -> Flask:
             callback_url=callback_url,
             skip_cache=skip_cache,
         )
-        return jsonify(result), 202
+        return _json_response(result, 202)
 
     @app.get("/engine/tasks/<task_id>")
     def get_task(task_id: str):
         """查询任务状态。"""
         task = translator.get_task(task_id)
         if task is None:
-            return jsonify({"error": "TASK_NOT_FOUND", "message": "翻译任务不存在"}), 404
-        return jsonify(task), 200
+            return _json_response({"error": "TASK_NOT_FOUND", "message": "翻译任务不存在"}, 404)
+        return _json_response(task, 200)
 
     @app.post("/engine/assembly")
     def submit_assembly():
         """提交组装任务（仅重组阶段，使用已确认的翻译结果）。"""
-        data = request.get_json(silent=True)
+        data = _get_json_body()
         if data is None:
-            return jsonify({"error": "INVALID_REQUEST", "message": "请求体必须为 JSON"}), 400
+            return _json_response({"error": "INVALID_REQUEST", "message": "请求体必须为 JSON"}, 400)
 
         task_id = data.get("taskId")
         file_path = data.get("filePath")
         items = data.get("items")
 
         if not task_id or not file_path or not items:
-            return jsonify({"error": "MISSING_PARAMS", "message": "taskId、filePath 和 items 为必填参数"}), 400
+            return _json_response({"error": "MISSING_PARAMS", "message": "taskId、filePath 和 items 为必填参数"}, 400)
 
         callback_url = data.get("callbackUrl")
 
@@ -84,7 +105,7 @@ def create_app() -> Flask:
             items=items,
             callback_url=callback_url,
         )
-        return jsonify(result), 202
+        return _json_response(result, 202)
 
     return app
 
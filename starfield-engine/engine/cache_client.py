@@ -4,9 +4,13 @@ from __future__ import annotations
 
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from engine.esm_parser import StringRecord
 
@@ -14,32 +18,61 @@ logger = logging.getLogger(__name__)
 
 API_BASE_URL = os.environ.get("API_BASE_URL", "http://localhost:8080")
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
 
-def _extract_record_type(record_id: str) -> str:
-    """从 record_id 中提取 record_type（第一个冒号前的部分）。
+# 缓存查询/保存的分片大小与并发请求数
+QUERY_CHUNK_SIZE = 2000
+SAVE_CHUNK_SIZE = 1000
+REQUEST_MAX_WORKERS = 8
 
-    例如 "RFGP:0100448A:RNAM" → "RFGP"
-    """
-    return record_id.split(":", 1)[0]
 
+def _create_session() -> requests.Session:
+    """创建带连接池和网关错误重试的 HTTP 会话，复用与 Backend 的 keep-alive 连接。"""
+    session = requests.Session()
+    retry = Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-def _extract_subrecord_type(record_id: str) -> str:
-    """从 record_id 中提取 subrecord_type（最后一个冒号后的部分，去掉 #N 序号后缀）。
 
-    例如 "RFGP:0100448A:RNAM" → "RNAM"
-    例如 "TMLM:0100448A:ITXT#1" → "ITXT"
-    """
-    sub = record_id.rsplit(":", 1)[-1]
-    # 去掉 #N 序号后缀
-    idx = sub.find("#")
-    if idx >= 0:
-        sub = sub[:idx]
-    return sub
+_SESSION = _create_session()
+
+
+def _query_chunk(items: List[dict], target_lang: str) -> Dict[str, str]:
+    """查询单个分片的缓存，失败时返回空字典，不影响其他分片。"""
+    payload = {
+        "targetLang": target_lang,
+        "items": items,
+    }
+
+    try:
+        url = f"{API_BASE_URL}/api/translation-cache/query"
+        resp = _SESSION.post(url, data=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=30)
+        resp.raise_for_status()
+
+        data = orjson.loads(resp.content)
+        result = {}
+        for item in data.get("items", []):
+            if item.get("hit"):
+                result[item["recordId"]] = item["targetText"]
+        return result
+
+    except Exception as e:
+        logger.warning("[_query_chunk] 缓存查询失败 items_count %d error %s", len(items), str(e))
+        return {}
 
 
 def query_cache(records: List[StringRecord], target_lang: str) -> Dict[str, str]:
     """批量查询翻译缓存。
 
+    记录数超过 QUERY_CHUNK_SIZE 时按分片并发查询，单个分片失败只丢失该分片的命中结果。
+
     Args:
         records: 待查询的 StringRecord 列表。
         target_lang: 目标语言。
@@ -53,65 +86,77 @@ def query_cache(records: List[StringRecord], target_lang: str) -> Dict[str, str]
     items = [
         {
             "recordId": r.record_id,
-            "recordType": _extract_record_type(r.record_id),
-            "subrecordType": _extract_subrecord_type(r.record_id),
+            "recordType": r.record_type,
+            "subrecordType": r.subrecord_type,
             "sourceText": r.text,
         }
         for r in records
     ]
+    chunks = [items[i : i + QUERY_CHUNK_SIZE] for i in range(0, len(items), QUERY_CHUNK_SIZE)]
+
+    logger.info(
+        "[query_cache] 查询缓存 records_count %d chunks %d target_lang %s",
+        len(records), len(chunks), target_lang,
+    )
+
+    if len(chunks) == 1:
+        result = _query_chunk(chunks[0], target_lang)
+    else:
+        result = {}
+        with ThreadPoolExecutor(max_workers=min(REQUEST_MAX_WORKERS, len(chunks))) as executor:
+            for chunk_result in executor.map(_query_chunk, chunks, [target_lang] * len(chunks)):
+                result.update(chunk_result)
+
+    logger.info("[query_cache] 缓存命中 hit_count %d total %d", len(result), len(records))
+    return result
 
+
+def _save_chunk(items: List[dict], target_lang: str, task_id: str) -> bool:
+    """保存单个分片的缓存，返回是否成功；失败时仅记录警告，不影响其他分片。"""
     payload = {
+        "taskId": task_id,
         "targetLang": target_lang,
         "items": items,
     }
 
     try:
-        url = f"{API_BASE_URL}/api/translation-cache/query"
-        logger.info("[query_cache] 查询缓存 records_count %d target_lang %s", len(records), target_lang)
-        resp = requests.post(url, json=payload, timeout=30)
+        url = f"{API_BASE_URL}/api/translation-cache/save"
+        resp = _SESSION.post(url, data=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=30)
         resp.raise_for_status()
-
-        data = resp.json()
-        result = {}
-        for item in data.get("items", []):
-            if item.get("hit"):
-                result[item["recordId"]] = item["targetText"]
-
-        logger.info("[query_cache] 缓存命中 hit_count %d total %d", len(result), len(records))
-        return result
+        return True
 
     except Exception as e:
-        logger.warning("[query_cache] 缓存查询失败 error %s", str(e))
-        return {}
+        logger.warning("[_save_chunk] 缓存保存失败 items_count %d task_id %s error %s", len(items), task_id, str(e))
+        return False
 
 
 def save_cache(
     translations: Dict[str, str],
-    records: List[StringRecord],
+    record_lookup: Dict[str, StringRecord],
     target_lang: str,
     task_id: str,
 ) -> None:
     """批量保存翻译结果到缓存。
 
+    条目数超过 SAVE_CHUNK_SIZE 时按分片并发保存，避免单个超大请求体。
+
     Args:
         translations: record_id -> target_text 的映射。
-        records: 原始 StringRecord 列表（用于提取 subrecord_type 和 source_text）。
+        record_lookup: record_id -> StringRecord 的映射（用于提取类型和原文），由调用方每个任务构建一次。
         target_lang: 目标语言。
         task_id: 翻译任务 ID。
     """
     if not translations:
         return
 
-    record_lookup = {r.record_id: r for r in records}
-
     items = []
     for record_id, target_text in translations.items():
         record = record_lookup.get(record_id)
         if record is None:
             continue
         items.append({
-            "recordType": _extract_record_type(record_id),
-            "subrecordType": _extract_subrecord_type(record_id),
+            "recordType": record.record_type,
+            "subrecordType": record.subrecord_type,
             "sourceText": record.text,
             "targetText": target_text,
         })
@@ -119,18 +164,20 @@ def save_cache(
     if not items:
         return
 
-    payload = {
-        "taskId": task_id,
-        "targetLang": target_lang,
-        "items": items,
-    }
-
-    try:
-        url = f"{API_BASE_URL}/api/translation-cache/save"
-        logger.info("[save_cache] 保存缓存 items_count %d task_id %s", len(items), task_id)
-        resp = requests.post(url, json=payload, timeout=30)
-        resp.raise_for_status()
+    chunks = [items[i : i + SAVE_CHUNK_SIZE] for i in range(0, len(items), SAVE_CHUNK_SIZE)]
+    logger.info("[save_cache] 保存缓存 items_count %d chunks %d task_id %s", len(items), len(chunks), task_id)
+
+    if len(chunks) == 1:
+        failed = 0 if _save_chunk(chunks[0], target_lang, task_id) else 1
+    else:
+        with ThreadPoolExecutor(max_workers=min(REQUEST_MAX_WORKERS, len(chunks))) as executor:
+            saved = executor.map(_save_chunk, chunks, [target_lang] * len(chunks), [task_id] * len(chunks))
+            failed = sum(1 for ok in saved if not ok)
+
+    if failed:
+        logger.warning(
+            "[save_cache] 缓存部分保存失败 items_count %d failed_chunks %d/%d task_id %s",
+            len(items), failed, len(chunks), task_id,
+        )
+    else:
         logger.info("[save_cache] 缓存保存成功 items_count %d", len(items))
-
-    except Exception as e:
-        logger.warning("[save_cache] 缓存保存失败 error %s", str(e))
@@ -3,11 +3,18 @@
 from __future__ import annotations
 
 import logging
+import mmap
+import os
 import struct
-import zlib
 from dataclasses import dataclass
 from typing import List, Optional, Tuple
 
+try:
+    # ISA-L 的 DEFLATE 实现使用 SIMD 指令，解压速度明显快于标准库，未安装时回退到 zlib
+    from isal import isal_zlib as zlib_impl
+except ImportError:
+    import zlib as zlib_impl
+
 logger = logging.getLogger(__name__)
 
 # 包含可翻译文本的子记录类型（任意记录类型下都翻译）
@@ -31,6 +38,19 @@ TRANSLATABLE_COMBINATIONS = frozenset({
     (b"MGEF", b"DNAM"),   # 魔法效果描述
 })
 
+# 以小端 uint32 表示的类型标识，用于热路径上的整数比较和集合查找
+TRANSLATABLE_SUBRECORD_TAGS = frozenset(int.from_bytes(s, "little") for s in TRANSLATABLE_SUBRECORD_TYPES)
+TRANSLATABLE_COMBINATION_TAGS = frozenset(
+    (int.from_bytes(rt, "little"), int.from_bytes(s, "little")) for rt, s in TRANSLATABLE_COMBINATIONS
+)
+GRUP_TAG = int.from_bytes(b"GRUP", "little")
+
+# 按记录类型预先合并的可翻译子记录类型集合：通用类型 + 该记录类型特有的组合
+TRANSLATABLE_TAGS_BY_RECORD = {
+    rec_tag: TRANSLATABLE_SUBRECORD_TAGS | frozenset(s for (rt, s) in TRANSLATABLE_COMBINATION_TAGS if rt == rec_tag)
+    for rec_tag, _ in TRANSLATABLE_COMBINATION_TAGS
+}
+
 # 记录头部大小：type(4) + data_size(4) + flags(4) + form_id(4) + revision(4) + version(2) + unknown(2)
 RECORD_HEADER_SIZE = 24
 
@@ -43,37 +63,73 @@ COMPRESSED_FLAG = 0x00040000
 # 子记录头部大小：type(4) + data_size(2)
 SUBRECORD_HEADER_SIZE = 6
 
+# 预编译的子记录头部解析器：type(uint32) + data_size(uint16)
+_unpack_subrecord_header = struct.Struct("<IH").unpack_from
+
+# 预编译的 uint32 解析器
+_unpack_u32 = struct.Struct("<I").unpack_from
 
-@dataclass
+# 预编译的记录头部解析器：一次调用读取 data_size + flags + form_id
+_unpack_record_header = struct.Struct("<III").unpack_from
+
+
+@dataclass(slots=True)
 class StringRecord:
-    """ESM 文件中的一条可翻译文本记录。"""
+    """ESM 文件中的一条可翻译文本记录。
+
+    record_type / subrecord_type 由解析器在解析时直接填充；
+    手动构造时未传入则从 record_id 推导。
+    """
 
     record_id: str
     text: str
+    record_type: str = ""
+    subrecord_type: str = ""
+
+    def __post_init__(self) -> None:
+        """补全未传入的 record_type / subrecord_type。"""
+        if not self.record_type:
+            self.record_type = self.record_id.split(":", 1)[0]
+        if not self.subrecord_type:
+            # 取最后一个冒号后的部分，并去掉 #N 序号后缀
+            self.subrecord_type = self.record_id.rsplit(":", 1)[-1].split("#", 1)[0]
+
 
+# 字节分类表：可打印 ASCII、\t \n \r 以及 UTF-8 多字节序列（>= 0x80）映射为 0，其余控制字符映射为 1
+_NON_PRINTABLE_TABLE = bytes(
+    0 if (0x20 <= b < 0x7F or b in (0x09, 0x0A, 0x0D) or b >= 0x80) else 1
+    for b in range(256)
+)
 
 
-def _decode_text(data: bytes) -> str:
-    """解码子记录中的文本数据，去除末尾的 null 终止符。"""
+def _decode_text(data: bytes) -> Optional[str]:
+    """解码子记录中的文本数据，去除末尾的 null 终止符。
+
+    不是可打印文本或不是合法 UTF-8 时返回 None。
+    """
     if data.endswith(b"\x00"):
         data = data[:-1]
-    return data.decode("utf-8", errors="replace")
-
+    if not _is_printable_text(data):
+        return None
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    # 原文中出现 replacement character（\ufffd）通常是二进制数据
+    if "\ufffd" in text:
+        return None
+    return text
 
-def _build_record_id(record_type: bytes, form_id: int, subrecord_type: bytes) -> str:
-    """构建唯一的记录 ID，格式为 record_type:form_id_hex:subrecord_type。"""
-    return f"{record_type.decode('ascii')}:{form_id:08X}:{subrecord_type.decode('ascii')}"
 
+def _is_printable_text(data: bytes) -> bool:
+    """检查原始字节是否为可打印的有效文本，过滤二进制数据被误识别为文本的情况。
 
-def _is_printable_text(text: str) -> bool:
-    """检查文本是否为可打印的有效文本，过滤二进制数据被误解码的情况。"""
-    if not text:
-        return False
-    # 包含 replacement character（\ufffd）说明 UTF-8 解码失败，属于二进制数据
-    if "\ufffd" in text:
+    通过 bytes.translate 把每个字节映射为 0/1 后计数，控制字符占比不超过 10% 视为文本。
+    """
+    if not data:
         return False
-    printable_count = sum(1 for c in text if c.isprintable() or c in ('\n', '\r', '\t'))
-    return printable_count / len(text) >= 0.9
+    non_printable = data.translate(_NON_PRINTABLE_TABLE).count(1)
+    return non_printable * 10 <= len(data)
 
 
 def _parse_subrecords(data: bytes, record_type: bytes, form_id: int) -> list[StringRecord]:
@@ -89,43 +145,55 @@ def _parse_subrecords(data: bytes, record_type: bytes, form_id: int) -> list[Str
     """
     records = []
     offset = 0
+    mv = memoryview(data)
+    data_len = len(mv)
+    rec_type_str = record_type.decode("ascii")
+    # record_id 格式为 record_type:form_id_hex:subrecord_type，前缀在同一记录内不变
+    id_prefix = f"{rec_type_str}:{form_id:08X}:"
+    rec_tag = int.from_bytes(record_type, "little")
+    # 当前记录类型下所有可翻译的子记录类型，循环内只需一次集合查找
+    translatable_tags = TRANSLATABLE_TAGS_BY_RECORD.get(rec_tag, TRANSLATABLE_SUBRECORD_TAGS)
     # 统计同一 form_id 下每种子记录类型出现的次数，用于生成唯一 record_id
-    sub_type_counts: dict[bytes, int] = {}
+    sub_type_counts: dict[int, int] = {}
 
-    while offset < len(data):
-        if offset + SUBRECORD_HEADER_SIZE > len(data):
+    while offset < data_len:
+        if offset + SUBRECORD_HEADER_SIZE > data_len:
             logger.warning(
                 "[_parse_subrecords] 子记录头部不完整 offset %d record_type %s form_id %08X",
                 offset, record_type.decode("ascii", errors="replace"), form_id,
             )
             break
 
-        sub_type = data[offset : offset + 4]
-        sub_size = struct.unpack_from("<H", data, offset + 4)[0]
+        sub_tag, sub_size = _unpack_subrecord_header(mv, offset)
         offset += SUBRECORD_HEADER_SIZE
 
-        if offset + sub_size > len(data):
+        if offset + sub_size > data_len:
             logger.warning(
                 "[_parse_subrecords] 子记录数据不完整 sub_type %s sub_size %d offset %d",
-                sub_type.decode("ascii", errors="replace"), sub_size, offset,
+                sub_tag.to_bytes(4, "little").decode("ascii", errors="replace"), sub_size, offset,
             )
             break
 
-        is_translatable = (
-            sub_type in TRANSLATABLE_SUBRECORD_TYPES
-            or (record_type, sub_type) in TRANSLATABLE_COMBINATIONS
-        )
-
-        if is_translatable and sub_size > 0:
-            text = _decode_text(data[offset : offset + sub_size])
-            if text and _is_printable_text(text):
-                count = sub_type_counts.get(sub_type, 0)
-                if count == 0:
-                    record_id = _build_record_id(record_type, form_id, sub_type)
-                else:
-                    record_id = _build_record_id(record_type, form_id, sub_type) + f"#{count}"
-                sub_type_counts[sub_type] = count + 1
-                records.append(StringRecord(record_id=record_id, text=text))
+        # 非可翻译子记录直接跳过，不构造数据切片
+        if sub_size == 0 or sub_tag not in translatable_tags:
+            offset += sub_size
+            continue
+
+        text = _decode_text(bytes(mv[offset : offset + sub_size]))
+        if text:
+            sub_type_str = sub_tag.to_bytes(4, "little").decode("ascii")
+            count = sub_type_counts.get(sub_tag, 0)
+            if count == 0:
+                record_id = id_prefix + sub_type_str
+            else:
+                record_id = f"{id_prefix}{sub_type_str}#{count}"
+            sub_type_counts[sub_tag] = count + 1
+            records.append(StringRecord(
+                record_id=record_id,
+                text=text,
+                record_type=rec_type_str,
+                subrecord_type=sub_type_str,
+            ))
 
         offset += sub_size
 
@@ -134,100 +202,109 @@ def _parse_subrecords(data: bytes, record_type: bytes, form_id: int) -> list[Str
 
 
 def _parse_records(data: bytes, offset: int, end: int) -> tuple[list[StringRecord], int]:
-    """递归解析记录和 GRUP，提取所有可翻译文本记录。
+    """解析记录和 GRUP，提取所有可翻译文本记录。
+
+    使用显式栈代替递归遍历嵌套 GRUP：进入 GRUP 时压入外层的结束位置，
+    内层处理结束（或因数据异常中止）后弹出并从 GRUP 结束位置继续，遍历顺序与递归一致。
 
     返回 (string_records, new_offset)。
     """
     records: list[StringRecord] = []
-
-    while offset < end:
-        # 检查是否有足够的字节读取类型标识
-        if offset + 4 > end:
-            logger.warning("[_parse_records] 数据不足以读取记录类型 offset %d end %d", offset, end)
-            break
-
-        rec_type = data[offset : offset + 4]
-
-        if rec_type == b"GRUP":
-            # 解析 GRUP
-            if offset + GRUP_HEADER_SIZE > end:
-                logger.warning("[_parse_records] GRUP 头部不完整 offset %d", offset)
+    # 外层范围的结束位置栈
+    stack: list[int] = []
+
+    while True:
+        while offset < end:
+            # 检查是否有足够的字节读取类型标识
+            if offset + 4 > end:
+                logger.warning("[_parse_records] 数据不足以读取记录类型 offset %d end %d", offset, end)
                 break
 
-            group_size = struct.unpack_from("<I", data, offset + 4)[0]
+            if _unpack_u32(data, offset)[0] == GRUP_TAG:
+                # 解析 GRUP
+                if offset + GRUP_HEADER_SIZE > end:
+                    logger.warning("[_parse_records] GRUP 头部不完整 offset %d", offset)
+                    break
 
-            if group_size < GRUP_HEADER_SIZE:
-                logger.warning("[_parse_records] GRUP 大小异常 group_size %d offset %d", group_size, offset)
-                break
+                group_size = _unpack_u32(data, offset + 4)[0]
 
-            group_end = offset + group_size
-            if group_end > end:
-                logger.warning(
-                    "[_parse_records] GRUP 超出数据范围 group_end %d end %d offset %d",
-                    group_end, end, offset,
-                )
-                # 尝试用剩余数据继续解析
-                group_end = end
-
-            # 递归解析 GRUP 内部的记录
-            inner_records, _ = _parse_records(data, offset + GRUP_HEADER_SIZE, group_end)
-            records.extend(inner_records)
-            offset = group_end
-
-        else:
-            # 解析普通记录
-            if offset + RECORD_HEADER_SIZE > end:
-                logger.warning("[_parse_records] 记录头部不完整 offset %d rec_type %s", offset, rec_type.decode("ascii", errors="replace"))
-                break
+                if group_size < GRUP_HEADER_SIZE:
+                    logger.warning("[_parse_records] GRUP 大小异常 group_size %d offset %d", group_size, offset)
+                    break
 
-            data_size = struct.unpack_from("<I", data, offset + 4)[0]
-            flags = struct.unpack_from("<I", data, offset + 8)[0]
-            form_id = struct.unpack_from("<I", data, offset + 12)[0]
+                group_end = offset + group_size
+                if group_end > end:
+                    logger.warning(
+                        "[_parse_records] GRUP 超出数据范围 group_end %d end %d offset %d",
+                        group_end, end, offset,
+                    )
+                    # 尝试用剩余数据继续解析
+                    group_end = end
 
-            record_data_start = offset + RECORD_HEADER_SIZE
-            record_data_end = record_data_start + data_size
+                # 进入 GRUP 内部，外层结束位置入栈
+                stack.append(end)
+                offset += GRUP_HEADER_SIZE
+                end = group_end
 
-            if record_data_end > end:
-                logger.warning(
-                    "[_parse_records] 记录数据超出范围 rec_type %s data_size %d offset %d",
-                    rec_type.decode("ascii", errors="replace"), data_size, offset,
-                )
-                break
+            else:
+                # 解析普通记录
+                rec_type = bytes(data[offset : offset + 4])
+                if offset + RECORD_HEADER_SIZE > end:
+                    logger.warning("[_parse_records] 记录头部不完整 offset %d rec_type %s", offset, rec_type.decode("ascii", errors="replace"))
+                    break
+
+                data_size, flags, form_id = _unpack_record_header(data, offset + 4)
 
-            record_data = data[record_data_start:record_data_end]
+                record_data_start = offset + RECORD_HEADER_SIZE
+                record_data_end = record_data_start + data_size
 
-            # 处理压缩记录
-            if flags & COMPRESSED_FLAG:
-                if len(record_data) < 4:
+                if record_data_end > end:
                     logger.warning(
-                        "[_parse_records] 压缩记录数据不足 rec_type %s form_id %08X offset %d",
-                        rec_type.decode("ascii", errors="replace"), form_id, offset,
+                        "[_parse_records] 记录数据超出范围 rec_type %s data_size %d offset %d",
+                        rec_type.decode("ascii", errors="replace"), data_size, offset,
                     )
-                    offset = record_data_end
-                    continue
-                decompressed_size = struct.unpack_from("<I", record_data, 0)[0]
+                    break
+
+                record_data = data[record_data_start:record_data_end]
+
+                # 处理压缩记录
+                if flags & COMPRESSED_FLAG:
+                    if len(record_data) < 4:
+                        logger.warning(
+                            "[_parse_records] 压缩记录数据不足 rec_type %s form_id %08X offset %d",
+                            rec_type.decode("ascii", errors="replace"), form_id, offset,
+                        )
+                        offset = record_data_end
+                        continue
+                    decompressed_size = _unpack_u32(record_data, 0)[0]
+                    try:
+                        record_data = zlib_impl.decompress(record_data[4:], bufsize=decompressed_size)
+                    except zlib_impl.error:
+                        logger.warning(
+                            "[_parse_records] zlib 解压失败 rec_type %s form_id %08X offset %d",
+                            rec_type.decode("ascii", errors="replace"), form_id, offset,
+                        )
+                        offset = record_data_end
+                        continue
+
+                # 解析子记录提取可翻译文本
                 try:
-                    record_data = zlib.decompress(record_data[4:], bufsize=decompressed_size)
-                except zlib.error:
+                    sub_records = _parse_subrecords(record_data, rec_type, form_id)
+                    records.extend(sub_records)
+                except Exception:
                     logger.warning(
-                        "[_parse_records] zlib 解压失败 rec_type %s form_id %08X offset %d",
+                        "[_parse_records] 解析子记录异常 rec_type %s form_id %08X offset %d",
                         rec_type.decode("ascii", errors="replace"), form_id, offset,
+                        exc_info=True,
                     )
-                    offset = record_data_end
-                    continue
-
-            # 解析子记录提取可翻译文本
-            try:
-                sub_records = _parse_subrecords(record_data, rec_type, form_id)
-                records.extend(sub_records)
-            except Exception:
-                logger.warning(
-                    "[_parse_records] 解析子记录异常 rec_type %s form_id %08X offset %d",
-                    rec_type.decode("ascii", errors="replace"), form_id, offset,
-                    exc_info=True,
-                )
-
-            offset = record_data_end
+
+                offset = record_data_end
+
+        # 当前层级处理结束：回到外层 GRUP，从该 GRUP 的结束位置继续
+        if not stack:
+            break
+        offset = end
+        end = stack.pop()
 
     return records, offset
 
@@ -244,33 +321,33 @@ def parse_esm(file_path: str) -> list[StringRecord]:
     logger.info("[parse_esm] 开始解析 ESM 文件 file_path %s", file_path)
 
     with open(file_path, "rb") as f:
-        data = f.read()
-
-    if len(data) == 0:
-        logger.info("[parse_esm] 空文件 file_path %s", file_path)
-        return []
-
-    # ESM 文件最小需要一个 TES4 记录头部
-    if len(data) < RECORD_HEADER_SIZE:
-        logger.warning("[parse_esm] 文件过小无法解析 file_path %s size %d", file_path, len(data))
-        return []
-
-    # 验证文件头部是否为 TES4 记录
-    header_type = data[0:4]
-    if header_type != b"TES4":
-        logger.warning("[parse_esm] 文件头部不是 TES4 file_path %s header %s", file_path, header_type.decode("ascii", errors="replace"))
-        return []
-
-    # 跳过 TES4 头部记录
-    header_data_size = struct.unpack_from("<I", data, 4)[0]
-    first_record_offset = RECORD_HEADER_SIZE + header_data_size
-
-    if first_record_offset > len(data):
-        logger.warning("[parse_esm] TES4 头部大小超出文件范围 file_path %s", file_path)
-        return []
-
-    # 解析 TES4 之后的所有记录
-    records, _ = _parse_records(data, first_record_offset, len(data))
+        if os.fstat(f.fileno()).st_size == 0:
+            logger.info("[parse_esm] 空文件 file_path %s", file_path)
+            return []
+
+        # 通过 mmap 直接在页缓存上解析，避免把整个文件复制进内存
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as data:
+            # ESM 文件最小需要一个 TES4 记录头部
+            if len(data) < RECORD_HEADER_SIZE:
+                logger.warning("[parse_esm] 文件过小无法解析 file_path %s size %d", file_path, len(data))
+                return []
+
+            # 验证文件头部是否为 TES4 记录
+            header_type = bytes(data[0:4])
+            if header_type != b"TES4":
+                logger.warning("[parse_esm] 文件头部不是 TES4 file_path %s header %s", file_path, header_type.decode("ascii", errors="replace"))
+                return []
+
+            # 跳过 TES4 头部记录
+            header_data_size = _unpack_u32(data, 4)[0]
+            first_record_offset = RECORD_HEADER_SIZE + header_data_size
+
+            if first_record_offset > len(data):
+                logger.warning("[parse_esm] TES4 头部大小超出文件范围 file_path %s", file_path)
+                return []
+
+            # 解析 TES4 之后的所有记录
+            records, _ = _parse_records(data, first_record_offset, len(data))
 
     logger.info("[parse_esm] 解析完成 file_path %s records_count %d", file_path, len(records))
     return records
@@ -299,7 +376,7 @@ def parse_esm_bytes(data: bytes) -> list[StringRecord]:
         logger.warning("[parse_esm_bytes] 数据头部不是 TES4 header %s", header_type.decode("ascii", errors="replace"))
         return []
 
-    header_data_size = struct.unpack_from("<I", data, 4)[0]
+    header_data_size = _unpack_u32(data, 4)[0]
     first_record_offset = RECORD_HEADER_SIZE + header_data_size
 
     if first_record_offset > len(data):
@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import logging
+import mmap
+import os
 import shutil
 import struct
 from dataclasses import dataclass
@@ -11,14 +13,21 @@ from typing import Dict, Optional
 
 from engine.esm_parser import (
     GRUP_HEADER_SIZE,
+    GRUP_TAG,
     RECORD_HEADER_SIZE,
     SUBRECORD_HEADER_SIZE,
-    TRANSLATABLE_COMBINATIONS,
-    TRANSLATABLE_SUBRECORD_TYPES,
+    TRANSLATABLE_SUBRECORD_TAGS,
+    TRANSLATABLE_TAGS_BY_RECORD,
 )
 
 logger = logging.getLogger(__name__)
 
+# 预编译的 struct 解析/打包器，避免热路径上重复解析格式字符串
+_unpack_subrecord_header = struct.Struct("<IH").unpack_from
+_unpack_u32 = struct.Struct("<I").unpack_from
+_pack_u16 = struct.Struct("<H").pack
+_pack_u32_into = struct.Struct("<I").pack_into
+
 
 @dataclass
 class WriteResult:
@@ -28,68 +37,75 @@ class WriteResult:
     output_path: str
 
 
-def _build_record_id(record_type: bytes, form_id: int, subrecord_type: bytes) -> str:
-    """构建唯一的记录 ID，格式为 record_type:form_id_hex:subrecord_type。"""
-    return f"{record_type.decode('ascii')}:{form_id:08X}:{subrecord_type.decode('ascii')}"
+def _touched_records(translations: Dict[str, str]) -> set[tuple[bytes, int]]:
+    """从翻译 key 中提取涉及的 (record_type, form_id) 集合，用于跳过无需改写的记录。"""
+    touched: set[tuple[bytes, int]] = set()
+    for record_id in translations:
+        parts = record_id.split(":", 2)
+        if len(parts) < 3:
+            continue
+        try:
+            touched.add((parts[0].encode("ascii"), int(parts[1], 16)))
+        except (UnicodeEncodeError, ValueError):
+            continue
+    return touched
 
 
 def _rewrite_subrecords(
     data: bytes,
+    offset: int,
+    end: int,
     record_type: bytes,
     form_id: int,
     translations: Dict[str, str],
-) -> bytes:
-    """重写记录内的子记录，替换已翻译的文本。
+    out: bytearray,
+) -> None:
+    """重写记录内 [offset, end) 范围的子记录，替换已翻译的文本并追加到 out。
 
     同一 form_id 下多个同类型子记录通过序号区分：
     第一个为 RECORD_TYPE:FORM_ID:SUBRECORD_TYPE，
     后续为 RECORD_TYPE:FORM_ID:SUBRECORD_TYPE#1、#2 等。
-
-    返回重写后的子记录字节数据。
     """
-    parts: list[bytes] = []
-    offset = 0
-    sub_type_counts: dict[bytes, int] = {}
+    # record_id 格式为 record_type:form_id_hex:subrecord_type，前缀在同一记录内不变
+    id_prefix = f"{record_type.decode('ascii')}:{form_id:08X}:"
+    lookup = translations.get
+    rec_tag = int.from_bytes(record_type, "little")
+    translatable_tags = TRANSLATABLE_TAGS_BY_RECORD.get(rec_tag, TRANSLATABLE_SUBRECORD_TAGS)
+    sub_type_counts: dict[int, int] = {}
 
-    while offset < len(data):
-        if offset + SUBRECORD_HEADER_SIZE > len(data):
-            parts.append(data[offset:])
+    while offset < end:
+        if offset + SUBRECORD_HEADER_SIZE > end:
+            out += data[offset:end]
             break
 
-        sub_type = data[offset : offset + 4]
-        sub_size = struct.unpack_from("<H", data, offset + 4)[0]
+        sub_tag, sub_size = _unpack_subrecord_header(data, offset)
+        sub_end = offset + SUBRECORD_HEADER_SIZE + sub_size
 
-        if offset + SUBRECORD_HEADER_SIZE + sub_size > len(data):
-            parts.append(data[offset:])
+        if sub_end > end:
+            out += data[offset:end]
             break
 
-        sub_data = data[offset + SUBRECORD_HEADER_SIZE : offset + SUBRECORD_HEADER_SIZE + sub_size]
-
-        is_translatable = (
-            sub_type in TRANSLATABLE_SUBRECORD_TYPES
-            or (record_type, sub_type) in TRANSLATABLE_COMBINATIONS
-        )
-        if is_translatable and sub_size > 0:
-            count = sub_type_counts.get(sub_type, 0)
+        if sub_size > 0 and sub_tag in translatable_tags:
+            sub_type = bytes(data[offset : offset + 4])
+            count = sub_type_counts.get(sub_tag, 0)
             if count == 0:
-                record_id = _build_record_id(record_type, form_id, sub_type)
+                record_id = id_prefix + sub_type.decode("ascii")
             else:
-                record_id = _build_record_id(record_type, form_id, sub_type) + f"#{count}"
-            sub_type_counts[sub_type] = count + 1
+                record_id = f"{id_prefix}{sub_type.decode('ascii')}#{count}"
+            sub_type_counts[sub_tag] = count + 1
 
-            if record_id in translations:
-                new_text = translations[record_id]
+            new_text = lookup(record_id)
+            if new_text is not None:
                 new_data = new_text.encode("utf-8") + b"\x00"
-                new_size = len(new_data)
-                parts.append(sub_type + struct.pack("<H", new_size) + new_data)
-                offset += SUBRECORD_HEADER_SIZE + sub_size
+                out += sub_type
+                out += _pack_u16(len(new_data))
+                out += new_data
+                offset = sub_end
                 continue
 
         # 保持原始子记录不变
-        parts.append(data[offset : offset + SUBRECORD_HEADER_SIZE + sub_size])
-        offset += SUBRECORD_HEADER_SIZE + sub_size
-
-    return b"".join(parts)
+        out += data[offset:sub_end]
+        offset = sub_end
 
 
 def _rewrite_records(
@@ -97,66 +113,80 @@ def _rewrite_records(
     offset: int,
     end: int,
     translations: Dict[str, str],
-) -> bytes:
-    """递归重写记录和 GRUP，替换翻译文本并调整长度字段。
+    out: bytearray,
+    touched: set[tuple[bytes, int]],
+) -> None:
+    """重写记录和 GRUP，替换翻译文本并调整长度字段。
 
-    返回重写后的字节数据。
-    """
-    parts: list[bytes] = []
-
-    while offset < end:
-        if offset + 4 > end:
-            parts.append(data[offset:end])
-            break
+    重写结果直接追加到 out：先写入原始头部，写完内容后再原地修正长度字段，
+    避免拼接中间字节串。不在 touched 中的完整记录整体原样复制。
 
-        rec_type = data[offset : offset + 4]
+    嵌套 GRUP 通过显式栈遍历：进入 GRUP 时压入 (外层结束位置, GRUP 头部在 out 中的位置)，
+    内层处理结束后弹出、修正 group_size，并从 GRUP 结束位置继续。
+    """
+    stack: list[tuple[int, int]] = []
 
-        if rec_type == b"GRUP":
-            if offset + GRUP_HEADER_SIZE > end:
-                parts.append(data[offset:end])
+    while True:
+        while offset < end:
+            if offset + 4 > end:
+                out += data[offset:end]
                 break
 
-            group_size = struct.unpack_from("<I", data, offset + 4)[0]
-            group_end = min(offset + group_size, end)
-
-            # 保留 GRUP 头部（稍后更新 group_size）
-            grup_header = bytearray(data[offset : offset + GRUP_HEADER_SIZE])
+            if _unpack_u32(data, offset)[0] == GRUP_TAG:
+                if offset + GRUP_HEADER_SIZE > end:
+                    out += data[offset:end]
+                    break
 
-            # 递归重写 GRUP 内部记录
-            inner_data = _rewrite_records(data, offset + GRUP_HEADER_SIZE, group_end, translations)
+                group_size = _unpack_u32(data, offset + 4)[0]
+                if group_size < GRUP_HEADER_SIZE:
+                    out += data[offset:end]
+                    break
+                group_end = min(offset + group_size, end)
 
-            # 更新 group_size
-            new_group_size = GRUP_HEADER_SIZE + len(inner_data)
-            struct.pack_into("<I", grup_header, 4, new_group_size)
+                # 写入 GRUP 头部（内层处理结束后更新 group_size）
+                stack.append((end, len(out)))
+                out += data[offset : offset + GRUP_HEADER_SIZE]
+                offset += GRUP_HEADER_SIZE
+                end = group_end
 
-            parts.append(bytes(grup_header) + inner_data)
-            offset = group_end
+            else:
+                if offset + RECORD_HEADER_SIZE > end:
+                    out += data[offset:end]
+                    break
 
-        else:
-            if offset + RECORD_HEADER_SIZE > end:
-                parts.append(data[offset:end])
-                break
+                # 记录类型字节仅用于 touched 查找和子记录重写，非 GRUP 时才取出
+                rec_type = bytes(data[offset : offset + 4])
+                data_size = _unpack_u32(data, offset + 4)[0]
+                form_id = _unpack_u32(data, offset + 12)[0]
 
-            data_size = struct.unpack_from("<I", data, offset + 4)[0]
-            form_id = struct.unpack_from("<I", data, offset + 12)[0]
+                record_data_start = offset + RECORD_HEADER_SIZE
+                record_data_end = record_data_start + data_size
 
-            record_data_start = offset + RECORD_HEADER_SIZE
-            record_data_end = min(record_data_start + data_size, end)
+                # 没有任何翻译指向该记录，且数据完整时直接原样复制
+                if record_data_end <= end and (rec_type, form_id) not in touched:
+                    out += data[offset:record_data_end]
+                    offset = record_data_end
+                    continue
 
-            # 保留记录头部（稍后更新 data_size）
-            rec_header = bytearray(data[offset : offset + RECORD_HEADER_SIZE])
+                record_data_end = min(record_data_end, end)
 
-            # 重写子记录
-            original_sub_data = data[record_data_start:record_data_end]
-            new_sub_data = _rewrite_subrecords(original_sub_data, rec_type, form_id, translations)
+                # 写入记录头部（稍后更新 data_size）
+                header_pos = len(out)
+                out += data[offset:record_data_start]
 
-            # 更新 data_size
-            struct.pack_into("<I", rec_header, 4, len(new_sub_data))
+                # 重写子记录
+                _rewrite_subrecords(data, record_data_start, record_data_end, rec_type, form_id, translations, out)
 
-            parts.append(bytes(rec_header) + new_sub_data)
-            offset = record_data_end
+                # 更新 data_size
+                _pack_u32_into(out, header_pos + 4, len(out) - header_pos - RECORD_HEADER_SIZE)
+                offset = record_data_end
 
-    return b"".join(parts)
+        # 当前层级处理结束：更新所属 GRUP 的 group_size，并从该 GRUP 的结束位置继续
+        if not stack:
+            break
+        offset = end
+        end, header_pos = stack.pop()
+        _pack_u32_into(out, header_pos + 4, len(out) - header_pos)
 
 
 def write_esm(
@@ -190,12 +220,13 @@ def write_esm(
     shutil.copy2(str(original), backup_path)
     logger.info("[write_esm] 已备份原始文件 backup_path %s", backup_path)
 
-    # 读取原始数据
+    # 通过 mmap 读取原始数据并重写，避免先把整个文件复制进内存
     with open(original_path, "rb") as f:
-        data = f.read()
-
-    # 重写数据
-    new_data = rewrite_esm_bytes(data, translations)
+        if os.fstat(f.fileno()).st_size == 0:
+            new_data = b""
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as data:
+                new_data = rewrite_esm_bytes(data, translations)
 
     # 写入输出文件
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
@@ -206,7 +237,7 @@ def write_esm(
     return WriteResult(backup_path=backup_path, output_path=output_path)
 
 
-def rewrite_esm_bytes(data: bytes, translations: Dict[str, str]) -> bytes:
+def rewrite_esm_bytes(data: bytes, translations: Dict[str, str]) -> bytes | bytearray:
     """在内存中重写 ESM 数据，替换翻译文本并调整长度字段。
 
     主要用于测试和内存中处理场景。
@@ -216,25 +247,23 @@ def rewrite_esm_bytes(data: bytes, translations: Dict[str, str]) -> bytes:
         translations: 记录 ID 到翻译文本的映射。
 
     Returns:
-        重写后的 ESM 二进制数据。
+        重写后的 ESM 二进制数据，即重写时使用的 bytearray，不再整体复制一次；
+        数据不是合法 ESM 时以 bytes 原样返回。
     """
     if len(data) < RECORD_HEADER_SIZE:
-        return data
+        return bytes(data)
 
-    header_type = data[0:4]
-    if header_type != b"TES4":
-        return data
+    if data[0:4] != b"TES4":
+        return bytes(data)
 
-    header_data_size = struct.unpack_from("<I", data, 4)[0]
+    header_data_size = _unpack_u32(data, 4)[0]
     first_record_offset = RECORD_HEADER_SIZE + header_data_size
 
     if first_record_offset > len(data):
-        return data
-
-    # TES4 头部保持不变
-    tes4_part = data[:first_record_offset]
+        return bytes(data)
 
-    # 重写后续记录
-    records_part = _rewrite_records(data, first_record_offset, len(data), translations)
+    # TES4 头部保持不变，后续记录直接写入同一缓冲区
+    out = bytearray(data[:first_record_offset])
+    _rewrite_records(data, first_record_offset, len(data), translations, out, _touched_records(translations))
 
-    return tes4_part + records_part
+    return out
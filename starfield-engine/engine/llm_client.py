@@ -4,31 +4,207 @@ from __future__ import annotations
 
 import logging
 import os
+import random
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from typing import Callable, Dict, List, Optional, Union
 
+import orjson
 from openai import OpenAI
 
+from engine import translation_cache
 from engine.esm_parser import StringRecord
-from engine.prompt_builder import build_prompt
+from engine.prompt_builder import build_dictionary_section, build_prompt
 
 logger = logging.getLogger(__name__)
 
 # 重试配置
 MAX_RETRIES = 3
-RETRY_DELAYS = [1, 2, 4]  # 指数退避间隔（秒）
+RETRY_DELAYS = [1, 2, 4]  # 指数退避间隔（秒），实际等待再叠加至多一半的随机抖动
+
+# 熔断配置：连续失败达到阈值后，冷却期内的批次直接跳过 LLM 调用
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_BASE_COOLDOWN = 5  # 首次熔断冷却时间（秒），之后每次翻倍
+BREAKER_MAX_COOLDOWN = 120
+
+# 自适应分批：每批待翻译文本的输入 token 预算，按约 4 字符/token 估算，另计每行编号开销
+DEFAULT_MAX_INPUT_TOKENS = 2000
+_CHARS_PER_TOKEN = 4
+_LINE_TOKEN_OVERHEAD = 3
 
 # 匹配 <...> 标签的正则
 _TAG_PATTERN = re.compile(r"<[^>]+>")
 
+# 匹配 {{TAG_N}} 占位符的正则
+_PLACEHOLDER_PATTERN = re.compile(r"\{\{TAG_(\d+)\}\}")
+
+# 预生成的 {{TAG_N}} 占位符，超出范围时再临时格式化
+_PLACEHOLDER_CACHE_SIZE = 256
+_PLACEHOLDERS = tuple(f"{{{{TAG_{i}}}}}" for i in range(_PLACEHOLDER_CACHE_SIZE))
+
+# 匹配 LLM 返回的 [编号] 译文 行
+_NUMBERED_LINE_PATTERN = re.compile(r"\[(\d+)\]\s*(.*)")
+
+
+class _CircuitBreaker:
+    """跨批次共享的熔断器。
+
+    状态为 closed / open / half_open：连续失败达到阈值时打开，冷却期内拒绝调用；
+    冷却结束后进入 half_open，只放行一个探测请求，成功则关闭，失败则以更长的冷却期重新打开。
+    打开期间返回的结果来自熔断前已发出的请求，不影响状态。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """恢复为关闭状态并清空失败计数。"""
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.probing = False
+
+    def allow(self) -> bool:
+        """当前是否允许发起 LLM 调用。"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = "half_open"
+            # 半开状态下同一时刻只放行一个探测请求
+            if self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self) -> None:
+        """调用成功，关闭熔断器；打开期间到达的成功结果忽略。"""
+        with self._lock:
+            if self.state == "open":
+                return
+            self.reset()
+
+    def record_failure(self) -> None:
+        """调用失败，关闭状态下达到阈值或半开探测失败时打开熔断器；打开期间到达的失败忽略。"""
+        with self._lock:
+            if self.state == "open":
+                return
+            self.failures += 1
+            if self.state == "closed" and self.failures < BREAKER_FAILURE_THRESHOLD:
+                return
+            self.cooldown = min(
+                BREAKER_MAX_COOLDOWN, BREAKER_BASE_COOLDOWN * 2 ** self.trips,
+            ) + random.uniform(0, BREAKER_BASE_COOLDOWN)
+            self.trips += 1
+            self.state = "open"
+            self.probing = False
+            self.opened_at = time.monotonic()
+            logger.error(
+                "[_CircuitBreaker] LLM 连续失败触发熔断 failures %d cooldown %.1fs",
+                self.failures, self.cooldown,
+            )
+
+
+_breaker = _CircuitBreaker()
+
+
+class _TokenBucket:
+    """令牌桶限流器，按每分钟请求数匀速补充令牌，桶容量为一分钟的额度。"""
+
+    def __init__(self, requests_per_minute: int) -> None:
+        self._rate = requests_per_minute / 60.0
+        self._capacity = float(requests_per_minute)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """取得一个令牌，令牌不足时阻塞等待补充。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+@dataclass(slots=True)
+class _Endpoint:
+    """一组 API Key / Base URL 对应的客户端及其限流器。"""
+
+    client: OpenAI
+    limiter: _TokenBucket | None = None
+
+
+def _split_env_list(name: str) -> list[str]:
+    """读取逗号分隔的环境变量，去除空白项。"""
+    return [item.strip() for item in os.environ.get(name, "").split(",") if item.strip()]
+
+
+def _get_requests_per_minute() -> int:
+    """获取单个 API Key 每分钟请求数上限（LLM_RPM_PER_KEY），0 表示不限流。"""
+    try:
+        return max(0, int(os.environ.get("LLM_RPM_PER_KEY", "0")))
+    except ValueError:
+        return 0
+
+
+_endpoints: list[_Endpoint] | None = None
+_endpoints_lock = threading.Lock()
 
-def _get_client() -> OpenAI:
-    """创建 OpenAI 客户端，从环境变量读取配置。"""
-    return OpenAI(
-        api_key=os.environ.get("LLM_API_KEY", ""),
-        base_url=os.environ.get("LLM_BASE_URL", "https://api.deepseek.com/v1"),
-    )
+
+def _get_endpoints() -> list[_Endpoint]:
+    """获取进程内共享的 LLM 接入端点列表，首次调用时从环境变量读取配置创建。
+
+    LLM_API_KEYS / LLM_BASE_URLS 为逗号分隔的多组配置（未设置时回退到 LLM_API_KEY / LLM_BASE_URL），
+    数量不一致时较短的一方循环补齐，各批次按轮询分配到不同端点以突破单个 Key 的 RPM 限制。
+    所有客户端共用一个 httpx 连接池，连续翻译多个任务时无需重复建立 TLS 连接；
+    连接数上限需覆盖 LLM_MAX_CONCURRENCY 个并发批次。
+    """
+    global _endpoints
+    with _endpoints_lock:
+        if _endpoints is None:
+            import httpx
+
+            api_keys = _split_env_list("LLM_API_KEYS") or [os.environ.get("LLM_API_KEY", "")]
+            base_urls = _split_env_list("LLM_BASE_URLS") or [
+                os.environ.get("LLM_BASE_URL", "https://api.deepseek.com/v1")
+            ]
+            requests_per_minute = _get_requests_per_minute()
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                # 流式响应下读超时作用于相邻分块之间
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            )
+
+            _endpoints = [
+                _Endpoint(
+                    client=OpenAI(
+                        api_key=api_keys[i % len(api_keys)],
+                        base_url=base_urls[i % len(base_urls)],
+                        http_client=http_client,
+                    ),
+                    limiter=_TokenBucket(requests_per_minute) if requests_per_minute else None,
+                )
+                for i in range(max(len(api_keys), len(base_urls)))
+            ]
+            logger.info(
+                "[_get_endpoints] LLM 端点初始化完成 endpoints_count %d rpm_per_key %d",
+                len(_endpoints), requests_per_minute,
+            )
+        return _endpoints
 
 
 def _get_model() -> str:
@@ -36,57 +212,134 @@ def _get_model() -> str:
     return os.environ.get("LLM_MODEL", "deepseek-reasoner")
 
 
+def _use_json_output() -> bool:
+    """是否启用 JSON 输出模式（LLM_JSON_OUTPUT），需模型支持 response_format=json_object。"""
+    return os.environ.get("LLM_JSON_OUTPUT", "").lower() in ("1", "true", "yes")
+
+
+def _get_max_concurrency() -> int:
+    """获取同时进行的 LLM 批次请求数上限，默认 8。"""
+    try:
+        return max(1, int(os.environ.get("LLM_MAX_CONCURRENCY", "8")))
+    except ValueError:
+        return 8
+
+
 def _mask_tags(text: str) -> tuple[str, list[str]]:
     """将文本中的 <...> 标签替换为占位符 {{TAG_0}} {{TAG_1}} 等，返回替换后文本和标签列表。"""
-    tags = _TAG_PATTERN.findall(text)
-    masked = text
-    for i, tag in enumerate(tags):
-        masked = masked.replace(tag, f"{{{{TAG_{i}}}}}", 1)
-    return masked, tags
+    tags: list[str] = []
+
+    def _replace(match: re.Match) -> str:
+        idx = len(tags)
+        tags.append(match.group(0))
+        return _PLACEHOLDERS[idx] if idx < _PLACEHOLDER_CACHE_SIZE else f"{{{{TAG_{idx}}}}}"
+
+    return _TAG_PATTERN.sub(_replace, text), tags
 
 
 def _unmask_tags(text: str, tags: list[str]) -> str:
-    """将占位符 {{TAG_0}} 等还原为原始 <...> 标签。"""
-    result = text
-    for i, tag in enumerate(tags):
-        result = result.replace(f"{{{{TAG_{i}}}}}", tag)
-    return result
+    """将占位符 {{TAG_0}} 等还原为原始 <...> 标签，编号超出范围的占位符保持原样。"""
 
+    def _replace(match: re.Match) -> str:
+        idx = int(match.group(1))
+        return tags[idx] if idx < len(tags) else match.group(0)
 
-def _parse_response(response_text: str, records: list[StringRecord]) -> dict[str, str]:
-    """解析 LLM 返回的翻译文本，按编号与原始记录 ID 匹配。
+    return _PLACEHOLDER_PATTERN.sub(_replace, text)
 
-    LLM 返回格式为 [编号] 译文，按编号匹配对应的原始记录。
 
-    Args:
-        response_text: LLM 返回的翻译文本。
-        records: 原始 StringRecord 列表。
+class _ResponseParser:
+    """[编号] 译文 格式的增量解析器。
 
-    Returns:
-        record_id -> translated_text 的映射字典。
+    流式响应的内容分块调用 feed() 喂入，遇到换行即解析完整的行；
+    每个编号对应一个行缓冲，非编号的续行追加到当前编号，支持多行译文。
     """
-    import re
-
-    # 解析 [编号] 译文 格式，支持多行译文
-    translations: dict[int, str] = {}
-    current_idx: int | None = None
-    current_lines: list[str] = []
 
-    for line in response_text.strip().split("\n"):
-        match = re.match(r"\[(\d+)\]\s*(.*)", line)
+    def __init__(self) -> None:
+        self._pending: list[str] = []  # 尚未遇到换行的残余内容
+        self._buffers: dict[int, list[str]] = {}
+        self._current: list[str] | None = None
+
+    def feed(self, chunk: str) -> None:
+        """喂入一段响应内容。"""
+        if "\n" not in chunk:
+            self._pending.append(chunk)
+            return
+
+        self._pending.append(chunk)
+        lines = "".join(self._pending).split("\n")
+        self._pending = [lines.pop()]
+        for line in lines:
+            self._feed_line(line)
+
+    def feed_all(self, response_text: str) -> None:
+        """一次性喂入完整响应，直接按行切分，不经过分块缓冲。
+
+        与 feed() 相同只按换行符切分；splitlines() 还会在垂直制表符、Unicode 行分隔符等可能出现在译文中的字符处断行。
+        """
+        for line in response_text.split("\n"):
+            self._feed_line(line)
+
+    def _feed_line(self, line: str) -> None:
+        if not line:
+            # 空行不可能是编号行，作为续行保留（书籍等多段译文的段落分隔）
+            if self._current is not None:
+                self._current.append(line)
+            return
+        line = line.rstrip("\r")
+        match = _NUMBERED_LINE_PATTERN.match(line)
         if match:
-            # 保存上一条
-            if current_idx is not None:
-                translations[current_idx] = "\n".join(current_lines).strip()
-            current_idx = int(match.group(1))
-            current_lines = [match.group(2)]
-        elif current_idx is not None:
-            current_lines.append(line)
-
-    # 保存最后一条
-    if current_idx is not None:
-        translations[current_idx] = "\n".join(current_lines).strip()
+            self._current = self._buffers[int(match.group(1))] = [match.group(2)]
+        elif self._current is not None:
+            self._current.append(line)
+
+    def finish(self, records: list[StringRecord]) -> dict[str, str]:
+        """结束解析，按编号与原始记录 ID 匹配，缺失或为空的译文回退到原文。"""
+        if self._pending:
+            self._feed_line("".join(self._pending))
+            self._pending = []
+
+        translations = {idx: "\n".join(lines).strip() for idx, lines in self._buffers.items()}
+        return _match_translations(translations, records)
+
 
+class _JsonResponseParser:
+    """JSON 输出模式的响应解析器，响应为以编号字符串为键、译文为值的 JSON 对象。
+
+    JSON 需完整接收后才能解析，feed() 只累积内容；响应不是 JSON 对象时退回 [编号] 译文 格式解析。
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+
+    def feed(self, chunk: str) -> None:
+        """喂入一段响应内容。"""
+        self._chunks.append(chunk)
+
+    def finish(self, records: list[StringRecord]) -> dict[str, str]:
+        """结束解析，按编号与原始记录 ID 匹配，缺失或为空的译文回退到原文。"""
+        response_text = "".join(self._chunks)
+        try:
+            data = orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            data = None
+
+        if not isinstance(data, dict):
+            logger.warning(
+                "[_JsonResponseParser] 响应不是 JSON 对象 按编号行格式解析 length %d",
+                len(response_text),
+            )
+            return _parse_response(response_text, records)
+
+        translations = {
+            int(key): value.strip()
+            for key, value in data.items()
+            if key.isdigit() and isinstance(value, str)
+        }
+        return _match_translations(translations, records)
+
+
+def _match_translations(translations: dict[int, str], records: list[StringRecord]) -> dict[str, str]:
+    """按编号（从 1 开始）将译文与原始记录 ID 匹配，缺失或为空的译文回退到原文。"""
     result: dict[str, str] = {}
 
     for i, record in enumerate(records):
@@ -96,26 +349,83 @@ def _parse_response(response_text: str, records: list[StringRecord]) -> dict[str
             result[record.record_id] = translated
         else:
             logger.warning(
-                "[_parse_response] 编号 %d 无对应译文 record_id %s",
+                "[_match_translations] 编号 %d 无对应译文 record_id %s",
                 idx, record.record_id,
             )
             result[record.record_id] = record.text
 
+    # 每批只输出一条汇总日志，未启用 INFO 时不拼接明细
+    if logger.isEnabledFor(logging.INFO):
         logger.info(
-            "[_parse_response] record_id %s 原文 %s 译文 %s",
-            record.record_id, record.text, result[record.record_id],
+            "[_match_translations] 批次译文 records_count %d\n%s",
+            len(records),
+            "\n".join(
+                f"record_id {record.record_id} 原文 {record.text} 译文 {result[record.record_id]}"
+                for record in records
+            ),
         )
 
     return result
 
 
+def _parse_response(response_text: str, records: list[StringRecord]) -> dict[str, str]:
+    """解析 LLM 返回的完整翻译文本，按编号与原始记录 ID 匹配。
+
+    LLM 返回格式为 [编号] 译文，按编号匹配对应的原始记录。
+
+    Args:
+        response_text: LLM 返回的翻译文本。
+        records: 原始 StringRecord 列表。
+
+    Returns:
+        record_id -> translated_text 的映射字典。
+    """
+    parser = _ResponseParser()
+    parser.feed_all(response_text)
+    return parser.finish(records)
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算一条待翻译文本在 Prompt 中占用的 token 数。"""
+    return len(text) // _CHARS_PER_TOKEN + _LINE_TOKEN_OVERHEAD
+
+
+def _pack_batches(
+    records: list[StringRecord],
+    batch_size: int,
+    max_input_tokens: int,
+) -> list[list[StringRecord]]:
+    """按输入 token 预算贪心分批，每批记录数不超过 batch_size。
+
+    短文本可以填满 batch_size，长文本则提前截断批次；单条超出预算的记录独占一批。
+    """
+    batches: list[list[StringRecord]] = []
+    current: list[StringRecord] = []
+    current_tokens = 0
+
+    for record in records:
+        tokens = _estimate_tokens(record.text)
+        if current and (current_tokens + tokens > max_input_tokens or len(current) >= batch_size):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(record)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
 def _translate_batch(
     client: OpenAI,
     model: str,
     records: list[StringRecord],
     target_lang: str,
     custom_prompt: str | None,
-    dictionary_entries: list[dict] | None,
+    dictionary_section: str | None,
+    json_output: bool = False,
+    limiter: _TokenBucket | None = None,
 ) -> dict[str, str]:
     """翻译单个批次的记录，包含重试逻辑。
 
@@ -125,7 +435,9 @@ def _translate_batch(
         records: 待翻译的 StringRecord 列表。
         target_lang: 目标语言。
         custom_prompt: 用户自定义 Prompt。
-        dictionary_entries: 词典词条列表。
+        dictionary_section: 预先构建的词典约束段，无词典时为 None。
+        json_output: 是否要求 LLM 以 JSON 对象返回译文。
+        limiter: 所用端点的限流器，每次调用（含重试）前取得令牌。
 
     Returns:
         record_id -> translated_text 的映射字典。
@@ -133,25 +445,49 @@ def _translate_batch(
     Raises:
         无异常抛出，失败时返回空字典并记录错误日志。
     """
-    texts = [r.text for r in records]
-
-    # 遮蔽 <...> 标签，防止 LLM 翻译标签内容
-    masked_texts = []
-    tags_map = []  # 每条文本对应的标签列表
-    for text in texts:
-        masked, tags = _mask_tags(text)
-        masked_texts.append(masked)
+    # 遮蔽 <...> 标签，防止 LLM 翻译标签内容；遮蔽后文本相同的记录只发送一次
+    unique_index: dict[str, int] = {}
+    unique_texts: list[str] = []
+    unique_records: list[StringRecord] = []  # 每个唯一文本首次出现的记录
+    record_to_unique: list[int] = []
+    tags_map: list[list[str]] = []  # 每条记录自身的标签列表
+    for record in records:
+        masked, tags = _mask_tags(record.text)
+        idx = unique_index.get(masked)
+        if idx is None:
+            idx = unique_index[masked] = len(unique_texts)
+            unique_texts.append(masked)
+            unique_records.append(record)
+        record_to_unique.append(idx)
         tags_map.append(tags)
 
+    if len(unique_texts) < len(records):
+        logger.info(
+            "[_translate_batch] 批内去重 records_count %d unique_count %d",
+            len(records), len(unique_texts),
+        )
+
     prompt = build_prompt(
-        texts_to_translate=masked_texts,
+        texts_to_translate=unique_texts,
         custom_prompt=custom_prompt,
-        dictionary_entries=dictionary_entries,
+        dictionary_section=dictionary_section,
+        json_output=json_output,
     )
+    extra_params = {"response_format": {"type": "json_object"}} if json_output else {}
 
     system_message = f"You are a professional game localization translator. Translate the text to {target_lang}."
 
     for attempt in range(MAX_RETRIES):
+        if not _breaker.allow():
+            logger.error(
+                "[_translate_batch] LLM 熔断中 跳过批次 records_count %d",
+                len(records),
+            )
+            return {}
+
+        if limiter is not None:
+            limiter.acquire()
+
         try:
             response = client.chat.completions.create(
                 model=model,
@@ -159,20 +495,39 @@ def _translate_batch(
                     {"role": "system", "content": system_message},
                     {"role": "user", "content": prompt},
                 ],
+                stream=True,
+                **extra_params,
             )
-            response_text = response.choices[0].message.content or ""
-            result = _parse_response(response_text, records)
-            # 还原标签占位符
-            for i, record in enumerate(records):
-                if record.record_id in result and tags_map[i]:
-                    result[record.record_id] = _unmask_tags(result[record.record_id], tags_map[i])
+            # 流式接收，编号行格式边生成边解析已完整的行
+            parser = _JsonResponseParser() if json_output else _ResponseParser()
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    parser.feed(content)
+            parsed = parser.finish(unique_records)
+            # 将唯一文本的译文分发回所有记录，并按各记录自身的标签还原占位符
+            result: dict[str, str] = {}
+            for record, idx, tags in zip(records, record_to_unique, tags_map):
+                representative = unique_records[idx]
+                translated = parsed[representative.record_id]
+                if translated == representative.text:
+                    # 漏译回退为原文时使用本记录自己的原文
+                    translated = record.text
+                elif tags:
+                    translated = _unmask_tags(translated, tags)
+                result[record.record_id] = translated
+            _breaker.record_success()
             return result
 
         except Exception as e:
+            _breaker.record_failure()
             if attempt < MAX_RETRIES - 1:
-                delay = RETRY_DELAYS[attempt]
+                # 叠加随机抖动，避免并发批次在同一时刻集中重试
+                delay = RETRY_DELAYS[attempt] + random.uniform(0, RETRY_DELAYS[attempt] / 2)
                 logger.warning(
-                    "[_translate_batch] LLM 调用失败 attempt %d/%d delay %ds error %s",
+                    "[_translate_batch] LLM 调用失败 attempt %d/%d delay %.1fs error %s",
                     attempt + 1, MAX_RETRIES, delay, str(e),
                 )
                 time.sleep(delay)
@@ -191,20 +546,24 @@ def translate_records(
     custom_prompt: str | None = None,
     dictionary_entries: list[dict] | None = None,
     batch_size: int = 20,
+    max_input_tokens: int = DEFAULT_MAX_INPUT_TOKENS,
     on_batch_done: Callable[[int], None] | None = None,
     on_batch_translated: Callable[[dict[str, str], list[StringRecord]], None] | None = None,
 ) -> dict[str, str]:
     """批量翻译 StringRecord 列表。
 
-    将记录按 batch_size 分批，逐批调用 LLM 翻译。每批独立重试，
-    失败的批次记录错误日志，不影响其他批次。
+    将记录按输入 token 预算分批（每批不超过 batch_size 条），最多 LLM_MAX_CONCURRENCY 个批次并发调用 LLM 翻译。
+    每批独立重试，失败的批次记录错误日志，不影响其他批次。
+    回调按批次完成顺序在调用线程中依次执行。
+    配置 LLM_CACHE_PATH 时先查询本地译文缓存，命中的记录不再发送给 LLM。
 
     Args:
         records: 待翻译的 StringRecord 列表。
         target_lang: 目标语言，默认 zh-CN。
         custom_prompt: 用户自定义 Prompt，None 时使用默认模板。
         dictionary_entries: 词典词条列表。
-        batch_size: 每批翻译的记录数，默认 20。
+        batch_size: 每批翻译的记录数上限，默认 20。
+        max_input_tokens: 每批待翻译文本的估算 token 预算，默认 DEFAULT_MAX_INPUT_TOKENS。
         on_batch_done: 每完成一个 Batch 后的回调函数，参数为当前已翻译总数。
         on_batch_translated: 每完成一个 Batch 后的回调函数，参数为该批翻译结果和对应的原始记录。
 
@@ -221,36 +580,97 @@ def translate_records(
         len(records), batch_size, target_lang,
     )
 
-    client = _get_client()
+    endpoints = _get_endpoints()
     model = _get_model()
     all_translations: dict[str, str] = {}
+    pending = records
 
-    # 按 batch_size 分批
-    for i in range(0, len(records), batch_size):
-        batch = records[i : i + batch_size]
-        batch_num = i // batch_size + 1
-        total_batches = (len(records) + batch_size - 1) // batch_size
-
-        logger.info(
-            "[translate_records] 翻译批次 %d/%d records_count %d",
-            batch_num, total_batches, len(batch),
+    # 本地译文缓存命中的记录直接采用，只将未命中的记录发送给 LLM
+    cache_keys: dict[str, str] = {}
+    if translation_cache.is_enabled():
+        context_hash = translation_cache.build_context_hash(
+            model, target_lang, custom_prompt, dictionary_entries,
         )
-
-        batch_result = _translate_batch(
-            client=client,
-            model=model,
-            records=batch,
-            target_lang=target_lang,
-            custom_prompt=custom_prompt,
-            dictionary_entries=dictionary_entries,
+        cache_keys = {r.record_id: translation_cache.make_key(r.text, context_hash) for r in records}
+        hits = translation_cache.lookup(cache_keys.values())
+        if hits:
+            cached_result: dict[str, str] = {}
+            cached_records: list[StringRecord] = []
+            pending = []
+            for r in records:
+                translated = hits.get(cache_keys[r.record_id])
+                if translated is None:
+                    pending.append(r)
+                else:
+                    cached_result[r.record_id] = translated
+                    cached_records.append(r)
+
+            logger.info(
+                "[translate_records] 本地缓存命中 hit %d remaining %d",
+                len(cached_records), len(pending),
+            )
+            all_translations.update(cached_result)
+            if on_batch_translated is not None:
+                on_batch_translated(cached_result, cached_records)
+            if on_batch_done is not None:
+                on_batch_done(len(all_translations))
+
+    # 词典约束段对所有批次相同，只构建一次
+    dictionary_section = build_dictionary_section(dictionary_entries)
+    json_output = _use_json_output()
+
+    # 按 token 预算分批，所有批次先全部提交到线程池，再按完成顺序收集结果
+    batches = _pack_batches(pending, batch_size, max_input_tokens)
+    total_batches = len(batches)
+    futures = {}
+    with ThreadPoolExecutor(max_workers=_get_max_concurrency()) as executor:
+        logger.info(
+            "[translate_records] 提交批次 total_batches %d endpoints_count %d",
+            total_batches, len(endpoints),
         )
-        all_translations.update(batch_result)
+        for batch_num, batch in enumerate(batches, 1):
+            # 各批次轮询分配到不同端点
+            endpoint = endpoints[batch_num % len(endpoints)]
+            future = executor.submit(
+                _translate_batch,
+                client=endpoint.client,
+                model=model,
+                records=batch,
+                target_lang=target_lang,
+                custom_prompt=custom_prompt,
+                dictionary_section=dictionary_section,
+                json_output=json_output,
+                limiter=endpoint.limiter,
+            )
+            futures[future] = batch
 
-        if on_batch_translated is not None and batch_result:
-            on_batch_translated(batch_result, batch)
+        # 所有批次提交完毕后再收集结果；收集过程中出错（如回调抛出异常）时取消尚未开始的批次
+        try:
+            for completed, future in enumerate(as_completed(futures), 1):
+                batch = futures[future]
+                batch_result = future.result()
+                all_translations.update(batch_result)
+                logger.info(
+                    "[translate_records] 批次完成 %d/%d records_count %d translated %d",
+                    completed, total_batches, len(batch), len(batch_result),
+                )
 
-        if on_batch_done is not None:
-            on_batch_done(len(all_translations))
+                # 回退为原文的记录（LLM 漏译）不写入缓存
+                if cache_keys and batch_result:
+                    translation_cache.store([
+                        (cache_keys[r.record_id], model, target_lang, batch_result[r.record_id])
+                        for r in batch
+                        if batch_result.get(r.record_id, r.text) != r.text
+                    ])
+
+                if on_batch_translated is not None and batch_result:
+                    on_batch_translated(batch_result, batch)
+
+                if on_batch_done is not None:
+                    on_batch_done(len(all_translations))
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
 
     logger.info(
         "[translate_records] 翻译完成 total %d translated %d",
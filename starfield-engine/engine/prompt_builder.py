@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import io
 import logging
 from typing import Optional
 
@@ -28,57 +29,102 @@ DICTIONARY_SECTION_HEADER = "以下词条必须保持指定翻译：\n"
 
 TEXT_SECTION_HEADER = "待翻译文本：\n"
 
+JSON_OUTPUT_INSTRUCTION = (
+    "输出格式：只输出一个 JSON 对象，键为输入行的编号字符串，值为对应译文，"
+    "例如 {\"1\": \"译文1\", \"2\": \"译文2\"}。不要输出 JSON 以外的任何内容。"
+)
+
+
+def build_dictionary_section(dictionary_entries: Optional[list[dict]]) -> Optional[str]:
+    """构建词典约束段，跳过原文或译文为空的词条。
+
+    同一任务的所有批次共用相同的词典段，调用方可计算一次后传给 build_prompt。
+
+    Args:
+        dictionary_entries: 词典词条列表，每个词条为 {"sourceText": str, "targetText": str}。
+
+    Returns:
+        词典约束段字符串，无有效词条时返回 None。
+    """
+    if not dictionary_entries:
+        return None
+
+    # 单次遍历：每个词条只取一次原文和译文，同时过滤无效词条
+    dict_lines = [
+        f"{source} → {target}"
+        for source, target in (
+            (entry.get("sourceText"), entry.get("targetText")) for entry in dictionary_entries
+        )
+        if source and target
+    ]
+    if not dict_lines:
+        return None
+
+    return DICTIONARY_SECTION_HEADER + "\n" + "\n".join(dict_lines)
+
 
 def build_prompt(
     texts_to_translate: list[str],
     custom_prompt: Optional[str] = None,
     dictionary_entries: Optional[list[dict]] = None,
+    dictionary_section: Optional[str] = None,
+    json_output: bool = False,
 ) -> str:
     """组装发送给 LLM 的完整 Prompt。
 
     组装逻辑：
     1. 基础指令 = custom_prompt（非空时）或 DEFAULT_PROMPT
-    2. 如果 dictionary_entries 非空，追加词典约束段
-    3. 追加待翻译文本
-    4. 返回完整 Prompt
+    2. 如果有词典约束段（预先构建的 dictionary_section，或由 dictionary_entries 构建），追加词典约束段
+    3. 如果 json_output 为真，追加 JSON 输出格式要求
+    4. 追加待翻译文本
+    5. 返回完整 Prompt
 
     Args:
         texts_to_translate: 待翻译的文本列表。
         custom_prompt: 用户自定义 Prompt，为 None 或空字符串时使用默认模板。
         dictionary_entries: 词典词条列表，每个词条为 {"sourceText": str, "targetText": str}。
+        dictionary_section: build_dictionary_section 预先构建的词典约束段，传入时忽略 dictionary_entries。
+        json_output: 是否要求 LLM 以 JSON 对象（编号 -> 译文）输出，覆盖基础指令中的编号行输出格式。
 
     Returns:
         组装后的完整 Prompt 字符串。
     """
+    if dictionary_section is None:
+        dictionary_section = build_dictionary_section(dictionary_entries)
+
     logger.info(
-        "[build_prompt] 开始构建 Prompt custom_prompt_set %s dict_entries_count %d texts_count %d",
+        "[build_prompt] 开始构建 Prompt custom_prompt_set %s dict_section_length %d texts_count %d",
         custom_prompt is not None and len(custom_prompt) > 0,
-        len(dictionary_entries) if dictionary_entries else 0,
+        len(dictionary_section) if dictionary_section else 0,
         len(texts_to_translate),
     )
 
     # 1. 基础指令
     base_instruction = custom_prompt if custom_prompt else DEFAULT_PROMPT
 
-    parts = [base_instruction]
+    buf = io.StringIO()
+    buf.write(base_instruction)
 
     # 2. 词典约束段
-    if dictionary_entries:
-        dict_lines = [DICTIONARY_SECTION_HEADER]
-        for entry in dictionary_entries:
-            source = entry.get("sourceText", "")
-            target = entry.get("targetText", "")
-            if source and target:
-                dict_lines.append(f"{source} → {target}")
-        if len(dict_lines) > 1:
-            parts.append("\n".join(dict_lines))
-
-    # 3. 待翻译文本（编号格式）
-    numbered_lines = [f"[{i + 1}] {text}" for i, text in enumerate(texts_to_translate)]
-    text_section = TEXT_SECTION_HEADER + "\n".join(numbered_lines)
-    parts.append(text_section)
-
-    prompt = "\n\n".join(parts)
+    if dictionary_section:
+        buf.write("\n\n")
+        buf.write(dictionary_section)
+
+    # 3. JSON 输出格式要求
+    if json_output:
+        buf.write("\n\n")
+        buf.write(JSON_OUTPUT_INSTRUCTION)
+
+    # 4. 待翻译文本（编号格式），直接写入缓冲区，不构造中间的编号行列表
+    buf.write("\n\n")
+    buf.write(TEXT_SECTION_HEADER)
+    for i, text in enumerate(texts_to_translate, 1):
+        if i > 1:
+            buf.write("\n")
+        buf.write(f"[{i}] ")
+        buf.write(text)
+
+    prompt = buf.getvalue()
 
     logger.info("[build_prompt] Prompt 构建完成 total_length %d", len(prompt))
     return prompt
@@ -0,0 +1,138 @@
+"""本地 LLM 译文缓存，基于 SQLite 持久化。
+
+缓存键由原文、模型、目标语言、自定义 Prompt 与词典共同哈希得到，任一项变化都会视为未命中。
+设置环境变量 LLM_CACHE_PATH 后启用，未设置时所有操作均为空操作。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# 单条 SELECT 语句中 IN (...) 的参数个数上限，低于 SQLite 默认的 999
+LOOKUP_CHUNK_SIZE = 500
+
+_CREATE_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS translations ("
+    "hash TEXT PRIMARY KEY, model TEXT, target_lang TEXT, translated TEXT)"
+)
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+
+
+def _get_cache_path() -> Optional[str]:
+    """获取缓存数据库路径，未配置时返回 None。"""
+    return os.environ.get("LLM_CACHE_PATH") or None
+
+
+def is_enabled() -> bool:
+    """本地缓存是否启用。"""
+    return _get_cache_path() is not None
+
+
+def _get_connection() -> Optional[sqlite3.Connection]:
+    """获取（必要时打开）缓存数据库连接，调用方需持有 _lock。"""
+    global _conn, _conn_path
+
+    path = _get_cache_path()
+    if path is None:
+        return None
+    if _conn is not None and _conn_path == path:
+        return _conn
+
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_CREATE_TABLE_SQL)
+    conn.commit()
+    _conn, _conn_path = conn, path
+    logger.info("[_get_connection] 本地译文缓存已打开 path %s", path)
+    return conn
+
+
+def build_context_hash(
+    model: str,
+    target_lang: str,
+    custom_prompt: Optional[str],
+    dictionary_entries: Optional[List[dict]],
+) -> str:
+    """计算一次翻译任务上下文（模型、语言、Prompt、词典）的哈希，作为缓存键的一部分。"""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(model.encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update(target_lang.encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update((custom_prompt or "").encode("utf-8"))
+    hasher.update(b"\0")
+    hasher.update(orjson.dumps(dictionary_entries or [], option=orjson.OPT_SORT_KEYS))
+    return hasher.hexdigest()
+
+
+def make_key(text: str, context_hash: str) -> str:
+    """由原文和上下文哈希生成缓存键。"""
+    return hashlib.blake2b(
+        f"{context_hash}\0{text}".encode("utf-8"), digest_size=16,
+    ).hexdigest()
+
+
+def lookup(keys: Iterable[str]) -> Dict[str, str]:
+    """批量查询缓存，返回 key -> 译文，查询失败时返回空字典。"""
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return {}
+
+    result: Dict[str, str] = {}
+    try:
+        with _lock:
+            conn = _get_connection()
+            if conn is None:
+                return {}
+            for i in range(0, len(unique_keys), LOOKUP_CHUNK_SIZE):
+                chunk = unique_keys[i : i + LOOKUP_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT hash, translated FROM translations WHERE hash IN ({placeholders})",
+                    chunk,
+                )
+                result.update(rows)
+    except sqlite3.Error as e:
+        logger.warning("[lookup] 本地译文缓存查询失败 keys_count %d error %s", len(unique_keys), str(e))
+        return {}
+
+    return result
+
+
+def store(rows: List[Tuple[str, str, str, str]]) -> None:
+    """在单个事务中批量写入缓存，rows 为 (key, model, target_lang, translated)。
+
+    写入失败只记录日志，不影响翻译流程。
+    """
+    if not rows:
+        return
+
+    try:
+        with _lock:
+            conn = _get_connection()
+            if conn is None:
+                return
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations (hash, model, target_lang, translated) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+    except sqlite3.Error as e:
+        logger.warning("[store] 本地译文缓存写入失败 rows_count %d error %s", len(rows), str(e))
@@ -3,13 +3,23 @@
 from __future__ import annotations
 
 import logging
+import os
+import queue
 import threading
-from typing import Any, Dict, List, Optional
-
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 from engine.cache_client import query_cache, save_cache
-from engine.esm_parser import parse_esm
+from engine.esm_parser import StringRecord, parse_esm
 from engine.esm_writer import write_esm
 from engine.llm_client import translate_records
 
@@ -28,74 +38,347 @@ VALID_STATUSES = frozenset({
     STATUS_ASSEMBLING, STATUS_COMPLETED, STATUS_FAILED,
 })
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_NDJSON_HEADERS = {"Content-Type": "application/x-ndjson"}
+
+# 进度上报：(callback_url, 任务状态快照, items)，payload 由上报线程在实际发送时构建
+ProgressReport = Tuple[str, "TaskState", Optional[List[Dict[str, Any]]]]
+
+# 纯进度上报的合并窗口（秒），窗口内同一任务只发送最后一条
+REPORT_DEBOUNCE_SECONDS = 0.2
+
+# 终态上报立即发送，不参与合并
+_TERMINAL_STATUSES = frozenset({STATUS_COMPLETED, STATUS_FAILED})
+
+# shutdown() 放入上报队列的结束标记，上报线程发出全部等待中的上报后退出
+_REPORTER_STOP = object()
+
+# 批次译文累积到条目数或时间阈值后再写入缓存，摊薄每次保存的请求开销
+CACHE_FLUSH_SIZE = 512
+CACHE_FLUSH_SECONDS = 2.0
+
+
+def _use_ndjson_progress() -> bool:
+    """带 items 的上报是否以 NDJSON 分块发送（SF_PROGRESS_NDJSON），需 Backend 支持，默认关闭。"""
+    return os.environ.get("SF_PROGRESS_NDJSON", "").lower() in ("1", "true", "yes")
+
+
+def _iter_ndjson(payload: Dict[str, Any]) -> Iterator[bytes]:
+    """逐行生成 NDJSON：首行为不含 items 的任务状态，其后每行一个条目。"""
+    items = payload["items"]
+    yield orjson.dumps({k: v for k, v in payload.items() if k != "items"}, option=orjson.OPT_APPEND_NEWLINE)
+    for item in items:
+        yield orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def _get_max_tasks() -> int:
+    """获取内存中保留的任务数上限（SF_TASK_MAX），默认 1024，超出时淘汰最早结束的任务。"""
+    try:
+        return max(1, int(os.environ.get("SF_TASK_MAX", "1024")))
+    except ValueError:
+        return 1024
+
+
+def _get_assembly_workers() -> int:
+    """获取同时执行的 ESM 重组数上限（SF_ASSEMBLY_WORKERS），默认 2。"""
+    try:
+        return max(1, int(os.environ.get("SF_ASSEMBLY_WORKERS", "2")))
+    except ValueError:
+        return 2
+
+
+def _build_output_paths(file_path: str) -> Tuple[str, str]:
+    """根据原始文件路径生成 (译文输出路径, 原文备份路径)，无扩展名时直接追加后缀。"""
+    root, ext = os.path.splitext(file_path)
+    return f"{root}_translated{ext}", f"{root}_backup{ext}"
+
+
+@dataclass(frozen=True, slots=True)
+class TaskState:
+    """任务状态快照。
+
+    快照创建后不再修改，每次变更都生成新快照并整体替换字典中的引用（GIL 下单次赋值是原子的），
+    读取方无需加锁即可拿到一致的状态。
+    """
+
+    task_id: str
+    status: str = STATUS_WAITING
+    translated: int = 0
+    total: int = 0
+    output_file_path: str | None = None
+    original_backup_path: str | None = None
+    error: str | None = None
+    callback_url: str | None = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为对外接口使用的任务字典。"""
+        return {
+            "taskId": self.task_id,
+            "status": self.status,
+            "progress": {"translated": self.translated, "total": self.total},
+            "outputFilePath": self.output_file_path,
+            "originalBackupPath": self.original_backup_path,
+            "error": self.error,
+            "callbackUrl": self.callback_url,
+        }
+
+
+@lru_cache(maxsize=256)
+def _with_task_id(msg: str) -> str:
+    """为日志格式串追加 " task_id %s"；格式串均为调用处的字面量，结果按格式串缓存。"""
+    return msg + " task_id %s"
+
+
+class _TaskLogger(logging.LoggerAdapter):
+    """绑定 task_id 的日志适配器，按 "[func] … task_id %s" 格式在每条日志末尾追加 task_id，调用处无需重复传参。
+
+    task_id 作为格式参数追加，仅在日志级别启用时才参与格式化。
+    """
+
+    def __init__(self, base: logging.Logger, task_id: str) -> None:
+        super().__init__(base, {"task_id": task_id})
+        self._task_id = task_id
+
+    def log(self, level: int, msg: Any, *args: Any, **kwargs: Any) -> None:
+        """追加 task_id 后转交给底层 logger。"""
+        if self.isEnabledFor(level):
+            # 跳过本方法所在的栈帧，日志记录的 funcName / lineno 指向实际调用处
+            kwargs["stacklevel"] = kwargs.get("stacklevel", 1) + 1
+            self.logger.log(level, _with_task_id(msg), *args, self._task_id, **kwargs)
+
+
+def _get_max_workers() -> int:
+    """获取同时执行的翻译 / 组装任务数上限（SF_WORKERS），默认 4。"""
+    try:
+        return max(1, int(os.environ.get("SF_WORKERS", "4")))
+    except ValueError:
+        return 4
+
 
 class Translator:
     """翻译调度器，管理翻译任务的生命周期并协调各组件。"""
 
     def __init__(self) -> None:
-        self._tasks: Dict[str, Dict[str, Any]] = {}
+        # task_id -> 当前状态快照；写入方持锁替换快照，读取方直接取引用
+        # 按结束顺序排列，超出 SF_TASK_MAX 时淘汰最早结束的任务，淘汰后 get_task 返回 None
+        self._tasks: "OrderedDict[str, TaskState]" = OrderedDict()
+        self._max_tasks = _get_max_tasks()
         self._lock = threading.Lock()
 
-    def _new_task(self, task_id: str, callback_url: str | None = None) -> Dict[str, Any]:
+        # 翻译 / 组装任务共用有界线程池，超出 SF_WORKERS 的任务以 waiting 状态排队
+        self._executor = ThreadPoolExecutor(
+            max_workers=_get_max_workers(), thread_name_prefix="sf-translator",
+        )
+        # 重组（写文件）阶段使用独立线程池，翻译完成的任务交出 worker，下一个任务的解析 / 翻译可与本任务的重组重叠
+        self._assembly_executor = ThreadPoolExecutor(
+            max_workers=_get_assembly_workers(), thread_name_prefix="sf-assembler",
+        )
+        self._futures: Dict[str, Future] = {}  # 未结束任务的 Future，供后续取消或获取异常
+
+        # 进度上报由单个后台线程按入队顺序发送，任务线程只负责入队，复用 keep-alive 连接
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._report_q: "queue.Queue[ProgressReport | threading.Event | object]" = queue.Queue()
+        # task_id -> 最近一次入队的纯进度上报的 (status, translated, total)，用于跳过重复上报
+        self._last_reported: Dict[str, Tuple[str, int, int]] = {}
+        self._reporter = threading.Thread(target=self._reporter_loop, name="sf-progress-reporter", daemon=True)
+        self._reporter.start()
+
+    def _new_task(self, task_id: str, callback_url: str | None = None) -> TaskState:
         """创建新任务记录。"""
-        return {
-            "taskId": task_id,
-            "status": STATUS_WAITING,
-            "progress": {"translated": 0, "total": 0},
-            "outputFilePath": None,
-            "originalBackupPath": None,
-            "error": None,
-            "callbackUrl": callback_url,
-        }
+        return TaskState(task_id=task_id, callback_url=callback_url)
+
+    def _replace_task(self, task_id: str, **changes: Any) -> None:
+        """以新快照替换任务状态，写入方之间持锁避免互相覆盖。"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            task = replace(task, **changes)
+            self._tasks[task_id] = task
+            if task.status in _TERMINAL_STATUSES:
+                self._tasks.move_to_end(task_id)
+                self._evict_finished_tasks(keep=task_id)
+
+    def _evict_finished_tasks(self, keep: str) -> None:
+        """任务数超出上限时按结束顺序淘汰已结束的任务（不淘汰进行中的任务和 keep），调用方需持有 _lock。"""
+        excess = len(self._tasks) - self._max_tasks
+        if excess <= 0:
+            return
+        evicted = list(islice(
+            (tid for tid, t in self._tasks.items() if t.status in _TERMINAL_STATUSES and tid != keep),
+            excess,
+        ))
+        for tid in evicted:
+            del self._tasks[tid]
+        logger.info("[_evict_finished_tasks] 淘汰已结束任务 count %d remaining %d", len(evicted), len(self._tasks))
 
     def _update_status(self, task_id: str, status: str) -> None:
         """更新任务状态。"""
-        with self._lock:
-            if task_id in self._tasks:
-                self._tasks[task_id]["status"] = status
+        self._replace_task(task_id, status=status)
 
     def _update_progress(self, task_id: str, translated: int, total: int) -> None:
         """更新翻译进度。"""
-        with self._lock:
-            if task_id in self._tasks:
-                self._tasks[task_id]["progress"]["translated"] = translated
-                self._tasks[task_id]["progress"]["total"] = total
+        self._replace_task(task_id, translated=translated, total=total)
 
-    def _set_error(self, task_id: str, error: str) -> None:
-        """设置任务错误信息并标记为失败。"""
-        with self._lock:
-            if task_id in self._tasks:
-                self._tasks[task_id]["status"] = STATUS_FAILED
-                self._tasks[task_id]["error"] = error
+    def _set_error(self, task_id: str, error: BaseException | str) -> None:
+        """设置任务错误信息并标记为失败，传入异常时只在此处转换一次消息文本。"""
+        message = error if isinstance(error, str) else str(error)
+        self._replace_task(task_id, status=STATUS_FAILED, error=message)
 
     def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """获取任务状态信息。"""
-        with self._lock:
-            task = self._tasks.get(task_id)
-            if task is None:
-                return None
-            return dict(task, progress=dict(task["progress"]))
+        """获取任务状态信息，读取当前快照，无需加锁。"""
+        task = self._tasks.get(task_id)
+        return task.to_dict() if task is not None else None
+
+    def _report_progress(
+        self,
+        task_id: str,
+        callback_url: str | None,
+        items: list | None = None,
+        wait: bool = False,
+    ) -> None:
+        """将当前任务进度快照加入上报队列，由后台线程发送给 Backend。
 
-    def _report_progress(self, task_id: str, callback_url: str | None, items: list | None = None) -> None:
-        """向 Backend 上报当前任务进度。
+        状态和进度与上一次相同的纯进度上报直接跳过；带 items 的上报和终态上报总是发送。
 
         Args:
             task_id: 任务 ID。
             callback_url: 回调地址。
             items: 本批次翻译结果条目列表（可选），用于 confirmation 模式增量写入。
+            wait: 是否等待队列中的上报全部发送完毕，任务结束（completed / failed）时使用。
         """
         if not callback_url:
             return
-        task = self.get_task(task_id)
+        task = self._tasks.get(task_id)
         if task is None:
             return
-        payload = dict(task)
+        if not items:
+            key = (task.status, task.translated, task.total)
+            if self._last_reported.get(task_id) == key:
+                return
+            if task.status in _TERMINAL_STATUSES:
+                self._last_reported.pop(task_id, None)
+            else:
+                self._last_reported[task_id] = key
+        self._report_q.put((callback_url, task, items or None))
+        if wait:
+            self.flush()
+
+    def _reporter_loop(self) -> None:
+        """后台上报线程：按入队顺序发送，纯进度上报在合并窗口内按任务只保留最后一条。
+
+        items 上报和终态上报立即发送；发送前先发出该任务尚在等待的进度上报，状态变化时同样先发出
+        旧状态的上报，保证 Backend 收到的状态和进度按顺序推进。
+        """
+        pending: Dict[str, ProgressReport] = {}  # task_id -> 等待合并发送的纯进度上报
+        deadline = 0.0
+
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if pending else None
+            try:
+                report = self._report_q.get(timeout=timeout)
+            except queue.Empty:
+                self._send_pending(pending)
+                continue
+
+            if report is _REPORTER_STOP:
+                self._send_pending(pending)
+                return
+
+            if isinstance(report, threading.Event):
+                # flush() 请求：发出全部等待中的上报后通知调用方
+                self._send_pending(pending)
+                report.set()
+                continue
+
+            _, task, items = report
+            task_id = task.task_id
+            previous = pending.get(task_id)
+
+            if items or task.status in _TERMINAL_STATUSES:
+                if previous is not None:
+                    self._send_report(*pending.pop(task_id))
+                self._send_report(*report)
+                continue
+
+            if previous is not None and previous[1].status != task.status:
+                self._send_report(*previous)
+            if not pending:
+                deadline = time.monotonic() + REPORT_DEBOUNCE_SECONDS
+            pending[task_id] = report
+
+    def _send_pending(self, pending: Dict[str, ProgressReport]) -> None:
+        """发送并清空全部等待中的进度上报。"""
+        for report in pending.values():
+            self._send_report(*report)
+        pending.clear()
+
+    def _send_report(
+        self,
+        callback_url: str,
+        task: TaskState,
+        items: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """构建并发送单条进度上报，失败只记录日志。"""
+        payload = task.to_dict()
         if items:
             payload["items"] = items
         try:
-            requests.post(callback_url, json=payload, timeout=30)
+            if "items" in payload and _use_ndjson_progress():
+                # 生成器作为 body 时 requests 使用分块传输，条目边编码边发送
+                self._session.post(callback_url, data=_iter_ndjson(payload), headers=_NDJSON_HEADERS, timeout=30)
+            else:
+                self._session.post(callback_url, data=orjson.dumps(payload), headers=_JSON_HEADERS, timeout=30)
         except Exception as e:
-            logger.warning("[_report_progress] 上报进度失败 task_id %s error %s", task_id, str(e))
+            logger.warning("[_send_report] 上报进度失败 task_id %s error %s", task.task_id, e)
+
+    def flush(self, timeout: float | None = 30) -> None:
+        """阻塞直到已入队（含合并窗口中等待）的进度上报全部发送完毕。"""
+        if not self._reporter.is_alive():
+            # shutdown() 后上报线程已发完全部上报并退出
+            return
+        done = threading.Event()
+        self._report_q.put(done)
+        done.wait(timeout)
+
+    def _submit(self, task_id: str, fn, *args, executor: ThreadPoolExecutor | None = None) -> None:
+        """将任务提交到线程池（默认为翻译线程池），记录 Future 直到任务结束。"""
+        future = (executor or self._executor).submit(fn, *args)
+        with self._lock:
+            self._futures[task_id] = future
+        future.add_done_callback(lambda _: self._discard_future(task_id, future))
+
+    def _discard_future(self, task_id: str, future: Future) -> None:
+        """任务结束后移除 Future（同一 task_id 已被重新提交时保留新的 Future）。"""
+        with self._lock:
+            if self._futures.get(task_id) is future:
+                del self._futures[task_id]
+
+    def shutdown(self, wait: bool = False) -> None:
+        """停止接收新任务，已提交的任务（含其重组阶段）照常执行完毕，之后上报线程发出等待中的上报并退出。
+
+        Args:
+            wait: 是否阻塞等待已提交的任务全部结束、进度上报全部发出，默认不等待，在后台线程中收尾。
+        """
+        if wait:
+            self._drain()
+            self._reporter.join()
+            return
+        # 翻译线程池立即停止接收新任务；重组线程池须等翻译线程池排空后再关闭，
+        # 否则仍在翻译的任务提交重组时会被拒绝，已完成的翻译被标记为失败
+        self._executor.shutdown(wait=False)
+        threading.Thread(target=self._drain, name="sf-shutdown", daemon=True).start()
+
+    def _drain(self) -> None:
+        """依次等待翻译线程池、重组线程池结束，再向上报线程发送结束标记。"""
+        # 翻译线程池先结束，确保其中任务提交的重组已进入重组线程池
+        self._executor.shutdown(wait=True)
+        self._assembly_executor.shutdown(wait=True)
+        # 结束标记排在已入队的上报之后；此时任务已全部结束，不会再有新的上报入队
+        self._report_q.put(_REPORTER_STOP)
 
     def submit_task(
         self,
@@ -125,13 +408,13 @@ class Translator:
 
         with self._lock:
             self._tasks[task_id] = self._new_task(task_id, callback_url)
+        self._last_reported.pop(task_id, None)
 
-        thread = threading.Thread(
-            target=self._run_task,
-            args=(task_id, file_path, target_lang, custom_prompt, dictionary_entries, callback_url, skip_cache),
-            daemon=True,
+        self._submit(
+            task_id,
+            self._run_task,
+            task_id, file_path, target_lang, custom_prompt, dictionary_entries, callback_url, skip_cache,
         )
-        thread.start()
 
         return {"taskId": task_id, "status": "accepted"}
 
@@ -146,68 +429,56 @@ class Translator:
         skip_cache: bool = False,
     ) -> None:
         """执行翻译任务的完整流程：解析 → 缓存查询 → 翻译 → 缓存保存 → 重组。"""
+        log = _TaskLogger(logger, task_id)
         try:
             # 1. 解析 ESM
             self._update_status(task_id, STATUS_PARSING)
             self._report_progress(task_id, callback_url)
-            logger.info("[_run_task] 开始解析 task_id %s", task_id)
+            log.info("[_run_task] 开始解析")
             records = parse_esm(file_path)
             total = len(records)
+            # record_id -> StringRecord 映射每个任务只构建一次，缓存保存和各处 items 上报共用
+            records_by_id = {r.record_id: r for r in records}
             self._update_progress(task_id, 0, total)
 
             if total == 0:
-                logger.info("[_run_task] 无可翻译记录 task_id %s", task_id)
+                log.info("[_run_task] 无可翻译记录")
                 self._update_status(task_id, STATUS_COMPLETED)
-                self._report_progress(task_id, callback_url)
+                self._report_progress(task_id, callback_url, wait=True)
                 return
 
             # 2. 查询缓存
             cached = query_cache(records, target_lang)
             cached_count = len(cached)
-            logger.info("[_run_task] 缓存查询完成 task_id %s cached %d total %d", task_id, cached_count, total)
+            log.info("[_run_task] 缓存查询完成 cached %d total %d", cached_count, total)
 
             # 过滤出未命中缓存的词条
             uncached_records = [r for r in records if r.record_id not in cached]
 
-            # 对 uncached 按缓存键 (record_type, subrecord_type, source_text) 去重
-            # 相同文本只翻译一次，翻译完后映射回所有 record_id
-            seen_keys: dict[tuple[str, str], str] = {}  # (sub_type, source_text) -> first record_id
-            dedup_records = []
-            dedup_map: dict[str, list[str]] = {}  # first_record_id -> [all_record_ids]
+            # 对 uncached 按 (subrecord_type, source_text) 分组去重（子记录类型已在解析时去掉 #N 后缀）
+            # 相同文本只翻译一次，翻译完后映射回组内所有记录
+            groups: defaultdict[tuple[str, str], list[StringRecord]] = defaultdict(list)
             for r in uncached_records:
-                parts = r.record_id.rsplit(":", 1)
-                sub_type = parts[-1] if len(parts) > 1 else ""
-                # 去掉 #N 序号后缀用于去重匹配
-                idx = sub_type.find("#")
-                if idx >= 0:
-                    sub_type = sub_type[:idx]
-                key = (sub_type, r.text)
-                if key not in seen_keys:
-                    seen_keys[key] = r.record_id
-                    dedup_records.append(r)
-                    dedup_map[r.record_id] = [r.record_id]
-                else:
-                    dedup_map[seen_keys[key]].append(r.record_id)
+                groups[(r.subrecord_type, r.text)].append(r)
+            dedup_records = [group[0] for group in groups.values()]
+            dedup_map = {group[0].record_id: group for group in groups.values()}  # first_record_id -> 组内全部记录
 
             dedup_saved = len(uncached_records) - len(dedup_records)
             if dedup_saved > 0:
-                logger.info("[_run_task] 去重节省 %d 条 LLM 调用 task_id %s", dedup_saved, task_id)
+                log.info("[_run_task] 去重节省 %d 条 LLM 调用", dedup_saved)
 
             # 缓存命中的词条计入已翻译进度
             self._update_progress(task_id, cached_count, total)
 
-            # 上报缓存命中的词条作为 items（供 confirmation 模式写入确认记录）
-            if cached:
+            # 上报缓存命中的词条作为 items（供 confirmation 模式写入确认记录），无回调地址时跳过构建
+            if callback_url and cached:
                 cached_items = []
-                records_by_id = {r.record_id: r for r in records}
                 for rid, translated in cached.items():
                     rec = records_by_id.get(rid)
                     if rec:
-                        parts = rid.split(":", 2)
-                        record_type = parts[0] if len(parts) > 0 else ""
                         cached_items.append({
                             "recordId": rid,
-                            "recordType": record_type,
+                            "recordType": rec.record_type,
                             "sourceText": rec.text,
                             "targetText": translated,
                         })
@@ -219,58 +490,76 @@ class Translator:
             self._report_progress(task_id, callback_url)
 
             if uncached_records:
-                logger.info("[_run_task] 开始翻译 task_id %s uncached_count %d dedup_count %d", task_id, len(uncached_records), len(dedup_records))
+                log.info("[_run_task] 开始翻译 uncached_count %d dedup_count %d", len(uncached_records), len(dedup_records))
 
                 def on_batch_done(translated_count: int) -> None:
                     """每批翻译完成后更新进度并上报（加上缓存命中数）。"""
                     self._update_progress(task_id, cached_count + translated_count, total)
                     self._report_progress(task_id, callback_url)
 
+                pending_cache: Dict[str, str] = {}  # 尚未写入缓存的批次译文
+                last_flush = time.monotonic()
+
+                def flush_cache() -> None:
+                    """将累积的批次译文写入缓存。"""
+                    nonlocal pending_cache, last_flush
+                    if pending_cache:
+                        batch, pending_cache = pending_cache, {}
+                        save_cache(batch, records_by_id, target_lang, task_id)
+                    last_flush = time.monotonic()
+
                 def on_batch_translated(batch_result: dict, batch_records: list) -> None:
-                    """每批翻译完成后立即保存缓存（除非 skip_cache），并上报 items 供 confirmation 模式使用。"""
+                    """每批翻译完成后累积待保存的缓存（除非 skip_cache），并上报 items 供 confirmation 模式使用。"""
                     if not skip_cache:
-                        save_cache(batch_result, batch_records, target_lang, task_id)
+                        pending_cache.update(batch_result)
+                        if (
+                            len(pending_cache) >= CACHE_FLUSH_SIZE
+                            or time.monotonic() - last_flush >= CACHE_FLUSH_SECONDS
+                        ):
+                            flush_cache()
+                    if not callback_url:
+                        return
                     # 构建 items 列表用于 confirmation 模式增量写入（包含去重展开的记录）
-                    records_by_id = {r.record_id: r for r in uncached_records}
                     items = []
                     for rec in batch_records:
                         translated = batch_result.get(rec.record_id)
                         if translated:
-                            # 展开 dedup_map 中所有重复的 record_id
-                            for rid in dedup_map.get(rec.record_id, [rec.record_id]):
-                                parts = rid.split(":", 2)
-                                record_type = parts[0] if len(parts) > 0 else ""
-                                source_rec = records_by_id.get(rid)
-                                source_text = source_rec.text if source_rec else rec.text
+                            # 展开 dedup_map 中所有重复的记录
+                            for dup in dedup_map.get(rec.record_id, (rec,)):
                                 items.append({
-                                    "recordId": rid,
-                                    "recordType": record_type,
-                                    "sourceText": source_text,
+                                    "recordId": dup.record_id,
+                                    "recordType": dup.record_type,
+                                    "sourceText": dup.text,
                                     "targetText": translated,
                                 })
                     if items:
                         self._report_progress(task_id, callback_url, items=items)
 
-                dedup_translations = translate_records(
-                    records=dedup_records,
-                    target_lang=target_lang,
-                    custom_prompt=custom_prompt,
-                    dictionary_entries=dictionary_entries,
-                    on_batch_done=on_batch_done,
-                    on_batch_translated=on_batch_translated,
-                )
+                try:
+                    dedup_translations = translate_records(
+                        records=dedup_records,
+                        target_lang=target_lang,
+                        custom_prompt=custom_prompt,
+                        dictionary_entries=dictionary_entries,
+                        on_batch_done=on_batch_done,
+                        on_batch_translated=on_batch_translated,
+                    )
+                finally:
+                    # 翻译中途失败时已完成批次的译文同样写入缓存
+                    flush_cache()
 
                 # 将去重后的翻译结果展开回所有 record_id
                 new_translations = {}
                 for first_id, translated_text in dedup_translations.items():
-                    for rid in dedup_map.get(first_id, [first_id]):
-                        new_translations[rid] = translated_text
+                    for dup in dedup_map[first_id]:
+                        new_translations[dup.record_id] = translated_text
             else:
-                logger.info("[_run_task] 所有词条命中缓存 task_id %s", task_id)
+                log.info("[_run_task] 所有词条命中缓存")
                 new_translations = {}
 
-            # 5. 合并缓存结果和 LLM 结果
-            translations = {**cached, **new_translations}
+            # 5. 合并缓存结果和 LLM 结果（query_cache 每次返回新字典，直接在其上原地合并）
+            translations = cached
+            translations.update(new_translations)
 
             # 5.5 补全翻译失败的词条（用原文回退），确保每个可翻译词条都有对应结果
             missing_count = 0
@@ -279,63 +568,47 @@ class Translator:
                     translations[r.record_id] = r.text
                     missing_count += 1
             if missing_count > 0:
-                logger.warning("[_run_task] 翻译失败词条用原文回退 task_id %s missing_count %d", task_id, missing_count)
+                log.warning("[_run_task] 翻译失败词条用原文回退 missing_count %d", missing_count)
 
             self._update_progress(task_id, len(translations), total)
 
             # 5.6 汇总上报所有词条（确保 confirmation 模式下每个词条都写入确认记录）
-            records_by_id = {r.record_id: r for r in records}
-            all_items = []
-            for rid, translated in translations.items():
-                rec = records_by_id.get(rid)
-                if rec:
-                    parts = rid.split(":", 2)
-                    record_type = parts[0] if len(parts) > 0 else ""
-                    all_items.append({
-                        "recordId": rid,
-                        "recordType": record_type,
-                        "sourceText": rec.text,
-                        "targetText": translated,
-                    })
-            if all_items:
-                logger.info("[_run_task] 汇总上报所有词条 task_id %s count %d", task_id, len(all_items))
-                self._report_progress(task_id, callback_url, items=all_items)
+            if callback_url:
+                all_items = []
+                for rid, translated in translations.items():
+                    rec = records_by_id.get(rid)
+                    if rec:
+                        all_items.append({
+                            "recordId": rid,
+                            "recordType": rec.record_type,
+                            "sourceText": rec.text,
+                            "targetText": translated,
+                        })
+                if all_items:
+                    log.info("[_run_task] 汇总上报所有词条 count %d", len(all_items))
+                    self._report_progress(task_id, callback_url, items=all_items)
 
             # 6. 重组 ESM（confirmation 模式跳过，由后续 assembly 接口生成）
             if skip_cache:
-                logger.info("[_run_task] confirmation 模式跳过重组 task_id %s", task_id)
+                log.info("[_run_task] confirmation 模式跳过重组")
                 self._update_status(task_id, STATUS_COMPLETED)
-                self._report_progress(task_id, callback_url)
-                logger.info("[_run_task] 翻译任务完成 task_id %s", task_id)
+                self._report_progress(task_id, callback_url, wait=True)
+                log.info("[_run_task] 翻译任务完成")
             else:
                 self._update_status(task_id, STATUS_ASSEMBLING)
                 self._report_progress(task_id, callback_url)
-                logger.info("[_run_task] 开始重组 task_id %s", task_id)
-
-                name, ext = file_path.rsplit(".", 1)
-                output_path = f"{name}_translated.{ext}"
-                backup_path = f"{name}_backup.{ext}"
-
-                result = write_esm(
-                    original_path=file_path,
-                    translations=translations,
-                    output_path=output_path,
-                    backup_path=backup_path,
+                log.info("[_run_task] 翻译完成，提交重组")
+                self._submit(
+                    task_id,
+                    self._assemble,
+                    task_id, file_path, translations, callback_url,
+                    executor=self._assembly_executor,
                 )
 
-                with self._lock:
-                    if task_id in self._tasks:
-                        self._tasks[task_id]["status"] = STATUS_COMPLETED
-                        self._tasks[task_id]["outputFilePath"] = result.output_path
-                        self._tasks[task_id]["originalBackupPath"] = result.backup_path
-
-                self._report_progress(task_id, callback_url)
-                logger.info("[_run_task] 翻译任务完成 task_id %s", task_id)
-
         except Exception as e:
-            logger.error("[_run_task] 翻译任务异常 task_id %s error %s", task_id, str(e), exc_info=True)
-            self._set_error(task_id, str(e))
-            self._report_progress(task_id, callback_url)
+            log.error("[_run_task] 翻译任务异常 error %s", e, exc_info=e)
+            self._set_error(task_id, e)
+            self._report_progress(task_id, callback_url, wait=True)
 
     def submit_assembly(
         self,
@@ -359,13 +632,14 @@ class Translator:
 
         with self._lock:
             self._tasks[task_id] = self._new_task(task_id, callback_url)
+        self._last_reported.pop(task_id, None)
 
-        thread = threading.Thread(
-            target=self._run_assembly,
-            args=(task_id, file_path, items, callback_url),
-            daemon=True,
+        self._submit(
+            task_id,
+            self._run_assembly,
+            task_id, file_path, items, callback_url,
+            executor=self._assembly_executor,
         )
-        thread.start()
 
         return {"taskId": task_id, "status": "accepted"}
 
@@ -377,6 +651,7 @@ class Translator:
         callback_url: str | None = None,
     ) -> None:
         """执行组装任务：将已确认的翻译结果写回 ESM 文件。"""
+        log = _TaskLogger(logger, task_id)
         try:
             translations = {item["recordId"]: item["targetText"] for item in items}
             total = len(translations)
@@ -384,11 +659,27 @@ class Translator:
 
             self._update_status(task_id, STATUS_ASSEMBLING)
             self._report_progress(task_id, callback_url)
-            logger.info("[_run_assembly] 开始重组 task_id %s translations_count %d", task_id, total)
+            log.info("[_run_assembly] 开始重组 translations_count %d", total)
 
-            name, ext = file_path.rsplit(".", 1)
-            output_path = f"{name}_translated.{ext}"
-            backup_path = f"{name}_backup.{ext}"
+        except Exception as e:
+            log.error("[_run_assembly] 组装任务异常 error %s", e, exc_info=e)
+            self._set_error(task_id, e)
+            self._report_progress(task_id, callback_url, wait=True)
+            return
+
+        self._assemble(task_id, file_path, translations, callback_url)
+
+    def _assemble(
+        self,
+        task_id: str,
+        file_path: str,
+        translations: Dict[str, str],
+        callback_url: str | None = None,
+    ) -> None:
+        """在重组线程池中将译文写回 ESM 文件并标记任务完成。"""
+        log = _TaskLogger(logger, task_id)
+        try:
+            output_path, backup_path = _build_output_paths(file_path)
 
             result = write_esm(
                 original_path=file_path,
@@ -397,16 +688,17 @@ class Translator:
                 backup_path=backup_path,
             )
 
-            with self._lock:
-                if task_id in self._tasks:
-                    self._tasks[task_id]["status"] = STATUS_COMPLETED
-                    self._tasks[task_id]["outputFilePath"] = result.output_path
-                    self._tasks[task_id]["originalBackupPath"] = result.backup_path
+            self._replace_task(
+                task_id,
+                status=STATUS_COMPLETED,
+                output_file_path=result.output_path,
+                original_backup_path=result.backup_path,
+            )
 
-            self._report_progress(task_id, callback_url)
-            logger.info("[_run_assembly] 组装任务完成 task_id %s", task_id)
+            self._report_progress(task_id, callback_url, wait=True)
+            log.info("[_assemble] 重组完成")
 
         except Exception as e:
-            logger.error("[_run_assembly] 组装任务异常 task_id %s error %s", task_id, str(e), exc_info=True)
-            self._set_error(task_id, str(e))
-            self._report_progress(task_id, callback_url)
+            log.error("[_assemble] 重组异常 error %s", e, exc_info=e)
+            self._set_error(task_id, e)
+            self._report_progress(task_id, callback_url, wait=True)
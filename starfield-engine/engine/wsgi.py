@@ -0,0 +1,9 @@
+"""WSGI 入口，供 gunicorn 等生产服务器加载。
+
+任务状态保存在进程内存中，因此使用单进程多线程模式运行：
+    gunicorn -k gthread -w 1 --threads 16 -b 0.0.0.0:5001 engine.wsgi:application
+"""
+
+from engine.app import create_app
+
+application = create_app()
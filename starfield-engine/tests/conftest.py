@@ -0,0 +1,19 @@
+"""测试共享 fixture。"""
+
+from __future__ import annotations
+
+import pytest
+
+from tests.esm_test_helpers import (
+    build_esm_file,
+    build_grup,
+    build_record,
+    full_sub,
+)
+
+
+@pytest.fixture(scope="session")
+def iron_sword_esm() -> bytes:
+    """仅包含一条 WEAP:00000100 FULL "Iron Sword" 记录的 ESM 数据。"""
+    rec = build_record(b"WEAP", 0x00000100, full_sub("Iron Sword"))
+    return build_esm_file(build_grup(b"WEAP", rec))
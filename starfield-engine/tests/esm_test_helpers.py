@@ -1,16 +1,28 @@
-"""ESM 二进制数据构建辅助函数，用于测试。"""
+"""ESM 二进制数据构建辅助函数，用于测试。
+
+参数均为不可变的 bytes / int，构建结果按参数缓存，多个测试构建相同数据时直接复用。
+另提供各模块测试共用的 StringRecord 构造函数。
+"""
 
 from __future__ import annotations
 
 import struct
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+from engine.esm_parser import StringRecord
 
+# 构建结果缓存上限；深层嵌套 GRUP 等大块数据不宜无限缓存
+_BUILD_CACHE_SIZE = 256
 
+
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
 def build_subrecord(sub_type: bytes, data: bytes) -> bytes:
     """构建一个子记录：type(4) + size(2) + data。"""
     return sub_type + struct.pack("<H", len(data)) + data
 
 
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
 def build_record(rec_type: bytes, form_id: int, subrecords: bytes, flags: int = 0) -> bytes:
     """构建一个记录：type(4) + data_size(4) + flags(4) + form_id(4) + revision(4) + version(2) + unknown(2) + data。"""
     header = rec_type + struct.pack("<I", len(subrecords)) + struct.pack("<I", flags)
@@ -19,6 +31,7 @@ def build_record(rec_type: bytes, form_id: int, subrecords: bytes, flags: int =
     return header + subrecords
 
 
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
 def build_grup(label: bytes, records_data: bytes, group_type: int = 0) -> bytes:
     """构建一个 GRUP：type(4) + group_size(4) + label(4) + group_type(4) + stamp(4) + unknown(4) + data。"""
     group_size = 24 + len(records_data)  # GRUP header is 24 bytes
@@ -27,6 +40,7 @@ def build_grup(label: bytes, records_data: bytes, group_type: int = 0) -> bytes:
     return header + records_data
 
 
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
 def build_tes4_header(subrecords: Optional[bytes] = None) -> bytes:
     """构建 TES4 文件头部记录。"""
     if subrecords is None:
@@ -36,11 +50,54 @@ def build_tes4_header(subrecords: Optional[bytes] = None) -> bytes:
     return build_record(b"TES4", 0, subrecords)
 
 
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
 def build_esm_file(records_after_header: bytes, tes4_subrecords: Optional[bytes] = None) -> bytes:
     """构建完整的 ESM 文件数据：TES4 头部 + 后续记录/GRUP。"""
     return build_tes4_header(tes4_subrecords) + records_after_header
 
 
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
 def null_terminated(text: str) -> bytes:
     """将文本转为 null 终止的 UTF-8 字节。"""
     return text.encode("utf-8") + b"\x00"
+
+
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
+def full_sub(text: str) -> bytes:
+    """构建 FULL 文本子记录。"""
+    return build_subrecord(b"FULL", null_terminated(text))
+
+
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
+def desc_sub(text: str) -> bytes:
+    """构建 DESC 文本子记录。"""
+    return build_subrecord(b"DESC", null_terminated(text))
+
+
+@lru_cache(maxsize=_BUILD_CACHE_SIZE)
+def edid_sub(editor_id: str) -> bytes:
+    """构建 EDID 编辑器 ID 子记录。"""
+    return build_subrecord(b"EDID", null_terminated(editor_id))
+
+
+def build_full_esm(grups: Sequence[Tuple[bytes, Sequence[Tuple[int, str]]]]) -> bytes:
+    """按 [(记录类型, [(form_id, FULL 文本), ...]), ...] 构建每条记录只含一个 FULL 子记录的 ESM 数据。"""
+    return build_esm_file(b"".join(
+        build_grup(rec_type, b"".join(
+            build_record(rec_type, form_id, full_sub(text))
+            for form_id, text in records
+        ))
+        for rec_type, records in grups
+    ))
+
+
+# 多个测试共用的已编码文本
+IRON_SWORD_EDID = null_terminated("WeapIronSword")
+
+
+def make_records(n: int) -> list[StringRecord]:
+    """生成 n 条测试用 StringRecord。"""
+    return [
+        StringRecord(record_id=f"NPC_:{i:08X}:FULL", text=f"Text {i}")
+        for i in range(n)
+    ]
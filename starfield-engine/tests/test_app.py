@@ -90,6 +90,21 @@ class TestPostTranslate:
         )
         assert resp.status_code == 400
 
+    @pytest.mark.parametrize(
+        "body,content_type",
+        [
+            # 内容是合法 JSON，但未声明为 JSON
+            pytest.param('{"taskId": "t-1", "filePath": "/tmp/test.esm"}', "text/plain", id="json_as_text_plain"),
+            # 合法 JSON 但顶层不是对象
+            pytest.param("[]", "application/json", id="array"),
+            pytest.param('"x"', "application/json", id="string"),
+        ],
+    )
+    def test_submit_rejects_non_object_json_body(self, client, body, content_type):
+        """未声明为 JSON 或顶层不是对象的请求体应返回 400。"""
+        resp = client.post("/engine/translate", data=body, content_type=content_type)
+        assert resp.status_code == 400
+
     def test_submit_default_target_lang(self, client):
         """未指定 targetLang 时应使用默认值 zh-CN。"""
         with patch("engine.app.translator") as mock_translator:
@@ -0,0 +1,108 @@
+"""翻译缓存客户端单元测试。"""
+
+from __future__ import annotations
+
+import logging
+from unittest.mock import MagicMock, patch
+
+import orjson
+
+from engine.cache_client import query_cache, save_cache
+from tests.esm_test_helpers import make_records
+
+
+def _hit_all_response(*args, **kwargs) -> MagicMock:
+    """构造一个对请求中所有条目都命中的缓存查询响应。"""
+    payload = orjson.loads(kwargs["data"])
+    resp = MagicMock()
+    resp.content = orjson.dumps({
+        "items": [
+            {"recordId": item["recordId"], "hit": True, "targetText": "译" + item["sourceText"]}
+            for item in payload["items"]
+        ],
+    })
+    return resp
+
+
+class TestQueryCache:
+    """query_cache 分片查询测试。"""
+
+    def test_empty_records_skips_request(self):
+        """空记录列表不应发起请求。"""
+        with patch("engine.cache_client._SESSION") as mock_session:
+            assert query_cache([], "zh-CN") == {}
+        mock_session.post.assert_not_called()
+
+    @patch("engine.cache_client.QUERY_CHUNK_SIZE", 2)
+    def test_splits_into_chunks_and_merges(self):
+        """超过分片大小时应分多次请求并合并结果。"""
+        records = make_records(5)
+        with patch("engine.cache_client._SESSION") as mock_session:
+            mock_session.post.side_effect = _hit_all_response
+            result = query_cache(records, "zh-CN")
+
+        assert mock_session.post.call_count == 3
+        assert result == {r.record_id: "译" + r.text for r in records}
+
+    @patch("engine.cache_client.QUERY_CHUNK_SIZE", 2)
+    def test_failed_chunk_does_not_drop_others(self):
+        """单个分片失败时其他分片的命中结果仍应返回。"""
+        records = make_records(4)
+
+        def side_effect(*args, **kwargs):
+            if b"NPC_:00000000:FULL" in kwargs["data"]:
+                raise ConnectionError("down")
+            return _hit_all_response(*args, **kwargs)
+
+        with patch("engine.cache_client._SESSION") as mock_session:
+            mock_session.post.side_effect = side_effect
+            result = query_cache(records, "zh-CN")
+
+        assert set(result) == {records[2].record_id, records[3].record_id}
+
+
+class TestSaveCache:
+    """save_cache 分片保存测试。"""
+
+    def test_only_translated_records_saved(self):
+        """仅保存能在 record_lookup 中找到原始记录的译文。"""
+        records = make_records(3)
+        with patch("engine.cache_client._SESSION") as mock_session:
+            lookup = {r.record_id: r for r in records}
+            save_cache({records[1].record_id: "译1", "UNKNOWN:00000000:FULL": "x"}, lookup, "zh-CN", "task-1")
+
+        payload = orjson.loads(mock_session.post.call_args.kwargs["data"])
+        assert payload["taskId"] == "task-1"
+        assert payload["items"] == [
+            {"recordType": "NPC_", "subrecordType": "FULL", "sourceText": "Text 1", "targetText": "译1"},
+        ]
+
+    @patch("engine.cache_client.SAVE_CHUNK_SIZE", 2)
+    def test_splits_into_chunks(self):
+        """超过分片大小时应分多次请求保存全部条目。"""
+        records = make_records(5)
+        translations = {r.record_id: "译" for r in records}
+        with patch("engine.cache_client._SESSION") as mock_session:
+            save_cache(translations, {r.record_id: r for r in records}, "zh-CN", "task-1")
+
+        assert mock_session.post.call_count == 3
+        saved = [
+            item["sourceText"]
+            for call in mock_session.post.call_args_list
+            for item in orjson.loads(call.kwargs["data"])["items"]
+        ]
+        assert sorted(saved) == sorted(r.text for r in records)
+
+    @patch("engine.cache_client.SAVE_CHUNK_SIZE", 2)
+    def test_failed_chunks_reported(self, caplog):
+        """部分分片保存失败时汇总日志给出失败分片数，而不是报告保存成功。"""
+        records = make_records(5)
+        translations = {r.record_id: "译" for r in records}
+        with patch("engine.cache_client._SESSION") as mock_session, \
+                caplog.at_level(logging.INFO, logger="engine.cache_client"):
+            mock_session.post.return_value.raise_for_status.side_effect = [None, RuntimeError("500"), None]
+            save_cache(translations, {r.record_id: r for r in records}, "zh-CN", "task-1")
+
+        summary = caplog.records[-1]
+        assert summary.levelno == logging.WARNING
+        assert "failed_chunks 1/3" in summary.getMessage()
@@ -1,8 +1,5 @@
 """ESM 解析器单元测试。"""
 
-import os
-import tempfile
-
 import pytest
 
 from engine.esm_parser import (
@@ -12,19 +9,29 @@ from engine.esm_parser import (
 )
 from tests.esm_test_helpers import (
     build_esm_file,
+    build_full_esm,
     build_grup,
     build_record,
     build_subrecord,
+    desc_sub,
+    edid_sub,
+    full_sub,
     null_terminated,
 )
 
 
+@pytest.fixture(scope="module")
+def esm_dir(tmp_path_factory):
+    """本模块共用的临时目录，只创建一次；各测试使用不同文件名。"""
+    return tmp_path_factory.mktemp("esm_parser")
+
+
 class TestParseEsmEmptyAndInvalid:
     """空文件和无效文件的测试。"""
 
-    def test_empty_file_returns_empty_list(self, tmp_path):
+    def test_empty_file_returns_empty_list(self, esm_dir):
         """空文件应返回空列表。"""
-        esm_file = tmp_path / "empty.esm"
+        esm_file = esm_dir / "empty.esm"
         esm_file.write_bytes(b"")
         assert parse_esm(str(esm_file)) == []
 
@@ -32,9 +39,9 @@ class TestParseEsmEmptyAndInvalid:
         """空字节数据应返回空列表。"""
         assert parse_esm_bytes(b"") == []
 
-    def test_too_small_file_returns_empty_list(self, tmp_path):
+    def test_too_small_file_returns_empty_list(self, esm_dir):
         """过小的文件应返回空列表。"""
-        esm_file = tmp_path / "tiny.esm"
+        esm_file = esm_dir / "tiny.esm"
         esm_file.write_bytes(b"TES4")
         assert parse_esm(str(esm_file)) == []
 
@@ -48,14 +55,9 @@ class TestParseEsmEmptyAndInvalid:
 class TestParseEsmBasicRecords:
     """基本记录解析测试。"""
 
-    def test_single_full_subrecord(self):
+    def test_single_full_subrecord(self, iron_sword_esm):
         """解析包含单个 FULL 子记录的 ESM 数据。"""
-        sub = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
-        result = parse_esm_bytes(data)
+        result = parse_esm_bytes(iron_sword_esm)
 
         assert len(result) == 1
         assert result[0].record_id == "WEAP:00000100:FULL"
@@ -63,8 +65,8 @@ class TestParseEsmBasicRecords:
 
     def test_multiple_translatable_subrecords(self):
         """解析包含多个可翻译子记录的记录。"""
-        sub_full = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        sub_desc = build_subrecord(b"DESC", null_terminated("A basic iron sword."))
+        sub_full = full_sub("Iron Sword")
+        sub_desc = desc_sub("A basic iron sword.")
         rec = build_record(b"WEAP", 0x00000200, sub_full + sub_desc)
         grup = build_grup(b"WEAP", rec)
         data = build_esm_file(grup)
@@ -79,8 +81,8 @@ class TestParseEsmBasicRecords:
 
     def test_non_translatable_subrecords_ignored(self):
         """非可翻译子记录应被忽略。"""
-        sub_edid = build_subrecord(b"EDID", null_terminated("WeapIronSword"))
-        sub_full = build_subrecord(b"FULL", null_terminated("Iron Sword"))
+        sub_edid = edid_sub("WeapIronSword")
+        sub_full = full_sub("Iron Sword")
         rec = build_record(b"WEAP", 0x00000300, sub_edid + sub_full)
         grup = build_grup(b"WEAP", rec)
         data = build_esm_file(grup)
@@ -90,43 +92,61 @@ class TestParseEsmBasicRecords:
         assert len(result) == 1
         assert result[0].record_id == "WEAP:00000300:FULL"
 
-    def test_no_translatable_content_returns_empty(self):
-        """没有可翻译内容的 ESM 应返回空列表。"""
-        sub_edid = build_subrecord(b"EDID", null_terminated("SomeEditorId"))
-        rec = build_record(b"MISC", 0x00000400, sub_edid)
-        grup = build_grup(b"MISC", rec)
-        data = build_esm_file(grup)
+    def test_binary_payload_in_translatable_subrecord_ignored(self):
+        """可翻译子记录中的二进制数据或非法 UTF-8 应被过滤。"""
+        sub_bin = build_subrecord(b"FULL", bytes(range(1, 20)) + b"\x00")
+        sub_bad_utf8 = build_subrecord(b"DESC", b"Bad \xff\xfe text\x00")
+        sub_ok = build_subrecord(b"SHRT", null_terminated("Line one\nLine two"))
+        rec = build_record(b"WEAP", 0x00000310, sub_bin + sub_bad_utf8 + sub_ok)
+        data = build_esm_file(build_grup(b"WEAP", rec))
 
         result = parse_esm_bytes(data)
 
-        assert result == []
+        assert len(result) == 1
+        assert result[0].record_id == "WEAP:00000310:SHRT"
+        assert result[0].text == "Line one\nLine two"
 
-    def test_multiple_records_in_grup(self):
-        """解析 GRUP 中的多个记录。"""
-        rec1 = build_record(b"WEAP", 0x00000500, build_subrecord(b"FULL", null_terminated("Sword")))
-        rec2 = build_record(b"WEAP", 0x00000600, build_subrecord(b"FULL", null_terminated("Axe")))
-        grup = build_grup(b"WEAP", rec1 + rec2)
-        data = build_esm_file(grup)
+    def test_combination_subrecord_only_under_matching_record_type(self):
+        """组合类型子记录仅在对应记录类型下可翻译。"""
+        info = build_record(b"INFO", 0x00000320, build_subrecord(b"NAM1", null_terminated("Hello there.")))
+        misc = build_record(b"MISC", 0x00000321, build_subrecord(b"NAM1", null_terminated("Not dialogue")))
+        data = build_esm_file(build_grup(b"INFO", info) + build_grup(b"MISC", misc))
 
         result = parse_esm_bytes(data)
 
-        assert len(result) == 2
-        assert result[0].text == "Sword"
-        assert result[1].text == "Axe"
+        assert [r.record_id for r in result] == ["INFO:00000320:NAM1"]
 
-    def test_multiple_grups(self):
-        """解析多个 GRUP。"""
-        rec1 = build_record(b"WEAP", 0x00000700, build_subrecord(b"FULL", null_terminated("Sword")))
-        rec2 = build_record(b"ARMO", 0x00000800, build_subrecord(b"FULL", null_terminated("Shield")))
-        grup1 = build_grup(b"WEAP", rec1)
-        grup2 = build_grup(b"ARMO", rec2)
-        data = build_esm_file(grup1 + grup2)
+    def test_no_translatable_content_returns_empty(self):
+        """没有可翻译内容的 ESM 应返回空列表。"""
+        sub_edid = edid_sub("SomeEditorId")
+        rec = build_record(b"MISC", 0x00000400, sub_edid)
+        grup = build_grup(b"MISC", rec)
+        data = build_esm_file(grup)
 
         result = parse_esm_bytes(data)
 
-        assert len(result) == 2
-        assert result[0].text == "Sword"
-        assert result[1].text == "Shield"
+        assert result == []
+
+    @pytest.mark.parametrize(
+        ("grups", "expected_texts"),
+        [
+            pytest.param(
+                [(b"WEAP", [(0x00000500, "Sword"), (0x00000600, "Axe")])],
+                ["Sword", "Axe"],
+                id="multiple_records_in_grup",
+            ),
+            pytest.param(
+                [(b"WEAP", [(0x00000700, "Sword")]), (b"ARMO", [(0x00000800, "Shield")])],
+                ["Sword", "Shield"],
+                id="multiple_grups",
+            ),
+        ],
+    )
+    def test_records_parsed_in_file_order(self, grups, expected_texts):
+        """GRUP 中的多个记录、多个 GRUP 中的记录都应按文件顺序解析。"""
+        result = parse_esm_bytes(build_full_esm(grups))
+
+        assert [r.text for r in result] == expected_texts
 
 
 
@@ -135,7 +155,7 @@ class TestParseEsmCorruptedData:
 
     def test_truncated_record_data_skips_and_continues(self):
         """记录数据被截断时应跳过并记录警告。"""
-        sub = build_subrecord(b"FULL", null_terminated("Good Item"))
+        sub = full_sub("Good Item")
         rec_good = build_record(b"WEAP", 0x00000A00, sub)
         # 构建一个数据大小声明为 100 但实际数据不足的记录
         # 这会导致解析器跳过，但 rec_good 在 GRUP 中排在前面
@@ -151,7 +171,7 @@ class TestParseEsmCorruptedData:
         """子记录数据被截断时应跳过。"""
         # 构建一个子记录，声明大小为 50 但实际只有 5 字节数据
         sub_bad = b"FULL" + b"\x32\x00" + b"Hello"  # size=50, data=5 bytes
-        sub_good = build_subrecord(b"DESC", null_terminated("A description"))
+        sub_good = desc_sub("A description")
         # 由于 sub_bad 声明 50 字节但只有 5 字节，解析器会在 sub_bad 处中断
         # sub_good 不会被解析到
         rec = build_record(b"WEAP", 0x00000B00, sub_bad + sub_good)
@@ -171,12 +191,44 @@ class TestParseEsmCorruptedData:
         assert parse_esm_bytes(header) == []
 
 
+class TestParseEsmCompressed:
+    """压缩记录解析测试。"""
+
+    def test_compressed_record_is_decompressed(self):
+        """带压缩标志的记录应先解压再解析子记录。"""
+        import struct
+        import zlib
+
+        subrecords = full_sub("Packed Item")
+        payload = struct.pack("<I", len(subrecords)) + zlib.compress(subrecords)
+        rec = build_record(b"MISC", 0x00002000, payload, flags=0x00040000)
+        data = build_esm_file(build_grup(b"MISC", rec))
+
+        result = parse_esm_bytes(data)
+
+        assert len(result) == 1
+        assert result[0].record_id == "MISC:00002000:FULL"
+        assert result[0].text == "Packed Item"
+
+    def test_corrupted_compressed_record_skipped(self):
+        """解压失败的记录应被跳过，不影响后续记录。"""
+        import struct
+
+        bad = build_record(b"MISC", 0x00002001, struct.pack("<I", 64) + b"not zlib data", flags=0x00040000)
+        good = build_record(b"MISC", 0x00002002, full_sub("Plain"))
+        data = build_esm_file(build_grup(b"MISC", bad + good))
+
+        result = parse_esm_bytes(data)
+
+        assert [r.text for r in result] == ["Plain"]
+
+
 class TestParseEsmRecordId:
     """记录 ID 格式测试。"""
 
     def test_record_id_format(self):
         """记录 ID 应为 record_type:form_id_hex:subrecord_type 格式。"""
-        sub = build_subrecord(b"FULL", null_terminated("Test"))
+        sub = full_sub("Test")
         rec = build_record(b"NPC_", 0xDEADBEEF, sub)
         grup = build_grup(b"NPC_", rec)
         data = build_esm_file(grup)
@@ -188,7 +240,7 @@ class TestParseEsmRecordId:
 
     def test_record_id_preserves_form_id(self):
         """记录 ID 应保留原始 form_id 用于回写。"""
-        sub = build_subrecord(b"DESC", null_terminated("Description"))
+        sub = desc_sub("Description")
         rec = build_record(b"BOOK", 0x00012345, sub)
         grup = build_grup(b"BOOK", rec)
         data = build_esm_file(grup)
@@ -197,21 +249,40 @@ class TestParseEsmRecordId:
 
         assert result[0].record_id == "BOOK:00012345:DESC"
 
+    def test_record_carries_type_fields(self):
+        """解析结果应直接携带 record_type 和 subrecord_type（不含 #N 后缀）。"""
+        sub1 = build_subrecord(b"ITXT", null_terminated("Option A"))
+        sub2 = build_subrecord(b"ITXT", null_terminated("Option B"))
+        rec = build_record(b"TMLM", 0x0100448A, sub1 + sub2)
+        data = build_esm_file(build_grup(b"TMLM", rec))
+
+        result = parse_esm_bytes(data)
+
+        assert result[1].record_id == "TMLM:0100448A:ITXT#1"
+        assert result[1].record_type == "TMLM"
+        assert result[1].subrecord_type == "ITXT"
+
+    def test_manual_record_derives_type_fields(self):
+        """手动构造 StringRecord 时应从 record_id 推导类型字段。"""
+        rec = StringRecord(record_id="RFGP:0100448A:RNAM#2", text="x")
+        assert rec.record_type == "RFGP"
+        assert rec.subrecord_type == "RNAM"
+
 
 class TestParseEsmFileIO:
     """文件 I/O 测试。"""
 
-    def test_parse_esm_from_file(self, tmp_path):
-        """从文件路径解析 ESM。"""
-        sub = build_subrecord(b"FULL", null_terminated("Test Item"))
+    def test_parse_esm_from_file(self, esm_dir):
+        """从文件路径解析的结果应与直接解析字节数据一致（解析正确性由其余 parse_esm_bytes 测试覆盖）。"""
+        sub = full_sub("Test Item")
         rec = build_record(b"MISC", 0x00001000, sub)
         grup = build_grup(b"MISC", rec)
         data = build_esm_file(grup)
 
-        esm_file = tmp_path / "test.esm"
+        esm_file = esm_dir / "test.esm"
         esm_file.write_bytes(data)
 
         result = parse_esm(str(esm_file))
 
-        assert len(result) == 1
-        assert result[0].text == "Test Item"
+        assert result == parse_esm_bytes(data)
+        assert [r.text for r in result] == ["Test Item"]
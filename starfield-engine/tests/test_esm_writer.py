@@ -1,102 +1,78 @@
 """ESM 重组器单元测试。"""
 
+import operator
 import struct
+from pathlib import Path
 
 import pytest
 
 from engine.esm_parser import parse_esm, parse_esm_bytes
 from engine.esm_writer import WriteResult, rewrite_esm_bytes, write_esm
 from tests.esm_test_helpers import (
+    IRON_SWORD_EDID,
     build_esm_file,
+    build_full_esm,
     build_grup,
     build_record,
     build_subrecord,
-    null_terminated,
+    desc_sub,
+    edid_sub,
+    full_sub,
 )
 
 
+@pytest.mark.xdist_group("esm_roundtrip")
 class TestRewriteEsmBytesBasic:
     """基本文本替换测试。"""
 
-    def test_single_text_replacement(self):
+    def test_single_text_replacement(self, iron_sword_esm):
         """替换单个 FULL 子记录的文本。"""
-        sub = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
         translations = {"WEAP:00000100:FULL": "铁剑"}
-        result = rewrite_esm_bytes(data, translations)
+        result = rewrite_esm_bytes(iron_sword_esm, translations)
 
         records = parse_esm_bytes(result)
         assert len(records) == 1
         assert records[0].text == "铁剑"
         assert records[0].record_id == "WEAP:00000100:FULL"
 
-    def test_no_translations_returns_identical(self):
+    def test_no_translations_returns_identical(self, iron_sword_esm):
         """空翻译字典应返回与原始相同的数据。"""
-        sub = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
-        result = rewrite_esm_bytes(data, {})
-        assert result == data
+        result = rewrite_esm_bytes(iron_sword_esm, {})
+        assert result == iron_sword_esm
 
-    def test_unmatched_translation_key_ignored(self):
+    def test_unmatched_translation_key_ignored(self, iron_sword_esm):
         """不匹配的翻译 key 应被忽略，数据不变。"""
-        sub = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
         translations = {"WEAP:99999999:FULL": "不存在的翻译"}
-        result = rewrite_esm_bytes(data, translations)
-        assert result == data
+        result = rewrite_esm_bytes(iron_sword_esm, translations)
+        assert result == iron_sword_esm
 
 
 
+@pytest.mark.xdist_group("esm_roundtrip")
 class TestRewriteEsmBytesLengthChanges:
     """文本长度变化测试。"""
 
-    def test_shorter_text_adjusts_sizes(self):
-        """替换为更短的文本时应正确调整长度字段。"""
-        sub = build_subrecord(b"FULL", null_terminated("A very long item name"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
-        translations = {"WEAP:00000100:FULL": "短"}
-        result = rewrite_esm_bytes(data, translations)
-
-        # 验证可以正确解析
-        records = parse_esm_bytes(result)
-        assert len(records) == 1
-        assert records[0].text == "短"
+    @pytest.mark.parametrize(
+        ("source", "translated", "size_compare"),
+        [
+            pytest.param("A very long item name", "短", operator.lt, id="shorter"),
+            pytest.param("Hi", "这是一个非常长的翻译文本用于测试", operator.gt, id="longer"),
+            pytest.param("Abcdef", "测试", operator.eq, id="same_byte_length"),
+        ],
+    )
+    def test_text_length_change_adjusts_sizes(self, source, translated, size_compare):
+        """替换为更短 / 更长 / 等长的文本时应正确调整长度字段，文件大小随之变化。"""
+        data = build_full_esm([(b"WEAP", [(0x00000100, source)])])
 
-        # 验证文件变小了
-        assert len(result) < len(data)
-
-    def test_longer_text_adjusts_sizes(self):
-        """替换为更长的文本时应正确调整长度字段。"""
-        sub = build_subrecord(b"FULL", null_terminated("Hi"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
-        translations = {"WEAP:00000100:FULL": "这是一个非常长的翻译文本用于测试"}
-        result = rewrite_esm_bytes(data, translations)
+        result = rewrite_esm_bytes(data, {"WEAP:00000100:FULL": translated})
 
         records = parse_esm_bytes(result)
-        assert len(records) == 1
-        assert records[0].text == "这是一个非常长的翻译文本用于测试"
-
-        # 验证文件变大了
-        assert len(result) > len(data)
+        assert [r.text for r in records] == [translated]
+        assert size_compare(len(result), len(data))
 
     def test_subrecord_size_field_correct(self):
         """子记录的 size 字段应正确反映新文本长度。"""
-        sub = build_subrecord(b"FULL", null_terminated("Test"))
+        sub = full_sub("Test")
         rec = build_record(b"WEAP", 0x00000100, sub)
         grup = build_grup(b"WEAP", rec)
         data = build_esm_file(grup)
@@ -104,31 +80,36 @@ class TestRewriteEsmBytesLengthChanges:
         translations = {"WEAP:00000100:FULL": "测试文本"}
         result = rewrite_esm_bytes(data, translations)
 
-        # 找到 FULL 子记录并验证 size 字段
+        # 按结构定位：TES4 记录之后依次是 GRUP 头部（24 字节）和 WEAP 记录头部（24 字节）
         expected_text_bytes = "测试文本".encode("utf-8") + b"\x00"
-        expected_size = len(expected_text_bytes)
-
-        # 在结果中搜索 FULL 子记录
-        idx = result.find(b"FULL")
-        # 跳过 GRUP label 中可能出现的 FULL，找记录内的
-        while idx != -1:
-            sub_size = struct.unpack_from("<H", result, idx + 4)[0]
-            sub_data = result[idx + 6 : idx + 6 + sub_size]
-            if sub_data == expected_text_bytes:
-                assert sub_size == expected_size
-                return
-            idx = result.find(b"FULL", idx + 1)
-
-        pytest.fail("未找到翻译后的 FULL 子记录")
-
-
+        tes4_data_size = struct.unpack_from("<I", result, 4)[0]
+        rec_off = 24 + tes4_data_size + 24
+        rec_type, rec_data_size = struct.unpack_from("<4sI", result, rec_off)
+        assert rec_type == b"WEAP"
+
+        # 按子记录头部步进查找 FULL，并验证 size 字段
+        sub_off = rec_off + 24
+        rec_end = sub_off + rec_data_size
+        while sub_off < rec_end:
+            sub_type, sub_size = struct.unpack_from("<4sH", result, sub_off)
+            if sub_type == b"FULL":
+                break
+            sub_off += 6 + sub_size
+        else:
+            pytest.fail("未找到翻译后的 FULL 子记录")
+
+        assert sub_size == len(expected_text_bytes)
+        assert result[sub_off + 6 : sub_off + 6 + sub_size] == expected_text_bytes
+
+
+@pytest.mark.xdist_group("esm_roundtrip")
 class TestRewriteEsmBytesMultipleReplacements:
     """多个替换测试。"""
 
     def test_multiple_subrecords_in_one_record(self):
         """同一记录中多个可翻译子记录都应被替换。"""
-        sub_full = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        sub_desc = build_subrecord(b"DESC", null_terminated("A basic iron sword."))
+        sub_full = full_sub("Iron Sword")
+        sub_desc = desc_sub("A basic iron sword.")
         rec = build_record(b"WEAP", 0x00000200, sub_full + sub_desc)
         grup = build_grup(b"WEAP", rec)
         data = build_esm_file(grup)
@@ -144,42 +125,40 @@ class TestRewriteEsmBytesMultipleReplacements:
         assert records[0].text == "铁剑"
         assert records[1].text == "一把基础的铁剑。"
 
-    def test_multiple_records_in_grup(self):
-        """GRUP 中多个记录都应被正确替换。"""
-        rec1 = build_record(b"WEAP", 0x00000500, build_subrecord(b"FULL", null_terminated("Sword")))
-        rec2 = build_record(b"WEAP", 0x00000600, build_subrecord(b"FULL", null_terminated("Axe")))
-        grup = build_grup(b"WEAP", rec1 + rec2)
-        data = build_esm_file(grup)
-
-        translations = {
-            "WEAP:00000500:FULL": "剑",
-            "WEAP:00000600:FULL": "斧",
-        }
-        result = rewrite_esm_bytes(data, translations)
+    @pytest.mark.parametrize(
+        ("grups", "translations"),
+        [
+            pytest.param(
+                [(b"WEAP", [(0x00000500, "Sword"), (0x00000600, "Axe")])],
+                {"WEAP:00000500:FULL": "剑", "WEAP:00000600:FULL": "斧"},
+                id="multiple_records_in_grup",
+            ),
+            pytest.param(
+                [(b"WEAP", [(0x00000700, "Sword")]), (b"ARMO", [(0x00000800, "Shield")])],
+                {"WEAP:00000700:FULL": "剑", "ARMO:00000800:FULL": "盾"},
+                id="multiple_grups",
+            ),
+        ],
+    )
+    def test_all_records_replaced(self, grups, translations):
+        """GRUP 中的多个记录、多个 GRUP 中的记录都应被正确替换。"""
+        result = rewrite_esm_bytes(build_full_esm(grups), translations)
 
         records = parse_esm_bytes(result)
-        assert len(records) == 2
-        assert records[0].text == "剑"
-        assert records[1].text == "斧"
+        assert [(r.record_id, r.text) for r in records] == list(translations.items())
 
-    def test_multiple_grups(self):
-        """多个 GRUP 中的记录都应被正确替换。"""
-        rec1 = build_record(b"WEAP", 0x00000700, build_subrecord(b"FULL", null_terminated("Sword")))
-        rec2 = build_record(b"ARMO", 0x00000800, build_subrecord(b"FULL", null_terminated("Shield")))
-        grup1 = build_grup(b"WEAP", rec1)
-        grup2 = build_grup(b"ARMO", rec2)
-        data = build_esm_file(grup1 + grup2)
+    def test_untouched_record_copied_verbatim(self):
+        """未被翻译引用的记录应按原始字节完整保留。"""
+        rec1 = build_record(b"WEAP", 0x00000900, full_sub("Sword"))
+        rec2 = build_record(b"WEAP", 0x00000901, full_sub("Axe"))
+        data = build_esm_file(build_grup(b"WEAP", rec1 + rec2))
 
-        translations = {
-            "WEAP:00000700:FULL": "剑",
-            "ARMO:00000800:FULL": "盾",
-        }
+        translations = {"WEAP:00000900:FULL": "剑", "malformed-key": "忽略"}
         result = rewrite_esm_bytes(data, translations)
 
+        assert result.endswith(rec2)
         records = parse_esm_bytes(result)
-        assert len(records) == 2
-        assert records[0].text == "剑"
-        assert records[1].text == "盾"
+        assert [r.text for r in records] == ["剑", "Axe"]
 
 
 
@@ -188,8 +167,8 @@ class TestNonTranslatablePreservation:
 
     def test_non_translatable_subrecords_preserved(self):
         """非可翻译子记录应保持不变。"""
-        sub_edid = build_subrecord(b"EDID", null_terminated("WeapIronSword"))
-        sub_full = build_subrecord(b"FULL", null_terminated("Iron Sword"))
+        sub_edid = edid_sub("WeapIronSword")
+        sub_full = full_sub("Iron Sword")
         sub_data = build_subrecord(b"DATA", struct.pack("<f", 10.5))
         rec = build_record(b"WEAP", 0x00000300, sub_edid + sub_full + sub_data)
         grup = build_grup(b"WEAP", rec)
@@ -204,51 +183,44 @@ class TestNonTranslatablePreservation:
         assert len(records) == 1
         assert records[0].text == "铁剑"
 
-        # 验证 EDID 数据完整
+        # 验证 EDID 数据完整（memoryview 切片比较不复制数据）
         idx = result.find(b"EDID")
         assert idx != -1
         edid_size = struct.unpack_from("<H", result, idx + 4)[0]
-        edid_data = result[idx + 6 : idx + 6 + edid_size]
-        assert edid_data == null_terminated("WeapIronSword")
+        assert memoryview(result)[idx + 6 : idx + 6 + edid_size] == IRON_SWORD_EDID
 
     def test_tes4_header_preserved(self):
         """TES4 头部应保持不变。"""
-        sub = build_subrecord(b"FULL", null_terminated("Test"))
+        sub = full_sub("Test")
         rec = build_record(b"WEAP", 0x00000100, sub)
         grup = build_grup(b"WEAP", rec)
         data = build_esm_file(grup)
 
-        # 获取原始 TES4 头部
         header_data_size = struct.unpack_from("<I", data, 4)[0]
-        original_tes4 = data[: 24 + header_data_size]
+        tes4_end = 24 + header_data_size
 
         translations = {"WEAP:00000100:FULL": "测试"}
         result = rewrite_esm_bytes(data, translations)
 
-        # TES4 头部应完全相同
-        result_tes4 = result[: 24 + header_data_size]
-        assert result_tes4 == original_tes4
+        # TES4 头部应完全相同（memoryview 切片比较不复制数据）
+        assert memoryview(result)[:tes4_end] == memoryview(data)[:tes4_end]
 
 
+@pytest.mark.xdist_group("esm_roundtrip")
 class TestRoundTripConsistency:
     """往返一致性测试：parse -> write（无翻译）-> 比较。"""
 
-    def test_round_trip_single_record(self):
+    def test_round_trip_single_record(self, iron_sword_esm):
         """单条记录的往返一致性。"""
-        sub = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
-        result = rewrite_esm_bytes(data, {})
-        assert result == data
+        result = rewrite_esm_bytes(iron_sword_esm, {})
+        assert result == iron_sword_esm
 
     def test_round_trip_multiple_records(self):
         """多条记录的往返一致性。"""
-        sub1 = build_subrecord(b"FULL", null_terminated("Sword"))
-        sub2 = build_subrecord(b"DESC", null_terminated("A sword."))
+        sub1 = full_sub("Sword")
+        sub2 = desc_sub("A sword.")
         rec1 = build_record(b"WEAP", 0x00000100, sub1 + sub2)
-        rec2 = build_record(b"ARMO", 0x00000200, build_subrecord(b"FULL", null_terminated("Shield")))
+        rec2 = build_record(b"ARMO", 0x00000200, full_sub("Shield"))
         grup1 = build_grup(b"WEAP", rec1)
         grup2 = build_grup(b"ARMO", rec2)
         data = build_esm_file(grup1 + grup2)
@@ -258,8 +230,8 @@ class TestRoundTripConsistency:
 
     def test_round_trip_with_non_translatable(self):
         """包含非可翻译子记录的往返一致性。"""
-        sub_edid = build_subrecord(b"EDID", null_terminated("WeapIronSword"))
-        sub_full = build_subrecord(b"FULL", null_terminated("Iron Sword"))
+        sub_edid = edid_sub("WeapIronSword")
+        sub_full = full_sub("Iron Sword")
         sub_data = build_subrecord(b"DATA", struct.pack("<fI", 10.5, 100))
         rec = build_record(b"WEAP", 0x00000100, sub_edid + sub_full + sub_data)
         grup = build_grup(b"WEAP", rec)
@@ -276,110 +248,100 @@ class TestRoundTripConsistency:
 
 
 
+@pytest.fixture(scope="class")
+def esm_input(tmp_path_factory, iron_sword_esm):
+    """每个测试类只写入一次的只读输入 ESM，返回 (文件路径, 原始数据)。"""
+    input_path = tmp_path_factory.mktemp("esm_write") / "test.esm"
+    input_path.write_bytes(iron_sword_esm)
+    return input_path, iron_sword_esm
+
+
+@pytest.fixture
+def output_path(esm_input, request):
+    """当前测试专用的输出文件路径，与输入文件位于同一目录。"""
+    input_path, _ = esm_input
+    return input_path.parent / f"{request.node.name}_translated.esm"
+
+
 class TestWriteEsmFileIO:
-    """文件 I/O 和备份测试。"""
+    """文件 I/O 和备份测试。
 
-    def test_backup_file_created(self, tmp_path):
-        """写入前应创建原始文件的备份。"""
-        sub = build_subrecord(b"FULL", null_terminated("Test"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
+    输入文件每个测试类只写入一次，各测试按测试名写入不同的输出 / 备份文件。
+    """
 
-        original_file = tmp_path / "test.esm"
-        original_file.write_bytes(data)
-        output_file = tmp_path / "test_translated.esm"
+    def test_backup_file_created(self, esm_input, output_path):
+        """写入前应创建原始文件的备份，内容与原始文件相同。"""
+        input_path, data = esm_input
 
-        result = write_esm(str(original_file), {"WEAP:00000100:FULL": "测试"}, str(output_file))
+        result = write_esm(str(input_path), {"WEAP:00000100:FULL": "测试"}, str(output_path))
 
-        # 备份文件应存在且内容与原始文件相同
-        from pathlib import Path
-        backup = Path(result.backup_path)
-        assert backup.exists()
-        assert backup.read_bytes() == data
+        assert memoryview(Path(result.backup_path).read_bytes()) == data
 
-    def test_backup_default_path(self, tmp_path):
+    def test_backup_default_path(self, esm_input, output_path):
         """默认备份路径应为 {original_name}.backup.esm。"""
-        sub = build_subrecord(b"FULL", null_terminated("Test"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
-        original_file = tmp_path / "mymod.esm"
-        original_file.write_bytes(data)
-        output_file = tmp_path / "mymod_translated.esm"
+        input_path, _ = esm_input
 
-        result = write_esm(str(original_file), {}, str(output_file))
+        result = write_esm(str(input_path), {}, str(output_path))
 
-        assert result.backup_path == str(tmp_path / "mymod.backup.esm")
+        assert result.backup_path == str(input_path.parent / "test.backup.esm")
 
-    def test_custom_backup_path(self, tmp_path):
+    def test_custom_backup_path(self, esm_input, output_path, request):
         """支持自定义备份路径。"""
-        sub = build_subrecord(b"FULL", null_terminated("Test"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
-        original_file = tmp_path / "test.esm"
-        original_file.write_bytes(data)
-        output_file = tmp_path / "output.esm"
-        backup_file = tmp_path / "backups" / "test_backup.esm"
+        input_path, data = esm_input
+        backup_file = input_path.parent / "backups" / f"{request.node.name}.esm"
         backup_file.parent.mkdir(parents=True, exist_ok=True)
 
-        result = write_esm(str(original_file), {}, str(output_file), backup_path=str(backup_file))
+        result = write_esm(str(input_path), {}, str(output_path), backup_path=str(backup_file))
 
         assert result.backup_path == str(backup_file)
         assert backup_file.read_bytes() == data
 
-    def test_output_file_contains_translations(self, tmp_path):
+    def test_output_file_contains_translations(self, esm_input, output_path):
         """输出文件应包含翻译后的文本。"""
-        sub = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
+        input_path, _ = esm_input
 
-        original_file = tmp_path / "test.esm"
-        original_file.write_bytes(data)
-        output_file = tmp_path / "test_translated.esm"
+        write_esm(str(input_path), {"WEAP:00000100:FULL": "铁剑"}, str(output_path))
 
-        write_esm(str(original_file), {"WEAP:00000100:FULL": "铁剑"}, str(output_file))
-
-        records = parse_esm(str(output_file))
+        records = parse_esm(str(output_path))
         assert len(records) == 1
         assert records[0].text == "铁剑"
 
-    def test_original_file_unchanged(self, tmp_path):
-        """原始文件在写入后应保持不变。"""
-        sub = build_subrecord(b"FULL", null_terminated("Iron Sword"))
-        rec = build_record(b"WEAP", 0x00000100, sub)
-        grup = build_grup(b"WEAP", rec)
-        data = build_esm_file(grup)
-
-        original_file = tmp_path / "test.esm"
-        original_file.write_bytes(data)
-        output_file = tmp_path / "test_translated.esm"
+    def test_original_file_unchanged(self, esm_input, output_path):
+        """原始文件在写入后应保持不变（修改时间和大小均未变化）。"""
+        input_path, data = esm_input
+        before = input_path.stat()
 
-        write_esm(str(original_file), {"WEAP:00000100:FULL": "铁剑"}, str(output_file))
+        write_esm(str(input_path), {"WEAP:00000100:FULL": "铁剑"}, str(output_path))
 
-        # 原始文件不应被修改
-        assert original_file.read_bytes() == data
+        after = input_path.stat()
+        assert (after.st_mtime_ns, after.st_size) == (before.st_mtime_ns, len(data))
 
-    def test_write_result_paths(self, tmp_path):
+    def test_write_result_paths(self, esm_input, output_path):
         """WriteResult 应包含正确的路径。"""
-        data = build_esm_file(b"")
-        original_file = tmp_path / "test.esm"
-        original_file.write_bytes(data)
-        output_file = tmp_path / "output.esm"
+        input_path, _ = esm_input
 
-        result = write_esm(str(original_file), {}, str(output_file))
+        result = write_esm(str(input_path), {}, str(output_path))
 
-        assert result.output_path == str(output_file)
-        assert result.backup_path == str(tmp_path / "test.backup.esm")
+        assert result.output_path == str(output_path)
+        assert result.backup_path == str(input_path.parent / "test.backup.esm")
 
 
 class TestEdgeCases:
     """边界情况测试。"""
 
+    def test_deeply_nested_grups(self):
+        """深层嵌套 GRUP 不应触发递归深度限制，且长度字段应逐层修正。"""
+        inner = build_record(b"WEAP", 0x00000100, full_sub("Deep"))
+        for _ in range(2000):
+            inner = build_grup(b"WEAP", inner)
+        data = build_esm_file(inner)
+
+        result = rewrite_esm_bytes(data, {"WEAP:00000100:FULL": "深层"})
+
+        records = parse_esm_bytes(result)
+        assert [r.text for r in records] == ["深层"]
+        assert rewrite_esm_bytes(result, {"WEAP:00000100:FULL": "Deep"}) == data
+
     def test_empty_data(self):
         """空数据应原样返回。"""
         assert rewrite_esm_bytes(b"", {}) == b""
@@ -2,89 +2,243 @@
 
 from __future__ import annotations
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import pytest
 
 from engine.esm_parser import StringRecord
+from engine.prompt_builder import build_dictionary_section
 from engine.llm_client import (
+    BREAKER_FAILURE_THRESHOLD,
     MAX_RETRIES,
     RETRY_DELAYS,
+    _Endpoint,
+    _ResponseParser,
+    _TokenBucket,
+    _breaker,
+    _mask_tags,
+    _pack_batches,
     _parse_response,
     _translate_batch,
+    _unmask_tags,
     translate_records,
 )
+from tests.esm_test_helpers import make_records
 
 
 # ---------------------------------------------------------------------------
 # 辅助工具
 # ---------------------------------------------------------------------------
 
-def _make_records(n: int) -> list[StringRecord]:
-    """生成 n 条测试用 StringRecord。"""
+@pytest.fixture(autouse=True)
+def _reset_breaker():
+    """熔断器为模块级共享状态，每个用例前后重置。"""
+    _breaker.reset()
+    yield
+    _breaker.reset()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def _no_sleep():
+    """重试退避在本模块中不真正等待；需要断言等待时长的用例自行 patch time.sleep。"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("engine.llm_client.time.sleep", lambda *_: None)
+        yield
+
+
+@pytest.fixture
+def llm_mocks(monkeypatch) -> SimpleNamespace:
+    """替换端点与模型配置读取，返回对应的 mock；端点列表由用例自行设置。"""
+    mocks = SimpleNamespace(endpoints=MagicMock(), model=MagicMock(return_value="gpt-4o-mini"))
+    monkeypatch.setattr("engine.llm_client._get_endpoints", mocks.endpoints)
+    monkeypatch.setattr("engine.llm_client._get_model", mocks.model)
+    return mocks
+
+
+def _mock_chunk(content: str | None) -> SimpleNamespace:
+    """构造一个流式响应分块，只包含被测代码读取的 choices[0].delta.content。"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def _mock_completion(translated_lines: list[str]) -> list[SimpleNamespace]:
+    """构造一个模拟的 OpenAI 流式 ChatCompletion 响应。
+
+    内容按 5 个字符切块，使编号行跨分块边界；首块为推理模型的空 content，末块无 choices。
+    """
+    content = "\n".join(translated_lines)
     return [
-        StringRecord(record_id=f"NPC_:{i:08X}:FULL", text=f"Text {i}")
-        for i in range(n)
+        _mock_chunk(None),
+        *(_mock_chunk(content[i : i + 5]) for i in range(0, len(content), 5)),
+        SimpleNamespace(choices=[]),
     ]
 
 
-def _mock_completion(translated_lines: list[str]) -> MagicMock:
-    """构造一个模拟的 OpenAI ChatCompletion 响应。"""
-    content = "\n".join(translated_lines)
-    message = MagicMock()
-    message.content = content
-    choice = MagicMock()
-    choice.message = message
-    response = MagicMock()
-    response.choices = [choice]
-    return response
+def _system_message(client: MagicMock) -> str:
+    """取最近一次 create 调用的 system message 内容。"""
+    return client.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+
+
+# batch_size=2 翻译 5 条记录时各批次的预构建响应，按批次首条原文区分
+_BATCH_RESPONSES = {
+    "Text 0": _mock_completion(["翻译0", "翻译1"]),
+    "Text 2": _mock_completion(["翻译2", "翻译3"]),
+    "Text 4": _mock_completion(["翻译4"]),
+}
+
+
+def _batch_dispatcher(responses: dict[str, list[SimpleNamespace]]):
+    """构造 create 的 side_effect：按 Prompt 中的原文返回对应批次的响应，未预置的批次视为调用失败。"""
+    def _dispatch(**kwargs) -> list[SimpleNamespace]:
+        content = kwargs["messages"][1]["content"]
+        for text, response in responses.items():
+            if text in content:
+                return response
+        raise Exception("fail")
+
+    return _dispatch
 
 
 # ---------------------------------------------------------------------------
-# _parse_response 测试
+# 标签遮蔽测试
 # ---------------------------------------------------------------------------
 
-class TestParseResponse:
-    """翻译结果解析与 ID 匹配测试。"""
+class TestMaskTags:
+    """_mask_tags / _unmask_tags 标签遮蔽测试。"""
 
-    def test_exact_match(self):
-        """返回行数与记录数一致时，逐行匹配。"""
-        records = _make_records(3)
-        response_text = "翻译0\n翻译1\n翻译2"
-        result = _parse_response(response_text, records)
+    def test_mask_and_unmask_roundtrip(self):
+        """标签按出现顺序编号，还原后与原文一致。"""
+        text = "Press <Alias=Key> to <b>open</b> <b>door</b>"
+        masked, tags = _mask_tags(text)
 
-        assert len(result) == 3
-        for i, r in enumerate(records):
-            assert result[r.record_id] == f"翻译{i}"
+        assert masked == "Press {{TAG_0}} to {{TAG_1}}open{{TAG_2}} {{TAG_3}}door{{TAG_4}}"
+        assert tags == ["<Alias=Key>", "<b>", "</b>", "<b>", "</b>"]
+        assert _unmask_tags(masked, tags) == text
 
-    def test_fewer_lines_falls_back_to_original(self):
-        """返回行数不足时，缺失的记录回退到原文。"""
-        records = _make_records(3)
-        response_text = "翻译0"
-        result = _parse_response(response_text, records)
+    def test_many_tags_roundtrip(self):
+        """标签数超过预生成占位符数量时仍可正确遮蔽和还原。"""
+        text = "".join(f"<t{i}>" for i in range(300))
+        masked, tags = _mask_tags(text)
+
+        assert masked.endswith("{{TAG_299}}")
+        assert _unmask_tags(masked, tags) == text
+
+    def test_unknown_placeholder_kept(self):
+        """编号超出标签列表的占位符保持原样。"""
+        assert _unmask_tags("{{TAG_0}} {{TAG_7}}", ["<b>"]) == "<b> {{TAG_7}}"
 
-        assert result[records[0].record_id] == "翻译0"
-        assert result[records[1].record_id] == records[1].text
-        assert result[records[2].record_id] == records[2].text
 
-    def test_empty_line_falls_back_to_original(self):
-        """空翻译行回退到原文。"""
-        records = _make_records(2)
-        response_text = "翻译0\n"
+# ---------------------------------------------------------------------------
+# _parse_response 测试
+# ---------------------------------------------------------------------------
+
+class TestParseResponse:
+    """翻译结果解析与 ID 匹配测试。"""
+
+    @pytest.mark.parametrize(
+        "response_text,expected",
+        [
+            # 返回编号与记录数一致时，按编号匹配
+            pytest.param("[1] 翻译0\n[2] 翻译1\n[3] 翻译2", ["翻译0", "翻译1", "翻译2"], id="exact_match"),
+            # 返回编号不足时，缺失的记录回退到原文
+            pytest.param("[1] 翻译0", ["翻译0", "Text 1", "Text 2"], id="fewer_lines_fall_back"),
+            # 空译文回退到原文
+            pytest.param("[1] 翻译0\n[2] ", ["翻译0", "Text 1"], id="empty_line_falls_back"),
+            # 编号行之后的续行归入同一条译文，兼容 CRLF 换行
+            pytest.param("[1] 第一行\r\n第二行\r\n[2] 翻译1\r\n", ["第一行\n第二行", "翻译1"], id="multiline_crlf"),
+            # 译文内部的空行（段落分隔）应保留，首尾空行忽略
+            pytest.param("\n[1] 第一段\n\n第二段\n[2] 翻译1\n\n", ["第一段\n\n第二段", "翻译1"], id="blank_lines_kept"),
+            # 只按 \n 断行，译文中的 \x0b、\u2028 等字符保持原样
+            pytest.param("[1] 甲\x0b乙\u2028丙\n[2] 翻译1", ["甲\x0b乙\u2028丙", "翻译1"], id="only_newline_splits"),
+        ],
+    )
+    def test_matches_numbered_lines(self, response_text, expected):
+        """按编号匹配译文，缺失或为空的编号回退到原文；逐字符流式喂入的结果与一次性解析一致。"""
+        records = make_records(len(expected))
         result = _parse_response(response_text, records)
 
-        assert result[records[0].record_id] == "翻译0"
-        assert result[records[1].record_id] == records[1].text
+        assert result == {r.record_id: text for r, text in zip(records, expected)}
+        parser = _ResponseParser()
+        for char in response_text:
+            parser.feed(char)
+        assert parser.finish(records) == result
 
     def test_preserves_all_record_ids(self):
         """结果字典应包含所有输入记录的 ID。"""
-        records = _make_records(5)
+        records = make_records(5)
         response_text = "\n".join([f"T{i}" for i in range(5)])
         result = _parse_response(response_text, records)
 
         assert set(result.keys()) == {r.record_id for r in records}
 
 
+# ---------------------------------------------------------------------------
+# _pack_batches 测试（自适应分批）
+# ---------------------------------------------------------------------------
+
+class TestPackBatches:
+    """按 token 预算分批测试。"""
+
+    def test_short_texts_fill_batch_size(self):
+        """短文本按 batch_size 上限分批。"""
+        batches = _pack_batches(make_records(5), batch_size=2, max_input_tokens=2000)
+        assert [len(b) for b in batches] == [2, 2, 1]
+
+    def test_long_texts_split_by_token_budget(self):
+        """长文本超出预算时提前截断批次，超长单条独占一批。"""
+        records = [
+            StringRecord(record_id="BOOK:00000001:DESC", text="a" * 400),
+            StringRecord(record_id="BOOK:00000002:DESC", text="b" * 400),
+            StringRecord(record_id="BOOK:00000003:DESC", text="c" * 4000),
+            StringRecord(record_id="NPC_:00000004:FULL", text="Yes"),
+        ]
+        batches = _pack_batches(records, batch_size=20, max_input_tokens=150)
+        assert [[r.record_id for r in b] for b in batches] == [
+            ["BOOK:00000001:DESC"],
+            ["BOOK:00000002:DESC"],
+            ["BOOK:00000003:DESC"],
+            ["NPC_:00000004:FULL"],
+        ]
+
+    def test_preserves_order_and_records(self):
+        """分批后按顺序拼接应与原列表一致。"""
+        records = make_records(7)
+        batches = _pack_batches(records, batch_size=3, max_input_tokens=20)
+        assert [r for b in batches for r in b] == records
+
+
+# ---------------------------------------------------------------------------
+# _TokenBucket 测试（端点限流）
+# ---------------------------------------------------------------------------
+
+class TestTokenBucket:
+    """令牌桶限流测试。"""
+
+    def test_burst_within_capacity_does_not_wait(self):
+        """桶内令牌充足时取令牌不阻塞。"""
+        bucket = _TokenBucket(requests_per_minute=3)
+        with patch("engine.llm_client.time.sleep") as mock_sleep:
+            for _ in range(3):
+                bucket.acquire()
+        mock_sleep.assert_not_called()
+
+    def test_waits_when_empty(self):
+        """令牌耗尽时按补充速率等待。"""
+        bucket = _TokenBucket(requests_per_minute=60)
+        bucket._tokens = 0.0
+
+        def _refill(seconds):
+            bucket._tokens = 1.0
+
+        with patch("engine.llm_client.time.sleep", side_effect=_refill) as mock_sleep:
+            bucket.acquire()
+
+        assert mock_sleep.call_count == 1
+        assert 0 < mock_sleep.call_args.args[0] <= 1.0
+
+
 # ---------------------------------------------------------------------------
 # _translate_batch 测试（重试逻辑）
 # ---------------------------------------------------------------------------
@@ -94,20 +248,21 @@ class TestTranslateBatch:
 
     def test_success_on_first_attempt(self):
         """首次调用成功时直接返回结果。"""
-        records = _make_records(2)
+        records = make_records(2)
         client = MagicMock()
-        client.chat.completions.create.return_value = _mock_completion(["翻译0", "翻译1"])
+        client.chat.completions.create.return_value = _mock_completion(["[1] 翻译0", "[2] 翻译1"])
 
         result = _translate_batch(client, "gpt-4o-mini", records, "zh-CN", None, None)
 
         assert len(result) == 2
         assert result[records[0].record_id] == "翻译0"
         assert client.chat.completions.create.call_count == 1
+        assert client.chat.completions.create.call_args.kwargs["stream"] is True
 
     @patch("engine.llm_client.time.sleep")
     def test_retry_on_failure_then_success(self, mock_sleep):
         """前两次失败、第三次成功时应重试并返回结果。"""
-        records = _make_records(2)
+        records = make_records(2)
         client = MagicMock()
         client.chat.completions.create.side_effect = [
             Exception("timeout"),
@@ -119,55 +274,180 @@ class TestTranslateBatch:
 
         assert len(result) == 2
         assert client.chat.completions.create.call_count == 3
-        # 验证退避间隔
+        # 验证退避间隔：基础间隔叠加至多一半的随机抖动
         assert mock_sleep.call_count == 2
-        mock_sleep.assert_any_call(RETRY_DELAYS[0])
-        mock_sleep.assert_any_call(RETRY_DELAYS[1])
+        for call, base in zip(mock_sleep.call_args_list, RETRY_DELAYS):
+            assert base <= call.args[0] <= base * 1.5
 
     @patch("engine.llm_client.time.sleep")
-    def test_all_retries_exhausted_returns_empty(self, mock_sleep):
-        """3 次重试全部失败时返回空字典。"""
-        records = _make_records(2)
+    def test_all_retries_exhausted_returns_empty(self, mock_sleep, monkeypatch):
+        """重试次数用尽仍失败时返回空字典；缩小重试策略，使用例耗时与生产配置无关。"""
+        monkeypatch.setattr("engine.llm_client.MAX_RETRIES", 2)
+        monkeypatch.setattr("engine.llm_client.RETRY_DELAYS", [0, 0])
+        records = make_records(2)
         client = MagicMock()
         client.chat.completions.create.side_effect = Exception("persistent error")
 
         result = _translate_batch(client, "gpt-4o-mini", records, "zh-CN", None, None)
 
         assert result == {}
-        assert client.chat.completions.create.call_count == MAX_RETRIES
-        assert mock_sleep.call_count == MAX_RETRIES - 1
+        assert client.chat.completions.create.call_count == 2
+        mock_sleep.assert_called_once_with(0)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        """连续失败达到阈值后熔断，冷却期内的批次不再调用 LLM。"""
+        client = MagicMock()
+        client.chat.completions.create.side_effect = Exception("service unavailable")
+
+        while client.chat.completions.create.call_count < BREAKER_FAILURE_THRESHOLD:
+            _translate_batch(client, "gpt-4o-mini", make_records(1), "zh-CN", None, None)
+        calls = client.chat.completions.create.call_count
+
+        result = _translate_batch(client, "gpt-4o-mini", make_records(1), "zh-CN", None, None)
+
+        assert _breaker.state == "open"
+        assert result == {}
+        assert client.chat.completions.create.call_count == calls
+
+    def test_breaker_half_open_success_closes(self):
+        """冷却结束后放行请求，成功则关闭熔断器。"""
+        for _ in range(BREAKER_FAILURE_THRESHOLD):
+            _breaker.record_failure()
+        _breaker.cooldown = 0.0
+        client = MagicMock()
+        client.chat.completions.create.return_value = _mock_completion(["[1] 翻译0"])
+
+        result = _translate_batch(client, "gpt-4o-mini", make_records(1), "zh-CN", None, None)
+
+        assert len(result) == 1
+        assert _breaker.state == "closed"
+        assert _breaker.failures == 0
+
+    def test_breaker_ignores_failures_while_open(self):
+        """熔断后在途批次陆续返回的失败不再重复触发熔断，也不延长冷却期。"""
+        barrier = threading.Barrier(BREAKER_FAILURE_THRESHOLD + 7)
+
+        def fail():
+            barrier.wait()
+            _breaker.record_failure()
+
+        threads = [threading.Thread(target=fail) for _ in range(barrier.parties)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert _breaker.state == "open"
+        assert _breaker.trips == 1
+        assert _breaker.failures == BREAKER_FAILURE_THRESHOLD
+
+    def test_breaker_ignores_late_success_while_open(self):
+        """熔断前发出的请求在打开期间成功返回，不会提前关闭熔断器。"""
+        for _ in range(BREAKER_FAILURE_THRESHOLD):
+            _breaker.record_failure()
+
+        _breaker.record_success()
+
+        assert _breaker.state == "open"
+        assert _breaker.trips == 1
+
+    def test_breaker_half_open_allows_single_probe(self):
+        """冷却结束后只放行一个探测请求，探测失败则重新打开并延长冷却期。"""
+        for _ in range(BREAKER_FAILURE_THRESHOLD):
+            _breaker.record_failure()
+        _breaker.cooldown = 0.0
+
+        assert _breaker.allow()
+        assert not _breaker.allow()
+        assert _breaker.state == "half_open"
+
+        _breaker.record_failure()
+
+        assert _breaker.state == "open"
+        assert _breaker.trips == 2
+
+    def test_duplicate_texts_sent_once(self):
+        """批内重复文本只发送一次，译文分发给所有相同文本的记录，并按各自标签还原。"""
+        records = [
+            StringRecord(record_id="NPC_:00000001:FULL", text="Yes"),
+            StringRecord(record_id="NPC_:00000002:FULL", text="<b>Open</b>"),
+            StringRecord(record_id="NPC_:00000003:FULL", text="Yes"),
+            StringRecord(record_id="NPC_:00000004:FULL", text="<i>Open</i>"),
+        ]
+        client = MagicMock()
+        client.chat.completions.create.return_value = _mock_completion(
+            ["[1] 是", "[2] {{TAG_0}}打开{{TAG_1}}"]
+        )
+
+        result = _translate_batch(client, "gpt-4o-mini", records, "zh-CN", None, None)
+
+        prompt = client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        assert "[3]" not in prompt
+        assert result == {
+            "NPC_:00000001:FULL": "是",
+            "NPC_:00000002:FULL": "<b>打开</b>",
+            "NPC_:00000003:FULL": "是",
+            "NPC_:00000004:FULL": "<i>打开</i>",
+        }
+
+    def test_json_output_mode(self):
+        """JSON 输出模式应请求 json_object 并按编号键解析译文。"""
+        records = make_records(3)
+        client = MagicMock()
+        client.chat.completions.create.return_value = _mock_completion(
+            ['{"1": "翻译0", "2": "第一行\\n第二行", "3": ""}']
+        )
+
+        result = _translate_batch(client, "gpt-4o-mini", records, "zh-CN", None, None, json_output=True)
+
+        kwargs = client.chat.completions.create.call_args.kwargs
+        assert kwargs["response_format"] == {"type": "json_object"}
+        assert "JSON" in kwargs["messages"][1]["content"]
+        assert result == {
+            records[0].record_id: "翻译0",
+            records[1].record_id: "第一行\n第二行",
+            records[2].record_id: records[2].text,
+        }
+
+    def test_json_output_falls_back_to_numbered_lines(self):
+        """JSON 模式下响应不是 JSON 对象时按编号行格式解析。"""
+        records = make_records(2)
+        client = MagicMock()
+        client.chat.completions.create.return_value = _mock_completion(["[1] 翻译0", "[2] 翻译1"])
+
+        result = _translate_batch(client, "gpt-4o-mini", records, "zh-CN", None, None, json_output=True)
+
+        assert result == {records[0].record_id: "翻译0", records[1].record_id: "翻译1"}
 
     def test_passes_custom_prompt_and_dictionary(self):
-        """应将 custom_prompt 和 dictionary_entries 传递给 build_prompt。"""
-        records = _make_records(1)
+        """应将 custom_prompt 和词典约束段传递给 build_prompt。"""
+        records = make_records(1)
         client = MagicMock()
         client.chat.completions.create.return_value = _mock_completion(["翻译"])
 
         custom = "自定义翻译指令"
-        entries = [{"sourceText": "Sword", "targetText": "剑"}]
+        section = "以下词条必须保持指定翻译：\n\nSword → 剑"
 
         with patch("engine.llm_client.build_prompt") as mock_build:
             mock_build.return_value = "mocked prompt"
-            _translate_batch(client, "gpt-4o-mini", records, "zh-CN", custom, entries)
+            _translate_batch(client, "gpt-4o-mini", records, "zh-CN", custom, section)
 
             mock_build.assert_called_once_with(
                 texts_to_translate=[records[0].text],
                 custom_prompt=custom,
-                dictionary_entries=entries,
+                dictionary_section=section,
+                json_output=False,
             )
 
     def test_system_message_contains_target_lang(self):
         """system message 应包含目标语言。"""
-        records = _make_records(1)
+        records = make_records(1)
         client = MagicMock()
         client.chat.completions.create.return_value = _mock_completion(["翻译"])
 
         _translate_batch(client, "gpt-4o-mini", records, "ja-JP", None, None)
 
-        call_args = client.chat.completions.create.call_args
-        messages = call_args.kwargs.get("messages") or call_args[1].get("messages")
-        system_msg = messages[0]["content"]
-        assert "ja-JP" in system_msg
+        assert "ja-JP" in _system_message(client)
 
 
 # ---------------------------------------------------------------------------
@@ -177,67 +457,48 @@ class TestTranslateBatch:
 class TestTranslateRecords:
     """translate_records 整体流程测试。"""
 
-    @patch("engine.llm_client._get_client")
-    @patch("engine.llm_client._get_model", return_value="gpt-4o-mini")
-    def test_empty_records_returns_empty(self, mock_model, mock_client):
-        """空记录列表直接返回空字典。"""
-        result = translate_records([])
-        assert result == {}
-        mock_client.assert_not_called()
+    def test_empty_records_returns_empty(self, monkeypatch):
+        """空记录列表直接返回空字典，不读取端点配置。"""
+        monkeypatch.setattr("engine.llm_client._get_endpoints", lambda: pytest.fail("不应读取端点"))
+        assert translate_records([]) == {}
 
-    @patch("engine.llm_client._get_client")
-    @patch("engine.llm_client._get_model", return_value="gpt-4o-mini")
-    def test_single_batch(self, mock_model, mock_client):
+    def test_single_batch(self, llm_mocks):
         """记录数 <= batch_size 时只调用一次 LLM。"""
-        records = _make_records(3)
+        records = make_records(3)
         client = MagicMock()
         client.chat.completions.create.return_value = _mock_completion(
             [f"翻译{i}" for i in range(3)]
         )
-        mock_client.return_value = client
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
 
         result = translate_records(records, batch_size=10)
 
         assert len(result) == 3
         assert client.chat.completions.create.call_count == 1
 
-    @patch("engine.llm_client._get_client")
-    @patch("engine.llm_client._get_model", return_value="gpt-4o-mini")
-    def test_multiple_batches(self, mock_model, mock_client):
+    def test_multiple_batches(self, llm_mocks):
         """记录数 > batch_size 时应分多批调用。"""
-        records = _make_records(5)
+        records = make_records(5)
         client = MagicMock()
-        # 第一批 2 条，第二批 2 条，第三批 1 条
-        client.chat.completions.create.side_effect = [
-            _mock_completion(["翻译0", "翻译1"]),
-            _mock_completion(["翻译2", "翻译3"]),
-            _mock_completion(["翻译4"]),
-        ]
-        mock_client.return_value = client
+        # 第一批 2 条，第二批 2 条，第三批 1 条；批次并发执行，按内容而非调用顺序返回响应
+        client.chat.completions.create.side_effect = _batch_dispatcher(_BATCH_RESPONSES)
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
 
         result = translate_records(records, batch_size=2)
 
-        assert len(result) == 5
         assert client.chat.completions.create.call_count == 3
         # 验证所有记录 ID 都有翻译
-        for r in records:
-            assert r.record_id in result
+        assert result.keys() == {r.record_id for r in records}
 
-    @patch("engine.llm_client._get_client")
-    @patch("engine.llm_client._get_model", return_value="gpt-4o-mini")
-    @patch("engine.llm_client.time.sleep")
-    def test_partial_batch_failure(self, mock_sleep, mock_model, mock_client):
+    def test_partial_batch_failure(self, llm_mocks):
         """部分批次失败不影响其他批次。"""
-        records = _make_records(4)
+        records = make_records(4)
         client = MagicMock()
-        # 第一批成功，第二批全部重试失败
-        client.chat.completions.create.side_effect = [
-            _mock_completion(["翻译0", "翻译1"]),
-            Exception("fail"),
-            Exception("fail"),
-            Exception("fail"),
-        ]
-        mock_client.return_value = client
+        # 批次并发执行，按 prompt 内容区分：第一批成功，第二批全部重试失败
+        client.chat.completions.create.side_effect = _batch_dispatcher(
+            {"Text 0": _BATCH_RESPONSES["Text 0"]},
+        )
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
 
         result = translate_records(records, batch_size=2)
 
@@ -245,33 +506,128 @@ class TestTranslateRecords:
         assert len(result) == 2
         assert records[0].record_id in result
         assert records[1].record_id in result
+        assert client.chat.completions.create.call_count == 1 + MAX_RETRIES
+
+    def test_batches_run_concurrently(self, llm_mocks):
+        """多个批次应同时在途，而非逐批串行等待。"""
+        records = make_records(3)
+        barrier = threading.Barrier(3, timeout=5)
+        client = MagicMock()
+
+        def _dispatch(**kwargs):
+            barrier.wait()
+            return _mock_completion(["[1] 翻译"])
+
+        client.chat.completions.create.side_effect = _dispatch
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
+
+        result = translate_records(records, batch_size=1)
+
+        assert len(result) == 3
+
+    def test_callback_error_cancels_pending_batches(self, llm_mocks, monkeypatch):
+        """回调抛出异常时应向上抛出，并取消尚未开始的批次。"""
+        monkeypatch.setenv("LLM_MAX_CONCURRENCY", "1")
+        records = make_records(5)
+        gate = threading.Event()
+        client = MagicMock()
+
+        def _dispatch(**kwargs):
+            # 第一批立即返回，之后的批次等待放行，保证回调出错时仍有排队中的批次
+            if client.chat.completions.create.call_count > 1:
+                gate.wait(timeout=5)
+            return _mock_completion(["[1] 翻译"])
+
+        client.chat.completions.create.side_effect = _dispatch
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
+
+        class _GateReleasingExecutor(ThreadPoolExecutor):
+            """先取消排队中的批次再放行 gate，停在 gate 上的第二批不会拖住线程池退出。"""
+
+            def shutdown(self, wait=True, *, cancel_futures=False):
+                super().shutdown(wait=False, cancel_futures=cancel_futures)
+                gate.set()
+                super().shutdown(wait=wait)
+
+        monkeypatch.setattr("engine.llm_client.ThreadPoolExecutor", _GateReleasingExecutor)
+
+        def _fail(result, batch):
+            raise RuntimeError("callback failed")
 
-    @patch("engine.llm_client._get_client")
-    @patch("engine.llm_client._get_model", return_value="gpt-4o-mini")
-    def test_default_target_lang(self, mock_model, mock_client):
+        with pytest.raises(RuntimeError):
+            translate_records(records, batch_size=1, on_batch_translated=_fail)
+
+        assert client.chat.completions.create.call_count <= 2
+
+    def test_batches_round_robin_across_endpoints(self, llm_mocks):
+        """配置多个端点时各批次应轮询分配，并在调用前取得对应端点的令牌。"""
+        records = make_records(4)
+        clients = [MagicMock(), MagicMock()]
+        limiters = [MagicMock(), MagicMock()]
+        for client in clients:
+            client.chat.completions.create.return_value = _mock_completion(["[1] 翻译"])
+        llm_mocks.endpoints.return_value = [_Endpoint(c, l) for c, l in zip(clients, limiters)]
+
+        result = translate_records(records, batch_size=1)
+
+        assert len(result) == 4
+        assert [c.chat.completions.create.call_count for c in clients] == [2, 2]
+        assert [l.acquire.call_count for l in limiters] == [2, 2]
+
+    def test_dictionary_section_built_once(self, llm_mocks):
+        """多批次翻译时词典约束段只构建一次，且每批 Prompt 都包含词典。"""
+        records = make_records(3)
+        client = MagicMock()
+        client.chat.completions.create.return_value = _mock_completion(["[1] 翻译"])
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
+        entries = [{"sourceText": "Sword", "targetText": "剑"}]
+
+        with patch(
+            "engine.llm_client.build_dictionary_section", wraps=build_dictionary_section,
+        ) as mock_section:
+            translate_records(records, batch_size=1, dictionary_entries=entries)
+
+        mock_section.assert_called_once_with(entries)
+        for call in client.chat.completions.create.call_args_list:
+            assert "Sword → 剑" in call.kwargs["messages"][1]["content"]
+
+    def test_default_target_lang(self, llm_mocks):
         """默认目标语言应为 zh-CN。"""
-        records = _make_records(1)
+        records = make_records(1)
         client = MagicMock()
         client.chat.completions.create.return_value = _mock_completion(["翻译"])
-        mock_client.return_value = client
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
 
         translate_records(records)
 
-        call_args = client.chat.completions.create.call_args
-        messages = call_args.kwargs.get("messages") or call_args[1].get("messages")
-        system_msg = messages[0]["content"]
-        assert "zh-CN" in system_msg
+        assert "zh-CN" in _system_message(client)
 
-    @patch("engine.llm_client._get_client")
-    @patch("engine.llm_client._get_model", return_value="test-model")
-    def test_uses_configured_model(self, mock_model, mock_client):
+    def test_uses_configured_model(self, llm_mocks):
         """应使用环境变量配置的模型名称。"""
-        records = _make_records(1)
+        llm_mocks.model.return_value = "test-model"
+        records = make_records(1)
         client = MagicMock()
         client.chat.completions.create.return_value = _mock_completion(["翻译"])
-        mock_client.return_value = client
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
 
         translate_records(records)
 
-        call_args = client.chat.completions.create.call_args
-        assert call_args.kwargs.get("model") == "test-model" or call_args[1].get("model") == "test-model"
+        assert client.chat.completions.create.call_args.kwargs["model"] == "test-model"
+
+    def test_local_cache_skips_translated_records(self, llm_mocks, tmp_path, monkeypatch):
+        """启用本地缓存后，再次翻译相同记录不应调用 LLM，且仍触发回调。"""
+        monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+        records = make_records(2)
+        client = MagicMock()
+        client.chat.completions.create.return_value = _mock_completion(["[1] 翻译0", "[2] 翻译1"])
+        llm_mocks.endpoints.return_value = [_Endpoint(client)]
+
+        first = translate_records(records)
+        translated_batches = []
+        second = translate_records(
+            records, on_batch_translated=lambda result, batch: translated_batches.append(result),
+        )
+
+        assert client.chat.completions.create.call_count == 1
+        assert second == first == {records[0].record_id: "翻译0", records[1].record_id: "翻译1"}
+        assert translated_batches == [second]
@@ -1,21 +1,24 @@
 """PromptBuilder 单元测试。"""
 
+import re
+
 import pytest
 
-from engine.prompt_builder import DEFAULT_PROMPT, build_prompt
+from engine.prompt_builder import (
+    DEFAULT_PROMPT,
+    JSON_OUTPUT_INSTRUCTION,
+    build_dictionary_section,
+    build_prompt,
+)
 
 
 class TestBuildPromptDefaultPrompt:
     """无自定义 Prompt 时使用默认模板。"""
 
-    def test_uses_default_prompt_when_custom_is_none(self):
-        """custom_prompt 为 None 时应使用默认模板。"""
-        result = build_prompt(texts_to_translate=["Hello world"])
-        assert DEFAULT_PROMPT in result
-
-    def test_uses_default_prompt_when_custom_is_empty(self):
-        """custom_prompt 为空字符串时应使用默认模板。"""
-        result = build_prompt(texts_to_translate=["Hello world"], custom_prompt="")
+    @pytest.mark.parametrize("custom_prompt", [None, ""])
+    def test_uses_default_prompt_when_custom_is_unset(self, custom_prompt):
+        """custom_prompt 为 None 或空字符串时应使用默认模板。"""
+        result = build_prompt(texts_to_translate=["Hello world"], custom_prompt=custom_prompt)
         assert DEFAULT_PROMPT in result
 
 
@@ -39,44 +42,62 @@ class TestBuildPromptCustomPrompt:
 class TestBuildPromptDictionary:
     """词典约束段测试。"""
 
-    def test_includes_dictionary_entries(self):
-        """词典非空时应追加词条约束。"""
-        entries = [
-            {"sourceText": "Dragonborn", "targetText": "龙裔"},
-            {"sourceText": "Stormcloak", "targetText": "风暴斗篷"},
-        ]
-        result = build_prompt(texts_to_translate=["Hello"], dictionary_entries=entries)
-        assert "以下词条必须保持指定翻译：" in result
-        assert "Dragonborn → 龙裔" in result
-        assert "Stormcloak → 风暴斗篷" in result
-
-    def test_no_dictionary_section_when_empty(self):
-        """词典为空列表时不应追加词典段。"""
-        result = build_prompt(texts_to_translate=["Hello"], dictionary_entries=[])
-        assert "以下词条必须保持指定翻译：" not in result
-
-    def test_no_dictionary_section_when_none(self):
-        """词典为 None 时不应追加词典段。"""
-        result = build_prompt(texts_to_translate=["Hello"], dictionary_entries=None)
-        assert "以下词条必须保持指定翻译：" not in result
-
-    def test_skips_entries_with_empty_source(self):
-        """sourceText 为空的词条应被跳过。"""
-        entries = [
-            {"sourceText": "", "targetText": "龙裔"},
-            {"sourceText": "Stormcloak", "targetText": "风暴斗篷"},
-        ]
+    @pytest.mark.parametrize(
+        "entries,must_contain,must_not_contain",
+        [
+            # 词典非空时应追加词条约束
+            pytest.param(
+                [
+                    {"sourceText": "Dragonborn", "targetText": "龙裔"},
+                    {"sourceText": "Stormcloak", "targetText": "风暴斗篷"},
+                ],
+                ["以下词条必须保持指定翻译：", "Dragonborn → 龙裔", "Stormcloak → 风暴斗篷"],
+                [],
+                id="entries",
+            ),
+            # 词典为空列表或 None 时不应追加词典段
+            pytest.param([], [], ["以下词条必须保持指定翻译："], id="empty"),
+            pytest.param(None, [], ["以下词条必须保持指定翻译："], id="none"),
+            # sourceText 为空的词条应被跳过
+            pytest.param(
+                [
+                    {"sourceText": "", "targetText": "龙裔"},
+                    {"sourceText": "Stormcloak", "targetText": "风暴斗篷"},
+                ],
+                ["Stormcloak → 风暴斗篷"],
+                ["→ 龙裔"],
+                id="empty_source_skipped",
+            ),
+            # targetText 为空的词条应被跳过
+            pytest.param([{"sourceText": "Dragonborn", "targetText": ""}], [], ["Dragonborn →"], id="empty_target_skipped"),
+        ],
+    )
+    def test_dictionary_section(self, entries, must_contain, must_not_contain):
+        """词典段只包含源文与译文均非空的词条，无有效词条时不追加。"""
         result = build_prompt(texts_to_translate=["Hello"], dictionary_entries=entries)
-        assert "龙裔" not in result.split("待翻译文本")[0] or "→ 龙裔" not in result
-        assert "Stormcloak → 风暴斗篷" in result
-
-    def test_skips_entries_with_empty_target(self):
-        """targetText 为空的词条应被跳过。"""
-        entries = [
-            {"sourceText": "Dragonborn", "targetText": ""},
-        ]
-        result = build_prompt(texts_to_translate=["Hello"], dictionary_entries=entries)
-        assert "Dragonborn →" not in result
+        for text in must_contain:
+            assert text in result
+        for text in must_not_contain:
+            assert text not in result
+
+
+class TestBuildDictionarySection:
+    """预构建词典约束段测试。"""
+
+    def test_returns_none_without_valid_entries(self):
+        """无词条或词条均无效时返回 None。"""
+        assert build_dictionary_section(None) is None
+        assert build_dictionary_section([]) is None
+        assert build_dictionary_section([{"sourceText": "A", "targetText": ""}]) is None
+
+    def test_prebuilt_section_matches_entries(self):
+        """传入预构建词典段与直接传入词条生成的 Prompt 一致。"""
+        entries = [{"sourceText": "Dragonborn", "targetText": "龙裔"}]
+        section = build_dictionary_section(entries)
+
+        assert build_prompt(["Hello"], dictionary_section=section) == build_prompt(
+            ["Hello"], dictionary_entries=entries,
+        )
 
 
 class TestBuildPromptTexts:
@@ -91,10 +112,10 @@ class TestBuildPromptTexts:
         assert "Steel Shield" in result
 
     def test_texts_joined_by_newline(self):
-        """多条待翻译文本应以换行分隔。"""
+        """多条待翻译文本应按 [编号] 格式以换行分隔。"""
         texts = ["Line1", "Line2", "Line3"]
         result = build_prompt(texts_to_translate=texts)
-        assert "Line1\nLine2\nLine3" in result
+        assert result.endswith("[1] Line1\n[2] Line2\n[3] Line3")
 
     def test_empty_texts_list(self):
         """空文本列表应仍然包含文本段头部。"""
@@ -117,11 +138,14 @@ class TestBuildPromptAssemblyOrder:
             dictionary_entries=entries,
         )
 
-        idx_custom = result.index(custom)
-        idx_dict = result.index("以下词条必须保持指定翻译：")
-        idx_text = result.index("待翻译文本：")
+        markers = (custom, "以下词条必须保持指定翻译：", "待翻译文本：")
+        pattern = re.compile("|".join(map(re.escape, markers)))
+        # 一次扫描记录各标记首次出现的位置
+        positions: dict[str, int] = {}
+        for m in pattern.finditer(result):
+            positions.setdefault(m.group(), m.start())
 
-        assert idx_custom < idx_dict < idx_text
+        assert positions[custom] < positions["以下词条必须保持指定翻译："] < positions["待翻译文本："]
 
     def test_order_base_text_without_dict(self):
         """无词典时顺序应为：基础指令 → 待翻译文本。"""
@@ -131,3 +155,10 @@ class TestBuildPromptAssemblyOrder:
         idx_text = result.index("待翻译文本：")
 
         assert idx_default < idx_text
+
+    def test_json_output_instruction_before_texts(self):
+        """JSON 输出模式时格式要求位于待翻译文本之前，默认不包含。"""
+        result = build_prompt(texts_to_translate=["Hello"], json_output=True)
+
+        assert result.index(JSON_OUTPUT_INSTRUCTION) < result.index("待翻译文本：")
+        assert JSON_OUTPUT_INSTRUCTION not in build_prompt(texts_to_translate=["Hello"])
@@ -0,0 +1,61 @@
+"""本地 LLM 译文缓存单元测试。"""
+
+from __future__ import annotations
+
+import pytest
+
+from engine import translation_cache
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    """启用指向临时目录的缓存数据库。"""
+    path = tmp_path / "llm_cache.sqlite3"
+    monkeypatch.setenv("LLM_CACHE_PATH", str(path))
+    return path
+
+
+class TestTranslationCache:
+    """translation_cache 读写测试。"""
+
+    def test_disabled_without_env(self, monkeypatch):
+        """未配置 LLM_CACHE_PATH 时缓存不启用，读写均为空操作。"""
+        monkeypatch.delenv("LLM_CACHE_PATH", raising=False)
+        assert not translation_cache.is_enabled()
+        translation_cache.store([("k", "m", "zh-CN", "译文")])
+        assert translation_cache.lookup(["k"]) == {}
+
+    def test_store_then_lookup(self, cache_path):
+        """写入后可按键命中，未写入的键不返回。"""
+        translation_cache.store([
+            ("k1", "m", "zh-CN", "译文一"),
+            ("k2", "m", "zh-CN", "译文二"),
+        ])
+
+        assert translation_cache.lookup(["k1", "k2", "k3"]) == {"k1": "译文一", "k2": "译文二"}
+        assert cache_path.exists()
+
+    def test_lookup_splits_large_key_sets(self, cache_path, monkeypatch):
+        """键数量超过单条查询上限时应分片查询。"""
+        monkeypatch.setattr(translation_cache, "LOOKUP_CHUNK_SIZE", 2)
+        rows = [(f"k{i}", "m", "zh-CN", f"译文{i}") for i in range(5)]
+        translation_cache.store(rows)
+
+        result = translation_cache.lookup(f"k{i}" for i in range(5))
+
+        assert result == {f"k{i}": f"译文{i}" for i in range(5)}
+
+    def test_context_changes_key(self):
+        """模型、语言、Prompt 或词典不同时缓存键不同。"""
+        base = translation_cache.build_context_hash("m", "zh-CN", None, None)
+        variants = [
+            translation_cache.build_context_hash("m2", "zh-CN", None, None),
+            translation_cache.build_context_hash("m", "ja", None, None),
+            translation_cache.build_context_hash("m", "zh-CN", "prompt", None),
+            translation_cache.build_context_hash("m", "zh-CN", None, [{"source": "a", "target": "甲"}]),
+        ]
+
+        keys = {translation_cache.make_key("Text", h) for h in [base, *variants]}
+
+        assert len(keys) == 5
+        assert translation_cache.make_key("Text", base) == translation_cache.make_key("Text", base)
@@ -2,9 +2,10 @@
 
 from __future__ import annotations
 
-import time
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
+import orjson
 import pytest
 
 from engine.esm_parser import StringRecord
@@ -17,167 +18,616 @@ from engine.translator import (
     STATUS_TRANSLATING,
     STATUS_WAITING,
     Translator,
+    _build_output_paths,
+    _TaskLogger,
 )
+from tests.esm_test_helpers import make_records
+
+# 本文件的测试都会启动真实线程池，并行执行时整体分配到同一个 worker，避免与其他文件争抢 CPU
+pytestmark = pytest.mark.xdist_group("translator")
+
+
+@pytest.fixture
+def translator_mocks(monkeypatch) -> SimpleNamespace:
+    """替换调度器依赖的解析、翻译、重组与缓存函数，返回对应的 mock。"""
+    mocks = SimpleNamespace(
+        parse=MagicMock(),
+        translate=MagicMock(),
+        write=MagicMock(return_value=WriteResult(backup_path="/tmp/b.esm", output_path="/tmp/o.esm")),
+        query_cache=MagicMock(return_value={}),
+        save_cache=MagicMock(),
+    )
+    monkeypatch.setattr("engine.translator.parse_esm", mocks.parse)
+    monkeypatch.setattr("engine.translator.translate_records", mocks.translate)
+    monkeypatch.setattr("engine.translator.write_esm", mocks.write)
+    monkeypatch.setattr("engine.translator.query_cache", mocks.query_cache)
+    monkeypatch.setattr("engine.translator.save_cache", mocks.save_cache)
+    return mocks
+
+
+@pytest.fixture
+def make_translator():
+    """创建 Translator 的工厂，用例结束后逐个关闭，回收线程池与上报线程。"""
+    created: list[Translator] = []
+
+    def _make() -> Translator:
+        t = Translator()
+        created.append(t)
+        return t
+
+    yield _make
+    for t in created:
+        t.shutdown(wait=True)
+
+
+@pytest.fixture(scope="class")
+def translator():
+    """同一测试类共享的 Translator，各用例使用互不相同的 task_id。"""
+    t = Translator()
+    yield t
+    t.shutdown(wait=True)
 
 
-def _make_records(n: int) -> list[StringRecord]:
-    """生成 n 条测试用 StringRecord。"""
-    return [
-        StringRecord(record_id=f"NPC_:{i:08X}:FULL", text=f"Text {i}")
-        for i in range(n)
-    ]
+def _wait_for_task(t: Translator, task_id: str) -> None:
+    """等待任务的翻译与重组阶段执行完毕，不关闭线程池。"""
+    # 翻译阶段在结束前即提交重组 Future 并替换记录，因此依次等待直到没有在途 Future
+    while (future := t._futures.get(task_id)) is not None:
+        future.result(timeout=5)
 
 
 class TestTranslatorTaskLifecycle:
     """任务生命周期与状态转换测试。"""
 
-    def test_get_task_returns_none_for_unknown_id(self):
+    def test_get_task_returns_none_for_unknown_id(self, translator):
         """查询不存在的任务应返回 None。"""
-        t = Translator()
-        assert t.get_task("nonexistent") is None
-
-    def test_submit_task_returns_accepted(self):
+        assert translator.get_task("nonexistent") is None
+
+    def test_get_task_returns_independent_snapshot(self, make_translator):
+        """get_task 返回的字典不随后续状态更新变化，且保持接口字段格式。"""
+        t = make_translator()
+        t._tasks["t"] = t._new_task("t", "http://cb")
+
+        before = t.get_task("t")
+        t._update_progress("t", 3, 10)
+        t._update_status("t", STATUS_TRANSLATING)
+
+        assert before == {
+            "taskId": "t",
+            "status": STATUS_WAITING,
+            "progress": {"translated": 0, "total": 0},
+            "outputFilePath": None,
+            "originalBackupPath": None,
+            "error": None,
+            "callbackUrl": "http://cb",
+        }
+        after = t.get_task("t")
+        assert after["status"] == STATUS_TRANSLATING
+        assert after["progress"] == {"translated": 3, "total": 10}
+
+    def test_finished_tasks_evicted_beyond_limit(self, monkeypatch, make_translator):
+        """任务数超出 SF_TASK_MAX 时按结束顺序淘汰已结束任务，进行中的任务保留。"""
+        monkeypatch.setenv("SF_TASK_MAX", "2")
+        t = make_translator()
+        for tid in ("running", "a", "b"):
+            t._tasks[tid] = t._new_task(tid)
+        t._update_status("running", STATUS_TRANSLATING)
+
+        t._update_status("a", STATUS_COMPLETED)
+        t._set_error("b", "boom")
+
+        assert t.get_task("a") is None
+        assert t.get_task("b")["status"] == STATUS_FAILED
+        assert t.get_task("running")["status"] == STATUS_TRANSLATING
+
+    def test_submit_task_returns_accepted(self, translator):
         """提交任务应返回 accepted 状态。"""
-        t = Translator()
         with patch("engine.translator.parse_esm", return_value=[]):
-            result = t.submit_task("task-1", "/tmp/test.esm")
+            result = translator.submit_task("accepted", "/tmp/test.esm")
+            _wait_for_task(translator, "accepted")
+
+        assert result == {"taskId": "accepted", "status": "accepted"}
+
+    def test_submit_task_does_not_block_on_task_work(self, translator):
+        """submit_task 应在后台执行任务，解析阻塞时也能立即返回且任务可查询。"""
+        import threading
+
+        release = threading.Event()
+
+        def blocking_parse(_path):
+            release.wait(timeout=5)
+            return []
+
+        with patch("engine.translator.parse_esm", side_effect=blocking_parse):
+            result = translator.submit_task("non-blocking", "/tmp/test.esm")
+            task = translator.get_task("non-blocking")
+            release.set()
+            _wait_for_task(translator, "non-blocking")
+
+        assert result == {"taskId": "non-blocking", "status": "accepted"}
+        assert task is not None
+        assert task["status"] in {STATUS_WAITING, STATUS_PARSING}
+
+    def test_tasks_beyond_worker_limit_wait_in_queue(self, monkeypatch, make_translator):
+        """超出 SF_WORKERS 的任务应以 waiting 状态排队，前序任务结束后再执行。"""
+        import threading
 
-        assert result == {"taskId": "task-1", "status": "accepted"}
+        monkeypatch.setenv("SF_WORKERS", "1")
+        release = threading.Event()
 
-    def test_task_initial_status_is_waiting_or_progressed(self):
+        def blocking_parse(_path):
+            release.wait(timeout=5)
+            return []
+
+        t = make_translator()
+        with patch("engine.translator.parse_esm", side_effect=blocking_parse):
+            t.submit_task("task-1", "/tmp/a.esm")
+            t.submit_task("task-2", "/tmp/b.esm")
+            assert t.get_task("task-2")["status"] == STATUS_WAITING
+
+            release.set()
+            t.shutdown(wait=True)
+
+        assert t.get_task("task-1")["status"] == STATUS_COMPLETED
+        assert t.get_task("task-2")["status"] == STATUS_COMPLETED
+
+    def test_task_initial_status_is_waiting_or_progressed(self, translator):
         """提交后任务状态应为 waiting 或已开始处理。"""
-        t = Translator()
         with patch("engine.translator.parse_esm", return_value=[]):
-            t.submit_task("task-1", "/tmp/test.esm")
+            translator.submit_task("initial-status", "/tmp/test.esm")
+            task = translator.get_task("initial-status")
+            _wait_for_task(translator, "initial-status")
 
-        task = t.get_task("task-1")
         assert task is not None
         assert task["status"] in {STATUS_WAITING, STATUS_PARSING, STATUS_COMPLETED}
 
-    @patch("engine.translator.save_cache")
-    @patch("engine.translator.query_cache", return_value={})
-    @patch("engine.translator.write_esm")
-    @patch("engine.translator.translate_records")
-    @patch("engine.translator.parse_esm")
-    def test_completed_task_has_output_paths(self, mock_parse, mock_translate, mock_write, mock_qc, mock_sc):
+    def test_completed_task_has_output_paths(self, translator, translator_mocks):
         """完成的任务应包含输出文件路径和备份路径。"""
-        records = _make_records(2)
-        mock_parse.return_value = records
-        mock_translate.return_value = {r.record_id: f"翻译{i}" for i, r in enumerate(records)}
-        mock_write.return_value = WriteResult(backup_path="/tmp/backup.esm", output_path="/tmp/out.esm")
-
-        t = Translator()
-        t.submit_task("task-1", "/tmp/test.esm")
+        records = make_records(2)
+        translator_mocks.parse.return_value = records
+        translator_mocks.translate.return_value = {r.record_id: f"翻译{i}" for i, r in enumerate(records)}
+        translator_mocks.write.return_value = WriteResult(backup_path="/tmp/backup.esm", output_path="/tmp/out.esm")
 
-        # 等待异步任务完成
-        for _ in range(50):
-            task = t.get_task("task-1")
-            if task and task["status"] == STATUS_COMPLETED:
-                break
-            time.sleep(0.05)
+        translator.submit_task("completed", "/tmp/test.esm")
+        _wait_for_task(translator, "completed")
 
-        task = t.get_task("task-1")
+        task = translator.get_task("completed")
         assert task["status"] == STATUS_COMPLETED
         assert task["outputFilePath"] == "/tmp/out.esm"
         assert task["originalBackupPath"] == "/tmp/backup.esm"
 
     @patch("engine.translator.parse_esm")
-    def test_failed_task_has_error_message(self, mock_parse):
+    def test_failed_task_has_error_message(self, mock_parse, translator):
         """失败的任务应包含错误信息。"""
         mock_parse.side_effect = Exception("parse error")
 
-        t = Translator()
-        t.submit_task("task-1", "/tmp/test.esm")
-
-        for _ in range(50):
-            task = t.get_task("task-1")
-            if task and task["status"] == STATUS_FAILED:
-                break
-            time.sleep(0.05)
+        translator.submit_task("failed", "/tmp/test.esm")
+        _wait_for_task(translator, "failed")
 
-        task = t.get_task("task-1")
+        task = translator.get_task("failed")
         assert task["status"] == STATUS_FAILED
         assert "parse error" in task["error"]
 
     @patch("engine.translator.parse_esm")
-    def test_empty_records_completes_immediately(self, mock_parse):
+    def test_empty_records_completes_immediately(self, mock_parse, translator):
         """无可翻译记录时任务应直接完成。"""
         mock_parse.return_value = []
 
-        t = Translator()
-        t.submit_task("task-1", "/tmp/test.esm")
-
-        for _ in range(50):
-            task = t.get_task("task-1")
-            if task and task["status"] == STATUS_COMPLETED:
-                break
-            time.sleep(0.05)
+        translator.submit_task("empty", "/tmp/test.esm")
+        _wait_for_task(translator, "empty")
 
-        task = t.get_task("task-1")
+        task = translator.get_task("empty")
         assert task["status"] == STATUS_COMPLETED
         assert task["progress"]["total"] == 0
 
 
+class TestBuildOutputPaths:
+    """输出 / 备份路径生成测试。"""
+
+    def test_paths_keep_extension(self):
+        """保留原扩展名，仅以最后一个点拆分。"""
+        assert _build_output_paths("/data/my.mod.esm") == (
+            "/data/my.mod_translated.esm",
+            "/data/my.mod_backup.esm",
+        )
+
+    def test_paths_without_extension(self):
+        """无扩展名或目录名含点时不抛异常，直接追加后缀。"""
+        assert _build_output_paths("/data.v1/plugin") == (
+            "/data.v1/plugin_translated",
+            "/data.v1/plugin_backup",
+        )
+
+
+class TestTaskLogger:
+    """任务日志适配器测试。"""
+
+    def test_appends_task_id(self, caplog):
+        """日志末尾追加 task_id，原有格式参数照常格式化，task_id 中的 % 不参与格式化。"""
+        import logging
+
+        log = _TaskLogger(logging.getLogger("engine.translator"), "t%1")
+        with caplog.at_level(logging.INFO, logger="engine.translator"):
+            log.info("[_run_task] 缓存查询完成 cached %d total %d", 1, 2)
+            log.info("[_run_task] 开始解析")
+
+        assert caplog.messages == [
+            "[_run_task] 缓存查询完成 cached 1 total 2 task_id t%1",
+            "[_run_task] 开始解析 task_id t%1",
+        ]
+
+    def test_records_caller_location(self, caplog):
+        """日志记录的函数名与行号指向调用处，而不是适配器内部。"""
+        import logging
+
+        log = _TaskLogger(logging.getLogger("engine.translator"), "t")
+        with caplog.at_level(logging.INFO, logger="engine.translator"):
+            log.info("[_run_task] 开始解析")
+            log.log(logging.INFO, "[_run_task] 开始翻译")
+
+        assert [r.funcName for r in caplog.records] == ["test_records_caller_location"] * 2
+        assert all(r.pathname == __file__ for r in caplog.records)
+
+
 class TestTranslatorProgress:
     """进度更新测试。"""
 
-    @patch("engine.translator.save_cache")
-    @patch("engine.translator.query_cache", return_value={})
-    @patch("engine.translator.write_esm")
-    @patch("engine.translator.translate_records")
-    @patch("engine.translator.parse_esm")
-    def test_progress_reflects_translation_count(self, mock_parse, mock_translate, mock_write, mock_qc, mock_sc):
+    def test_progress_reflects_translation_count(self, translator_mocks, make_translator):
         """进度应反映已翻译记录数和总数。"""
-        records = _make_records(5)
-        mock_parse.return_value = records
-        mock_translate.return_value = {r.record_id: f"翻译{i}" for i, r in enumerate(records)}
-        mock_write.return_value = WriteResult(backup_path="/tmp/b.esm", output_path="/tmp/o.esm")
+        records = make_records(5)
+        translator_mocks.parse.return_value = records
+        translator_mocks.translate.return_value = {r.record_id: f"翻译{i}" for i, r in enumerate(records)}
 
-        t = Translator()
+        t = make_translator()
         t.submit_task("task-1", "/tmp/test.esm")
 
-        for _ in range(50):
-            task = t.get_task("task-1")
-            if task and task["status"] == STATUS_COMPLETED:
-                break
-            time.sleep(0.05)
+        t.shutdown(wait=True)
 
         task = t.get_task("task-1")
-        assert task["progress"]["total"] == 5
-        assert task["progress"]["translated"] == 5
+        assert task["progress"] == {"translated": 5, "total": 5}
 
 
 class TestTranslatorParameterPassing:
     """参数传递测试。"""
 
-    @patch("engine.translator.save_cache")
-    @patch("engine.translator.query_cache", return_value={})
-    @patch("engine.translator.write_esm")
-    @patch("engine.translator.translate_records")
-    @patch("engine.translator.parse_esm")
-    def test_passes_custom_prompt_and_dictionary(self, mock_parse, mock_translate, mock_write, mock_qc, mock_sc):
+    def test_passes_custom_prompt_and_dictionary(self, translator_mocks, make_translator):
         """应将 customPrompt 和 dictionaryEntries 传递给 translate_records。"""
-        records = _make_records(1)
-        mock_parse.return_value = records
-        mock_translate.return_value = {records[0].record_id: "翻译"}
-        mock_write.return_value = WriteResult(backup_path="/tmp/b.esm", output_path="/tmp/o.esm")
+        records = make_records(1)
+        translator_mocks.parse.return_value = records
+        translator_mocks.translate.return_value = {records[0].record_id: "翻译"}
 
         custom = "自定义指令"
         entries = [{"sourceText": "Sword", "targetText": "剑"}]
 
-        t = Translator()
+        t = make_translator()
         t.submit_task("task-1", "/tmp/test.esm", target_lang="ja-JP", custom_prompt=custom, dictionary_entries=entries)
 
-        for _ in range(50):
-            task = t.get_task("task-1")
-            if task and task["status"] == STATUS_COMPLETED:
-                break
-            time.sleep(0.05)
+        t.shutdown(wait=True)
 
-        mock_translate.assert_called_once()
-        call_kwargs = mock_translate.call_args.kwargs
+        translator_mocks.translate.assert_called_once()
+        call_kwargs = translator_mocks.translate.call_args.kwargs
         assert call_kwargs["records"] == records
         assert call_kwargs["target_lang"] == "ja-JP"
         assert call_kwargs["custom_prompt"] == custom
         assert call_kwargs["dictionary_entries"] == entries
         assert callable(call_kwargs["on_batch_done"])
+
+
+class TestTranslatorCacheSaving:
+    """批次翻译结果写入缓存测试。"""
+
+    def test_batch_results_saved_with_task_record_lookup(self, translator_mocks, make_translator):
+        """每批翻译结果应连同任务级 record_id 映射一起保存到缓存。"""
+        records = make_records(3)
+        translator_mocks.parse.return_value = records
+
+        def fake_translate(records, on_batch_translated=None, **kwargs):
+            result = {r.record_id: f"翻译{i}" for i, r in enumerate(records)}
+            on_batch_translated(result, records)
+            return result
+
+        translator_mocks.translate.side_effect = fake_translate
+
+        t = make_translator()
+        t.submit_task("task-1", "/tmp/test.esm")
+
+        t.shutdown(wait=True)
+
+        translator_mocks.save_cache.assert_called_once()
+        batch_result, record_lookup, target_lang, task_id = translator_mocks.save_cache.call_args.args
+        assert batch_result == {r.record_id: f"翻译{i}" for i, r in enumerate(records)}
+        assert record_lookup == {r.record_id: r for r in records}
+        assert (target_lang, task_id) == ("zh-CN", "task-1")
+
+    def test_batch_results_accumulated_before_saving(self, translator_mocks, monkeypatch, make_translator):
+        """多个批次的译文累积到阈值后合并保存，剩余部分在翻译结束后保存。"""
+        monkeypatch.setattr("engine.translator.CACHE_FLUSH_SIZE", 4)
+        records = make_records(5)
+        translator_mocks.parse.return_value = records
+
+        def fake_translate(records, on_batch_translated=None, **kwargs):
+            result = {}
+            for i in range(0, len(records), 2):
+                batch = records[i : i + 2]
+                batch_result = {r.record_id: "译文" for r in batch}
+                on_batch_translated(batch_result, batch)
+                result.update(batch_result)
+            return result
+
+        translator_mocks.translate.side_effect = fake_translate
+
+        t = make_translator()
+        t._tasks["t"] = t._new_task("t")
+        t._run_task("t", "/tmp/test.esm", "zh-CN", None, None)
+
+        saved = [len(c.args[0]) for c in translator_mocks.save_cache.call_args_list]
+        assert saved == [4, 1]
+
+    @patch("engine.translator.save_cache")
+    @patch("engine.translator.write_esm")
+    @patch("engine.translator.translate_records", side_effect=RuntimeError("LLM 不应被调用"))
+    @patch("engine.translator.parse_esm")
+    def test_fully_cached_file_skips_llm(self, mock_parse, mock_translate, mock_write, mock_sc, make_translator):
+        """全部命中缓存时不调用 LLM，任务使用缓存译文完成重组。"""
+        records = make_records(3)
+        mock_parse.return_value = records
+        cached = {r.record_id: f"缓存{i}" for i, r in enumerate(records)}
+        mock_write.return_value = WriteResult(backup_path="/tmp/b.esm", output_path="/tmp/o.esm")
+
+        t = make_translator()
+        with patch("engine.translator.query_cache", return_value=cached):
+            t.submit_task("task-1", "/tmp/test.esm")
+            t.shutdown(wait=True)
+
+        assert t.get_task("task-1")["status"] == STATUS_COMPLETED
+        mock_translate.assert_not_called()
+        assert mock_write.call_args.kwargs["translations"] == cached
+
+
+class TestTranslatorDedup:
+    """未命中缓存词条的去重测试。"""
+
+    def test_same_subrecord_and_text_translated_once(self, translator_mocks, make_translator):
+        """子记录类型（忽略 #N 后缀）和原文相同的词条只翻译一次，结果展开到所有记录。"""
+        records = [
+            StringRecord(record_id="NPC_:00000001:FULL", text="Yes"),
+            StringRecord(record_id="WEAP:00000002:FULL#1", text="Yes"),
+            StringRecord(record_id="NPC_:00000003:DESC", text="Yes"),
+        ]
+        translator_mocks.parse.return_value = records
+        translated_batches = []
+
+        def fake_translate(records, on_batch_translated=None, **kwargs):
+            translated_batches.append([r.record_id for r in records])
+            return {r.record_id: "是" for r in records}
+
+        translator_mocks.translate.side_effect = fake_translate
+
+        t = make_translator()
+        t.submit_task("task-1", "/tmp/test.esm")
+        t.shutdown(wait=True)
+
+        assert translated_batches == [["NPC_:00000001:FULL", "NPC_:00000003:DESC"]]
+        translations = translator_mocks.write.call_args.kwargs["translations"]
+        assert translations == {r.record_id: "是" for r in records}
+
+
+class TestTranslatorProgressReporting:
+    """进度回调后台上报测试。"""
+
+    def test_reports_sent_in_order_through_session(self, translator_mocks, make_translator):
+        """进度上报应经由复用的 Session 按顺序发送，包含每个状态和 items。"""
+        records = make_records(2)
+        translator_mocks.parse.return_value = records
+        translator_mocks.translate.return_value = {r.record_id: f"翻译{i}" for i, r in enumerate(records)}
+
+        t = make_translator()
+        t._session = MagicMock()
+        t.submit_task("task-1", "/tmp/test.esm", callback_url="http://backend/progress")
+
+        # shutdown(wait=True) 等待任务结束并发出全部上报，最终的 completed 上报必然已发出
+        t.shutdown(wait=True)
+        payloads = [orjson.loads(c.kwargs["data"]) for c in t._session.post.call_args_list]
+
+        assert all(c.args[0] == "http://backend/progress" for c in t._session.post.call_args_list)
+        statuses = [p["status"] for p in payloads if "items" not in p]
+        assert statuses[0] == STATUS_PARSING
+        assert statuses[-1] == STATUS_COMPLETED
+        assert STATUS_TRANSLATING in statuses and STATUS_ASSEMBLING in statuses
+        assert any(len(p.get("items", [])) == 2 for p in payloads)
+
+    def test_progress_reports_debounced_per_task(self, make_translator):
+        """合并窗口内同一任务的纯进度上报只发送最后一条，items 上报前先发出等待中的进度。"""
+        url = "http://backend/progress"
+        t = make_translator()
+        t._session = MagicMock()
+        t._tasks["t"] = t._new_task("t", url)
+        t._update_status("t", STATUS_TRANSLATING)
+
+        for i in range(10):
+            t._update_progress("t", i, 20)
+            t._report_progress("t", url)
+        t._report_progress("t", url, items=[{"recordId": "a"}])
+        t._update_progress("t", 15, 20)
+        t._report_progress("t", url)
+        t.flush()
+
+        payloads = [orjson.loads(c.kwargs["data"]) for c in t._session.post.call_args_list]
+        assert [(p["progress"]["translated"], "items" in p) for p in payloads] == [
+            (9, False),
+            (9, True),
+            (15, False),
+        ]
+
+    def test_shutdown_sends_pending_reports_and_stops_reporter(self, make_translator):
+        """shutdown(wait=True) 发出合并窗口中等待的进度上报，上报线程随之退出。"""
+        url = "http://backend/progress"
+        t = make_translator()
+        t._session = MagicMock()
+        t._tasks["t"] = t._new_task("t", url)
+        t._update_status("t", STATUS_TRANSLATING)
+        t._update_progress("t", 5, 20)
+        t._report_progress("t", url)
+
+        t.shutdown(wait=True)
+
+        payloads = [orjson.loads(c.kwargs["data"]) for c in t._session.post.call_args_list]
+        assert [p["progress"]["translated"] for p in payloads] == [5]
+        assert not t._reporter.is_alive()
+
+    def test_status_change_not_merged(self, make_translator):
+        """状态变化时旧状态的上报先发出，终态上报立即发送。"""
+        url = "http://backend/progress"
+        t = make_translator()
+        t._session = MagicMock()
+        t._tasks["t"] = t._new_task("t", url)
+
+        for status in (STATUS_PARSING, STATUS_TRANSLATING, STATUS_ASSEMBLING, STATUS_COMPLETED):
+            t._update_status("t", status)
+            t._report_progress("t", url)
+        t.flush()
+
+        statuses = [orjson.loads(c.kwargs["data"])["status"] for c in t._session.post.call_args_list]
+        assert statuses == [STATUS_PARSING, STATUS_TRANSLATING, STATUS_ASSEMBLING, STATUS_COMPLETED]
+
+    def test_items_streamed_as_ndjson_when_enabled(self, monkeypatch, make_translator):
+        """开启 SF_PROGRESS_NDJSON 后 items 上报按 NDJSON 逐行发送，纯进度上报仍为 JSON。"""
+        monkeypatch.setenv("SF_PROGRESS_NDJSON", "1")
+        url = "http://backend/progress"
+        t = make_translator()
+        t._session = MagicMock()
+        bodies = []
+        t._session.post.side_effect = lambda _url, data, headers, timeout: bodies.append(
+            (headers["Content-Type"], data if isinstance(data, bytes) else b"".join(data))
+        )
+        t._tasks["t"] = t._new_task("t", url)
+
+        t._report_progress("t", url, items=[{"recordId": "a"}, {"recordId": "b"}])
+        t._update_status("t", STATUS_COMPLETED)
+        t._report_progress("t", url, wait=True)
+
+        (items_type, items_body), (status_type, status_body) = bodies
+        assert items_type == "application/x-ndjson"
+        lines = [orjson.loads(line) for line in items_body.splitlines()]
+        assert lines[0]["taskId"] == "t" and "items" not in lines[0]
+        assert lines[1:] == [{"recordId": "a"}, {"recordId": "b"}]
+        assert status_type == "application/json"
+        assert orjson.loads(status_body)["status"] == STATUS_COMPLETED
+
+    @patch("engine.translator.save_cache")
+    @patch("engine.translator.write_esm")
+    @patch("engine.translator.translate_records")
+    @patch("engine.translator.parse_esm")
+    def test_items_not_built_without_callback(self, mock_parse, mock_translate, mock_write, mock_sc, make_translator):
+        """未配置回调地址时不构建 items，缓存保存照常进行。"""
+        records = make_records(4)
+        mock_parse.return_value = records
+        mock_write.return_value = WriteResult(backup_path="/tmp/b.esm", output_path="/tmp/o.esm")
+
+        def fake_translate(records, on_batch_translated=None, **kwargs):
+            result = {r.record_id: "译文" for r in records}
+            on_batch_translated(result, records)
+            return result
+
+        mock_translate.side_effect = fake_translate
+
+        t = make_translator()
+        t._tasks["t"] = t._new_task("t")
+        with patch("engine.translator.query_cache", return_value={records[0].record_id: "缓存"}), \
+                patch.object(t, "_report_progress") as mock_report:
+            t._run_task("t", "/tmp/test.esm", "zh-CN", None, None)
+            # 重组在独立线程池中执行，等待其完成后再检查
+            t._assembly_executor.shutdown(wait=True)
+
+        assert t.get_task("t")["status"] == STATUS_COMPLETED
+        assert all(c.kwargs.get("items") is None for c in mock_report.call_args_list)
+        mock_sc.assert_called_once()
+
+    def test_unchanged_progress_not_reported_again(self, make_translator):
+        """状态和进度未变化时重复的纯进度上报被跳过，带 items 的上报照常发送。"""
+        url = "http://backend/progress"
+        t = make_translator()
+        t._session = MagicMock()
+        t._tasks["t"] = t._new_task("t", url)
+        t._update_status("t", STATUS_TRANSLATING)
+
+        t._report_progress("t", url)
+        t.flush()
+        t._report_progress("t", url)
+        t._report_progress("t", url, items=[{"recordId": "a"}])
+        t._update_status("t", STATUS_COMPLETED)
+        t._report_progress("t", url, wait=True)
+
+        payloads = [orjson.loads(c.kwargs["data"]) for c in t._session.post.call_args_list]
+        assert [(p["status"], "items" in p) for p in payloads] == [
+            (STATUS_TRANSLATING, False),
+            (STATUS_TRANSLATING, True),
+            (STATUS_COMPLETED, False),
+        ]
+
+
+class TestTranslatorAssemblyPool:
+    """重组阶段独立线程池测试。"""
+
+    def test_shutdown_without_wait_lets_running_task_assemble(self, translator_mocks, make_translator):
+        """shutdown(wait=False) 时仍在翻译的任务照常进入重组并完成，不因重组线程池已关闭而失败。"""
+        import threading
+
+        records = make_records(2)
+        translator_mocks.parse.return_value = records
+        translating = threading.Event()
+        release = threading.Event()
+
+        def blocking_translate(records, **kwargs):
+            translating.set()
+            release.wait(timeout=5)
+            return {r.record_id: "译文" for r in records}
+
+        translator_mocks.translate.side_effect = blocking_translate
+
+        t = make_translator()
+        t.submit_task("task-1", "/tmp/test.esm")
+        assert translating.wait(timeout=5)
+        t.shutdown()
+        release.set()
+        t.shutdown(wait=True)
+
+        assert t.get_task("task-1")["status"] == STATUS_COMPLETED
+        translator_mocks.write.assert_called_once()
+
+    @patch("engine.translator.save_cache")
+    @patch("engine.translator.query_cache", return_value={})
+    @patch("engine.translator.translate_records")
+    @patch("engine.translator.parse_esm")
+    def test_next_task_translates_while_previous_assembles(self, mock_parse, mock_translate, mock_qc, mock_sc, monkeypatch, make_translator):
+        """翻译 worker 只有 1 个时，前一个任务重组期间下一个任务仍可开始翻译。"""
+        import threading
+
+        monkeypatch.setenv("SF_WORKERS", "1")
+        records = make_records(1)
+        mock_parse.return_value = records
+        mock_translate.return_value = {records[0].record_id: "译文"}
+        release = threading.Event()
+        both_writing = threading.Event()
+        started = []
+
+        def blocking_write(**kwargs):
+            started.append(kwargs)
+            if len(started) == 2:
+                both_writing.set()
+            release.wait(timeout=5)
+            return WriteResult(backup_path="/tmp/b.esm", output_path="/tmp/o.esm")
+
+        t = make_translator()
+        with patch("engine.translator.write_esm", side_effect=blocking_write):
+            t.submit_task("task-1", "/tmp/a.esm")
+            t.submit_task("task-2", "/tmp/b.esm")
+            # 两个任务同时停在 write_esm 中，说明 task-2 的翻译没有等待 task-1 重组结束
+            assert both_writing.wait(timeout=5)
+
+            assert t.get_task("task-1")["status"] == STATUS_ASSEMBLING
+            assert t.get_task("task-2")["status"] == STATUS_ASSEMBLING
+            release.set()
+            t.shutdown(wait=True)
+
+        assert t.get_task("task-1")["status"] == STATUS_COMPLETED
+        assert t.get_task("task-2")["status"] == STATUS_COMPLETED
@@ -10,55 +10,99 @@
 用法: python -m tools.scan_subrecords <esm_file_path>
 """
 
+import mmap
+import os
 import re
 import struct
 import sys
-import zlib
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+try:
+    # 与 engine.esm_parser 一致：优先使用 ISA-L 的 SIMD DEFLATE 实现，未安装时回退到 zlib
+    from isal import isal_zlib as zlib_impl
+except ImportError:
+    import zlib as zlib_impl
 
 RECORD_HEADER_SIZE = 24
 GRUP_HEADER_SIZE = 24
 COMPRESSED_FLAG = 0x00040000
 SUBRECORD_HEADER_SIZE = 6
 
+# 预编译的子记录头部解析器：type(4 字节) + data_size(uint16)
+_unpack_subrecord_header = struct.Struct("<4sH").unpack_from
+
+# 预编译的 uint32 解析器
+_unpack_u32 = struct.Struct("<I").unpack_from
+
+# 预编译的记录头部解析器：一次调用读取 type + data_size + flags + form_id
+_unpack_record_header = struct.Struct("<4sIII").unpack_from
+
+# b"GRUP" 按小端 uint32 读取后的值，记录类型判断用整数比较代替切片后的字节比较
+GRUP_TYPE_U32 = 0x50555247
+
 KNOWN_TRANSLATABLE = frozenset({b"FULL", b"DESC", b"NNAM", b"SHRT", b"TNAM", b"RNAM"})
 
 # 已知永远不需要翻译的子记录类型
 KNOWN_INTERNAL = frozenset({"EDID", "MODL", "BFCB", "VMAD"})
+# 扫描时按原始类型字节直接过滤，只计数不解码
+_KNOWN_INTERNAL_BYTES = frozenset(t.encode("ascii") for t in KNOWN_INTERNAL)
+
+# 每种 record_type + subrecord_type 组合最多保留的样本数（按文件顺序取前 N 条），
+# 足以支撑分类统计，超出部分只计数，避免大文件中常见组合占用大量内存
+MAX_SAMPLES_PER_GROUP = 1000
 
 # 驼峰命名模式: FooBar, fooBar
 RE_CAMEL = re.compile(r"^[A-Za-z][a-z]+(?:[A-Z][a-z]+)+\d*$")
 # 下划线命名模式: foo_bar, TMA_Radio01
 RE_UNDERSCORE = re.compile(r"^[A-Za-z0-9]+(?:_[A-Za-z0-9]+)+$")
-# 文件路径模式
-RE_PATH = re.compile(r"[\\/]")
+# 驼峰或下划线命名合并为一个模式，分类时一次匹配
+RE_IDENTIFIER = re.compile(r"(?:%s)|(?:%s)" % (RE_CAMEL.pattern, RE_UNDERSCORE.pattern))
 FILE_EXTENSIONS = (".nif", ".dds", ".mat", ".agx", ".rig", ".hkx", ".pex", ".bgsm", ".bto", ".btr", ".wav", ".xwm", ".fuz", ".lip")
+# 文件路径模式：包含路径分隔符，或以资源文件扩展名结尾（不区分大小写），一次匹配完成两项检测
+RE_PATH = re.compile(
+    r"[\\/]|(?:%s)$" % "|".join(re.escape(ext) for ext in FILE_EXTENSIONS),
+    re.IGNORECASE,
+)
 # 模板变量: <Alias=xxx>
 RE_TEMPLATE = re.compile(r"<Alias=[^>]+>")
 # 纯数字或十六进制
 RE_NUMERIC = re.compile(r"^[0-9A-Fa-f\-\.]+$")
+# RE_NUMERIC 允许的字符，用于在执行正则前检查首字符
+_NUMERIC_CHARS = frozenset("0123456789ABCDEFabcdef-.")
+# 可打印的 ASCII 字节（含换行、回车、制表符），用于 bytes.translate 批量统计
+_PRINTABLE_ASCII = bytes(range(0x20, 0x7F)) + b"\n\r\t"
 
 
 def is_readable_text(data):
-    """尝试将数据解码为可读文本，返回文本或 None。"""
+    """尝试将数据（bytes 或 memoryview）解码为可读文本，返回文本或 None。"""
     if len(data) == 0:
         return None
-    if data.endswith(b"\x00"):
+    if data[-1] == 0:
         data = data[:-1]
     if len(data) == 0:
         return None
     try:
-        text = data.decode("utf-8")
+        text = str(data, "utf-8")
     except UnicodeDecodeError:
         return None
     if "\ufffd" in text:
         return None
-    printable = sum(1 for c in text if c.isprintable() or c in ("\n", "\r", "\t"))
+    if text.isascii():
+        # ASCII 文本在字节上删除可打印字符，剩余长度即不可打印字符数
+        printable = len(text) - len(text.encode("ascii").translate(None, _PRINTABLE_ASCII))
+    elif text.isprintable():
+        printable = len(text)
+    else:
+        printable = sum(1 for c in text if c.isprintable() or c in ("\n", "\r", "\t"))
     if len(text) > 0 and printable / len(text) >= 0.8 and len(text) >= 2:
         return text
     return None
 
 
+# 同一文本（相同模型路径、枚举值等）在不同记录中大量重复，分类结果按文本缓存
+@lru_cache(maxsize=200_000)
 def classify_single_text(text):
     """对单条文本进行分类，返回 (category, confidence) 元组。
 
@@ -69,35 +113,37 @@ def classify_single_text(text):
     if not t:
         return ("unknown", 0.0)
 
-    # 1. 文件路径检测
-    if RE_PATH.search(t) or any(t.lower().endswith(ext) for ext in FILE_EXTENSIONS):
+    # 各项正则之前先做等价的廉价检查（子串、首字符），不满足时直接跳过正则
+
+    # 1. 文件路径检测：路径分隔符或扩展名，后者一定包含 "."
+    if ("/" in t or "\\" in t or "." in t) and RE_PATH.search(t):
         return ("path", 0.95)
 
-    # 2. 不可打印字符 -> binary-like
-    ctrl_count = sum(1 for c in t if ord(c) < 32 and c not in ("\n", "\r", "\t"))
-    if ctrl_count > 0:
-        return ("binary-like", 0.9)
+    # 2. 不可打印字符 -> binary-like（可打印文本中不会有控制字符）
+    if not t.isprintable():
+        ctrl_count = sum(1 for c in t if ord(c) < 32 and c not in ("\n", "\r", "\t"))
+        if ctrl_count > 0:
+            return ("binary-like", 0.9)
 
     # 3. 纯数字/十六进制
-    if RE_NUMERIC.match(t):
+    if t[0] in _NUMERIC_CHARS and RE_NUMERIC.match(t):
         return ("enum-value", 0.8)
 
     # 4. 模板变量 <Alias=xxx> -> 一定是玩家可见文本
-    if RE_TEMPLATE.search(t):
+    if "<Alias=" in t and RE_TEMPLATE.search(t):
         return ("natural-lang", 0.99)
 
     # 5. 包含换行的长文本 -> 大概率自然语言
     if "\n" in t and len(t) > 20:
         return ("natural-lang", 0.95)
 
-    # 6. 驼峰/下划线命名 -> 内部标识符
-    if RE_CAMEL.match(t) or RE_UNDERSCORE.match(t):
+    # 6. 驼峰/下划线命名 -> 内部标识符，两种模式都以 ASCII 字母或数字开头
+    if t[0].isascii() and t[0].isalnum() and RE_IDENTIFIER.match(t):
         return ("identifier", 0.9)
 
     # 7. 基于空格和词的分析
     words = t.split()
-    space_ratio = t.count(" ") / len(t) if len(t) > 0 else 0
-    avg_word_len = sum(len(w) for w in words) / len(words) if words else 0
+    space_ratio = t.count(" ") / len(t)
 
     # 多个词，有合理的空格比例 -> 自然语言
     if len(words) >= 3 and space_ratio > 0.1:
@@ -136,18 +182,15 @@ def classify_group(samples):
     返回 (verdict, detail_str)
     verdict: 'TRANSLATE' | 'SKIP' | 'REVIEW'
     """
-    categories = defaultdict(int)
-    total_confidence = defaultdict(float)
-
-    for _, text in samples:
-        cat, conf = classify_single_text(text)
-        categories[cat] += 1
-        total_confidence[cat] += conf
-
     total = len(samples)
     if total == 0:
         return ("SKIP", "empty")
 
+    # 先按唯一文本计数，每种文本只分类一次，再按出现次数累加到类别
+    categories = Counter()
+    for text, count in Counter(text for _, text in samples).items():
+        categories[classify_single_text(text)[0]] += count
+
     # 计算各类别占比
     ratios = {cat: count / total for cat, count in categories.items()}
 
@@ -181,47 +224,62 @@ def classify_group(samples):
         (ratios.get("path", 0) + ratios.get("binary-like", 0) + ratios.get("identifier", 0) + ratios.get("enum-value", 0)) * 100))
 
 
-def scan_subrecords(data, record_type, form_id, results):
-    """扫描一条记录的所有子记录。"""
+def scan_subrecords(data, record_type, form_id, results, counts):
+    """扫描一条记录的所有子记录，results / counts 以原始 4 字节 (record_type, sub_type) 为键。
+
+    counts 记录每种组合的条数；results 只保留前 MAX_SAMPLES_PER_GROUP 条样本。
+    已知内部类型不解码文本，只计数。
+    """
     offset = 0
-    rec_str = record_type.decode("ascii", errors="replace")
     while offset + SUBRECORD_HEADER_SIZE <= len(data):
-        sub_type = data[offset:offset + 4]
-        sub_size = struct.unpack_from("<H", data, offset + 4)[0]
+        sub_type, sub_size = _unpack_subrecord_header(data, offset)
         offset += SUBRECORD_HEADER_SIZE
         if offset + sub_size > len(data):
             break
+        if sub_type in _KNOWN_INTERNAL_BYTES:
+            counts[(record_type, sub_type)] += 1
+            offset += sub_size
+            continue
         sub_data = data[offset:offset + sub_size]
         text = is_readable_text(sub_data)
         if text:
-            sub_str = sub_type.decode("ascii", errors="replace")
-            key = (rec_str, sub_str)
-            results[key].append((form_id, text[:200]))
+            key = (record_type, sub_type)
+            counts[key] += 1
+            samples = results[key]
+            if len(samples) < MAX_SAMPLES_PER_GROUP:
+                # 同一文本常大量重复（共享名称、枚举值），驻留后共用一个字符串对象
+                samples.append((form_id, sys.intern(text[:200])))
         offset += sub_size
 
 
-def scan_records(data, offset, end, results):
-    """递归扫描所有记录。"""
-    while offset < end:
-        if offset + 4 > end:
-            break
-        rec_type = data[offset:offset + 4]
+def scan_records(data, offset, end, results, counts):
+    """扫描 [offset, end) 范围内的所有记录，GRUP 嵌套通过显式栈展开而非递归。
 
-        if rec_type == b"GRUP":
-            if offset + GRUP_HEADER_SIZE > end:
+    data 应为 memoryview，记录与子记录数据均以零拷贝切片传递。
+    """
+    # 栈中为待扫描的 (offset, end) 区间；遇到 GRUP 时先压入组后剩余区间再压入组内区间，
+    # 保证与递归扫描相同的记录顺序
+    stack = [(offset, end)]
+    while stack:
+        offset, end = stack.pop()
+        while offset < end:
+            if offset + 4 > end:
                 break
-            group_size = struct.unpack_from("<I", data, offset + 4)[0]
-            if group_size < GRUP_HEADER_SIZE:
+
+            if _unpack_u32(data, offset)[0] == GRUP_TYPE_U32:
+                if offset + GRUP_HEADER_SIZE > end:
+                    break
+                group_size = _unpack_u32(data, offset + 4)[0]
+                if group_size < GRUP_HEADER_SIZE:
+                    break
+                group_end = min(offset + group_size, end)
+                stack.append((group_end, end))
+                stack.append((offset + GRUP_HEADER_SIZE, group_end))
                 break
-            group_end = min(offset + group_size, end)
-            scan_records(data, offset + GRUP_HEADER_SIZE, group_end, results)
-            offset = group_end
-        else:
+
             if offset + RECORD_HEADER_SIZE > end:
                 break
-            data_size = struct.unpack_from("<I", data, offset + 4)[0]
-            flags = struct.unpack_from("<I", data, offset + 8)[0]
-            form_id = struct.unpack_from("<I", data, offset + 12)[0]
+            rec_type, data_size, flags, form_id = _unpack_record_header(data, offset)
             rec_start = offset + RECORD_HEADER_SIZE
             rec_end = rec_start + data_size
             if rec_end > end:
@@ -230,17 +288,65 @@ def scan_records(data, offset, end, results):
             rec_data = data[rec_start:rec_end]
             if flags & COMPRESSED_FLAG:
                 if len(rec_data) >= 4:
-                    decomp_size = struct.unpack_from("<I", rec_data, 0)[0]
+                    decomp_size = _unpack_u32(rec_data, 0)[0]
                     try:
-                        rec_data = zlib.decompress(rec_data[4:], bufsize=decomp_size)
-                    except zlib.error:
+                        # 解压结果同样包装为 memoryview，子记录切片不再复制
+                        rec_data = memoryview(zlib_impl.decompress(rec_data[4:], bufsize=decomp_size))
+                    except zlib_impl.error:
                         offset = rec_end
                         continue
 
-            scan_subrecords(rec_data, rec_type, form_id, results)
+            scan_subrecords(rec_data, rec_type, form_id, results, counts)
             offset = rec_end
 
 
+def split_top_level(data, offset, end):
+    """按顶层 GRUP / 记录切分 [offset, end)，返回可独立扫描的 (offset, end) 区间列表。
+
+    遇到截断或非法的头部时停止，与 scan_records 的处理一致。
+    """
+    ranges = []
+    while offset + 4 <= end:
+        if _unpack_u32(data, offset)[0] == GRUP_TYPE_U32:
+            if offset + GRUP_HEADER_SIZE > end:
+                break
+            group_size = _unpack_u32(data, offset + 4)[0]
+            if group_size < GRUP_HEADER_SIZE:
+                break
+            next_offset = min(offset + group_size, end)
+        else:
+            if offset + RECORD_HEADER_SIZE > end:
+                break
+            next_offset = offset + RECORD_HEADER_SIZE + _unpack_u32(data, offset + 4)[0]
+            if next_offset > end:
+                break
+        ranges.append((offset, next_offset))
+        offset = next_offset
+    return ranges
+
+
+def scan_records_parallel(data, offset, end, results, counts):
+    """将各顶层 GRUP 分派到线程池扫描后合并。
+
+    各线程写入独立的结果容器，合并按文件顺序进行，样本顺序与单线程扫描一致；
+    记录解压时释放 GIL，压缩记录较多的文件可获得并行收益。
+    """
+    def scan_range(range_start, range_end):
+        local_results = defaultdict(list)
+        local_counts = Counter()
+        scan_records(data, range_start, range_end, local_results, local_counts)
+        return local_results, local_counts
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(scan_range, a, b) for a, b in split_top_level(data, offset, end)]
+        for future in futures:
+            local_results, local_counts = future.result()
+            for key, samples in local_results.items():
+                merged = results[key]
+                merged.extend(samples[:MAX_SAMPLES_PER_GROUP - len(merged)])
+            counts.update(local_counts)
+
+
 def main():
     if len(sys.argv) < 2:
         print("用法: python -m tools.scan_subrecords <esm_file_path>")
@@ -250,41 +356,64 @@ def main():
     print("扫描文件: %s" % file_path)
 
     with open(file_path, "rb") as f:
-        data = f.read()
+        file_size = os.fstat(f.fileno()).st_size
+        print("文件大小: {:,} bytes".format(file_size))
 
-    print("文件大小: {:,} bytes".format(len(data)))
+        if file_size < RECORD_HEADER_SIZE:
+            print("不是有效的 ESM 文件")
+            sys.exit(1)
 
-    if len(data) < RECORD_HEADER_SIZE or data[0:4] != b"TES4":
-        print("不是有效的 ESM 文件")
-        sys.exit(1)
+        # 通过 mmap 按需换页读取，避免把整个文件复制进内存
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mm) as data:
+                if data[0:4] != b"TES4":
+                    print("不是有效的 ESM 文件")
+                    sys.exit(1)
 
-    header_size = struct.unpack_from("<I", data, 4)[0]
-    start = RECORD_HEADER_SIZE + header_size
+                header_size = _unpack_u32(data, 4)[0]
+                start = RECORD_HEADER_SIZE + header_size
 
-    results = defaultdict(list)
-    scan_records(data, start, len(data), results)
+                results = defaultdict(list)
+                counts = Counter()
+                scan_records_parallel(data, start, len(data), results, counts)
 
     # 分类
     translate_list = []
     review_list = []
-    skip_list = []
-
-    for (rec_type, sub_type), samples in sorted(results.items()):
-        # 已知内部类型直接跳过
-        if sub_type in KNOWN_INTERNAL:
-            skip_list.append((rec_type, sub_type, len(samples), "known-internal", samples))
-            continue
+    # 已知内部类型直接跳过，扫描阶段只保留了计数
+    skip_list = [
+        (raw_rec.decode("ascii", errors="replace"), raw_sub.decode("ascii"), count, "known-internal")
+        for (raw_rec, raw_sub), count in counts.items()
+        if raw_sub in _KNOWN_INTERNAL_BYTES
+    ]
+
+    # 扫描期间以原始字节为键，此处每种组合只解码一次；非 ASCII 类型解码后可能相同，按解码结果合并
+    groups = {}
+    for raw_key, samples in results.items():
+        raw_rec, raw_sub = raw_key
+        key = (raw_rec.decode("ascii", errors="replace"), raw_sub.decode("ascii", errors="replace"))
+        if key in groups:
+            group = groups[key]
+            group[1].extend(samples[:MAX_SAMPLES_PER_GROUP - len(group[1])])
+            group[2] += counts[raw_key]
+        else:
+            groups[key] = [raw_sub, samples, counts[raw_key]]
 
+    for (rec_type, sub_type), (raw_sub, samples, count) in sorted(groups.items()):
+        # 分类基于保留的样本，条数为实际出现次数
         verdict, detail = classify_group(samples)
-        known = sub_type.encode("ascii", errors="replace") in KNOWN_TRANSLATABLE
-        entry = (rec_type, sub_type, len(samples), detail, samples, known)
+        known = raw_sub in KNOWN_TRANSLATABLE
+        entry = (rec_type, sub_type, count, detail, samples, known)
 
         if verdict == "TRANSLATE":
             translate_list.append(entry)
         elif verdict == "REVIEW":
             review_list.append(entry)
         else:
-            skip_list.append((rec_type, sub_type, len(samples), detail, samples))
+            skip_list.append((rec_type, sub_type, count, detail))
+    skip_list.sort(key=lambda e: (e[0], e[1]))
 
     # 输出: TRANSLATE
     print("\n" + "=" * 80)
@@ -315,8 +444,7 @@ def main():
     print("\n" + "=" * 80)
     print("  跳过 (SKIP)")
     print("=" * 80)
-    for entry in skip_list:
-        rec_type, sub_type, count, detail = entry[0], entry[1], entry[2], entry[3]
+    for rec_type, sub_type, count, detail in skip_list:
         print("  [%s -> %s] %d 条  (%s)" % (rec_type, sub_type, count, detail))
 
     # 汇总